@@ -0,0 +1,212 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from .metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS, ADMISSION_WAITING, RUNS_IN_FLIGHT
+
+REASONS = {
+    "queue_full": "Server is at capacity, try again later",
+    "queue_timeout": "Timed out waiting for a free slot, try again later",
+    "session_limit": "Too many concurrent requests for this session",
+}
+
+
+class Overloaded(Exception):
+    """
+    Raised when a run is not admitted. `status_code` is 429 when the session
+    is over its share and 503 when the server is full; `retry_after` is a
+    hint in whole seconds.
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(REASONS[reason])
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = 429 if reason == "session_limit" else 503
+
+
+class Admission:
+    """One admitted run; releasing it more than once is harmless"""
+
+    __slots__ = ("controller", "session_id", "start", "released")
+
+    def __init__(self, controller: "AdmissionController", session_id: str):
+        self.controller = controller
+        self.session_id = session_id
+        self.start = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self.session_id, time.monotonic() - self.start)
+
+
+class AdmissionController:
+    """
+    Caps the agent runs of this process.
+
+    Up to `max_in_flight` runs go at once; later ones wait in a queue of at
+    most `max_queue` for up to `queue_timeout` seconds, and beyond either
+    limit they are turned away at once instead of piling up behind the
+    rest. Freed slots go to the waiting sessions round-robin, and a session
+    may hold at most `max_per_session` running or waiting requests, so one
+    client can't take all the capacity. Settings default to the ADMISSION_*
+    environment variables.
+
+    Runs, queues and waiters belong to the event loop serving requests; each
+    worker process admits on its own.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        max_per_session: Optional[int] = None,
+    ):
+        self.max_in_flight = max_in_flight or int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+        self.queue_timeout = queue_timeout or float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+        self.max_per_session = max_per_session or int(os.getenv("ADMISSION_MAX_PER_SESSION", "4"))
+        self.in_flight = 0
+        self.waiting = 0
+        # running plus waiting requests of each session
+        self._sessions: Dict[str, int] = {}
+        # waiters by session, in the order their sessions get the next slot
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # moving average of run durations, for Retry-After
+        self._run_seconds = 1.0
+        self._rejected = {reason: 0 for reason in REASONS}
+        self._admitted = 0
+
+    async def acquire(self, session_id: str) -> Admission:
+        """Wait for a slot for a run of `session_id`; raises Overloaded when there is none to wait for"""
+        if self._sessions.get(session_id, 0) >= self.max_per_session:
+            self._reject("session_limit")
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+            self._join(session_id)
+            return self._admit(session_id, 0.0)
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(session_id, deque()).append(future)
+        self._join(session_id)
+        self.waiting += 1
+        ADMISSION_WAITING.labels().set(self.waiting)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # the slot came just as the wait ended: hand it back
+                self._release(session_id, 0.0, ran=False)
+            else:
+                self._dequeue(session_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("queue_timeout")
+            raise
+        return self._admit(session_id, time.monotonic() - start)
+
+    @asynccontextmanager
+    async def admit(self, session_id: str):
+        """Run the body as one admitted run of `session_id`"""
+        admission = await self.acquire(session_id)
+        try:
+            yield admission
+        finally:
+            admission.release()
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead has likely drained"""
+        return max(1, math.ceil(self._run_seconds * (self.waiting + 1) / self.max_in_flight))
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self._admitted,
+            "rejected": dict(self._rejected),
+        }
+
+    def _admit(self, session_id: str, waited: float) -> Admission:
+        self._admitted += 1
+        ADMISSION_WAIT_SECONDS.labels().observe(waited)
+        RUNS_IN_FLIGHT.labels().set(self.in_flight)
+        return Admission(self, session_id)
+
+    def _reject(self, reason: str):
+        self._rejected[reason] += 1
+        ADMISSION_REJECTIONS.inc(reason)
+        raise Overloaded(reason, self.retry_after())
+
+    def _join(self, session_id: str):
+        self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+
+    def _leave(self, session_id: str):
+        count = self._sessions[session_id] - 1
+        if count:
+            self._sessions[session_id] = count
+        else:
+            del self._sessions[session_id]
+
+    def _dequeue(self, session_id: str, future: asyncio.Future):
+        waiters = self._waiters.get(session_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._waiters[session_id]
+        self.waiting -= 1
+        self._leave(session_id)
+        ADMISSION_WAITING.labels().set(self.waiting)
+
+    def _release(self, session_id: str, seconds: float, ran: bool = True):
+        if ran:
+            self._run_seconds += 0.1 * (seconds - self._run_seconds)
+        self.in_flight -= 1
+        self._leave(session_id)
+        while self.in_flight < self.max_in_flight and self._waiters:
+            waiting_session, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(waiting_session)
+            else:
+                del self._waiters[waiting_session]
+            # a waiter that timed out or went away dequeues itself
+            if future.done():
+                continue
+            self.waiting -= 1
+            self.in_flight += 1
+            future.set_result(None)
+        RUNS_IN_FLIGHT.labels().set(self.in_flight)
+        ADMISSION_WAITING.labels().set(self.waiting)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """The process-wide admission controller, created on first use"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
+
+
+def set_admission_controller(controller: Optional[AdmissionController]):
+    """Replace the process-wide admission controller, e.g. with other limits"""
+    global _controller
+    with _controller_lock:
+        _controller = controller
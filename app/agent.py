@@ -1,56 +1,102 @@
 import os
 import json
-import sqlite3
-from typing import TypedDict, List, Literal, AsyncGenerator, Generator
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
+import uuid
+from typing import TYPE_CHECKING, Annotated, TypedDict, List, Literal, AsyncGenerator, Generator, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, SystemMessage, ToolMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.tools import StructuredTool, tool
 from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
-from duckduckgo_search import DDGS
 from dotenv import load_dotenv
 import base64
-from io import BytesIO
-from PIL import Image
 from pathlib import Path
 import asyncio
+from functools import partial
+
+from .attachments import ImageAttachment, consume, image_attachment, merge_images, pending_images
+from .blobs import BLOB_URL_PREFIX, get_blob_store
+from .calculator import evaluate, evaluate_array, evaluate_many, format_value
+from .context import ContextPolicy, RollingSummary, default_context_policy, summary_message
+from .database import get_user_database
+from .fast_path import FastPathRouter, default_fast_path
+from .images import VALID_EXTENSIONS, get_image_cache, to_data_url
+from .llm import ModelRegistry
+from .metrics import MODEL_ERRORS, MODEL_FALLBACKS, instrument_node, model_timer, record_response
+from .response_cache import ResponseCache, default_response_cache
+from .search import get_search_service
+from .sessions import SessionStore
+from .tool_executor import ToolExecutor
+from .vision import VisionAnalyzer
+
+if TYPE_CHECKING:
+    # imports NumPy, so it is only loaded when the semantic cache is on
+    from .semantic_cache import SemanticCache
 
 # load environment variables
 load_dotenv()
 
 
+def append_messages(left: List[BaseMessage], right) -> List[BaseMessage]:
+    """
+    Reducer for the message history: add_messages with a fast path for appends.
+
+    add_messages re-validates and re-indexes the whole history on every update.
+    Nodes almost always return brand new messages, so those are simply given
+    ids and appended; removals and replacements by id still go through
+    add_messages.
+    """
+    if not isinstance(right, list):
+        right = [right]
+    if not all(type(m) in (HumanMessage, AIMessage, SystemMessage, ToolMessage) for m in right):
+        return add_messages(left, right)
+
+    ids = {m.id for m in right if m.id is not None}
+    if ids and any(m.id in ids for m in left):
+        return add_messages(left, right)
+
+    for m in right:
+        if m.id is None:
+            m.id = str(uuid.uuid4())
+    return left + right
+
+
 class AgentState(TypedDict):
     """State of our agent containing messages"""
-    messages: List[BaseMessage]
+    # nodes return only new messages, which the reducer appends to the history
+    messages: Annotated[List[BaseMessage], append_messages]
+    # running summary of turns folded away by the summarize node
+    summary: str
+    # images for the vision model, kept out of the message text
+    images: Annotated[List[ImageAttachment], merge_images]
 
 
 # define tools
 @tool
-def calculator(expression: str) -> str:
+def calculator(expression: str, x: Optional[List[float]] = None) -> str:
     """
     Calculate mathematical expressions safely.
 
     Args:
-        expression: A mathematical expression to evaluate (e.g., "2 + 2", "sqrt(16)", "sin(pi/2)")
+        expression: A mathematical expression to evaluate (e.g., "2 + 2", "sqrt(16)", "sin(pi/2)", "sum([1, 2, 3])"),
+            or several separated by semicolons
+        x: Optional list of values; the expression is then evaluated for each value of x
 
     Returns:
         The result of the calculation
     """
     try:
-        import math
-
-        # create a safe namespace for evaluation
-        safe_dict = {
-            "__builtins__": {},
-            "abs": abs, "round": round, "min": min, "max": max,
-            "sum": sum, "pow": pow,
-            "sqrt": math.sqrt, "sin": math.sin, "cos": math.cos, "tan": math.tan,
-            "log": math.log, "log10": math.log10, "exp": math.exp,
-            "pi": math.pi, "e": math.e,
-        }
-
-        result = eval(expression, safe_dict)
-        return f"Result: {result}"
+        if x is not None:
+            return f"Result: {format_value(evaluate_array(expression, {'x': x}))}"
+
+        expressions = [e.strip() for e in expression.split(";") if e.strip()]
+        if len(expressions) == 1:
+            return f"Result: {format_value(evaluate(expressions[0]))}"
+        # parsed and compiled once each; repeated expressions are cache hits
+        results = evaluate_many(expressions)
+        return "Results:\n" + "\n".join(
+            f"{e} = {format_value(r)}" if not isinstance(r, Exception) else f"{e}: Error: {r}"
+            for e, r in zip(expressions, results))
     except Exception as e:
         return f"Error calculating '{expression}': {str(e)}"
 
@@ -68,8 +114,8 @@ def duckduckgo_search(query: str, max_results: int = 3) -> str:
         Search results as formatted text
     """
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=max_results))
+        # repeated and concurrent identical queries are served from the cache
+        results = get_search_service().search(query, max_results)
 
         if not results:
             return f"No results found for query: {query}"
@@ -88,64 +134,40 @@ def duckduckgo_search(query: str, max_results: int = 3) -> str:
 @tool
 def fetch_user_from_database(user_id: str) -> str:
     """
-    Fetch user information from a dummy database.
+    Fetch user information from the users database.
 
     Args:
-        user_id: The ID of the user to fetch
+        user_id: The ID of the user to fetch, or several IDs separated by commas
 
     Returns:
         User information as JSON string
     """
     try:
-        # create dummy database in memory
-        conn = sqlite3.connect(':memory:')
-        cursor = conn.cursor()
-
-        # create and populate dummy users table
-        cursor.execute('''
-            CREATE TABLE users (
-                id TEXT PRIMARY KEY,
-                name TEXT,
-                email TEXT,
-                age INTEGER,
-                city TEXT
-            )
-        ''')
-
-        dummy_users = [
-            ('user1', 'Alice Johnson', 'alice@example.com', 28, 'New York'),
-            ('user2', 'Bob Smith', 'bob@example.com', 35, 'San Francisco'),
-            ('user3', 'Carol Davis', 'carol@example.com', 42, 'Chicago'),
-            ('user4', 'David Wilson', 'david@example.com', 31, 'Austin'),
-        ]
+        database = get_user_database()
+        user_ids = [i.strip() for i in user_id.split(",") if i.strip()]
 
-        cursor.executemany(
-            'INSERT INTO users VALUES (?, ?, ?, ?, ?)', dummy_users)
-        conn.commit()
-
-        # fetch the requested user
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        user = cursor.fetchone()
-        conn.close()
-
-        if user:
-            user_data = {
-                'id': user[0],
-                'name': user[1],
-                'email': user[2],
-                'age': user[3],
-                'city': user[4]
-            }
-            return f"User found: {json.dumps(user_data, indent=2)}"
-        else:
-            return f"User with ID '{user_id}' not found. Available IDs: user1, user2, user3, user4"
+        # all requested users are fetched with a single query
+        users = database.get_users(user_ids)
+        missing = [i for i in user_ids if i not in users]
+
+        if len(user_ids) == 1 and users:
+            return f"User found: {json.dumps(users[user_ids[0]], indent=2)}"
+        if not users:
+            return f"User with ID '{user_id}' not found. Available IDs: {', '.join(database.user_ids())}"
+
+        found = [users[i] for i in user_ids if i in users]
+        result = f"Users found: {json.dumps(found, indent=2)}"
+        if missing:
+            result += f"\nNot found: {', '.join(missing)}"
+        return result
 
     except Exception as e:
         return f"Error fetching user '{user_id}': {str(e)}"
 
 
-@tool
-def analyze_image_url(image_url: str) -> str:
+# the image tools return their attachment as the ToolMessage artifact
+@tool(response_format="content_and_artifact")
+def analyze_image_url(image_url: str):
     """
     Prepare an image from a URL for analysis.
 
@@ -158,16 +180,43 @@ def analyze_image_url(image_url: str) -> str:
     try:
         # validate URL
         if not image_url.startswith(('http://', 'https://')):
-            return f"Invalid URL: {image_url}. Please provide a valid HTTP/HTTPS URL."
+            return f"Invalid URL: {image_url}. Please provide a valid HTTP/HTTPS URL.", None
 
-        return f"IMAGE_URL_READY:{image_url}"
+        return f"Image from {image_url} is ready for analysis.", image_attachment("url", image_url, image_url)
 
     except Exception as e:
-        return f"Error preparing image from {image_url}: {str(e)}"
+        return f"Error preparing image from {image_url}: {str(e)}", None
 
 
-@tool
-def analyze_local_image(file_path: str) -> str:
+def _local_image_path(file_path: str):
+    """Return (path, None) for a valid local image, or (None, error message)"""
+    # convert to Path object for easier handling
+    path = Path(file_path)
+
+    # check if file exists
+    if not path.exists():
+        # try relative to current working directory
+        path = Path.cwd() / file_path
+        if not path.exists():
+            return None, f"Image file not found: {file_path}. Please check the path."
+
+    # check if it's a file
+    if not path.is_file():
+        return None, f"Path is not a file: {file_path}"
+
+    # validate image extension
+    if path.suffix.lower() not in VALID_EXTENSIONS:
+        return None, f"Unsupported image format: {path.suffix}. Supported formats: {', '.join(VALID_EXTENSIONS)}"
+
+    return path, None
+
+
+def _local_image_result(path: Path, encoded: bytes, save_format: str):
+    return (f"Local image {path.name} is ready for analysis.",
+            image_attachment("local", path.name, to_data_url(encoded, save_format)))
+
+
+def _analyze_local_image(file_path: str):
     """
     Prepare a local image file for analysis by converting it to base64.
 
@@ -178,62 +227,33 @@ def analyze_local_image(file_path: str) -> str:
         Confirmation that the local image is ready for analysis
     """
     try:
-        # convert to Path object for easier handling
-        path = Path(file_path)
+        path, error = _local_image_path(file_path)
+        if error:
+            return error, None
 
-        # check if file exists
-        if not path.exists():
-            # try relative to current working directory
-            path = Path.cwd() / file_path
-            if not path.exists():
-                return f"Image file not found: {file_path}. Please check the path."
+        # resizing and re-encoding runs in the image worker processes, cached by file content
+        return _local_image_result(path, *get_image_cache().encode_file(path))
 
-        # check if it's a file
-        if not path.is_file():
-            return f"Path is not a file: {file_path}"
-
-        # validate image extension
-        valid_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
-        if path.suffix.lower() not in valid_extensions:
-            return f"Unsupported image format: {path.suffix}. Supported formats: {', '.join(valid_extensions)}"
-
-        # open and potentially resize the image
-        with Image.open(path) as img:
-            # convert to RGB if necessary (for JPEG compatibility)
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-
-            # resize if image is too large (to keep base64 size manageable)
-            max_size = (1024, 1024)  # max 1024x1024 pixels
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-            # save to bytes
-            img_bytes = BytesIO()
-
-            # determine format for saving
-            save_format = 'JPEG'
-            if path.suffix.lower() in ['.png', '.gif', '.webp']:
-                save_format = 'PNG'
+    except Exception as e:
+        return f"Error preparing local image '{file_path}': {str(e)}", None
 
-            img.save(img_bytes, format=save_format, quality=85, optimize=True)
-            img_bytes.seek(0)
 
-            # encode to base64
-            base64_string = base64.b64encode(
-                img_bytes.getvalue()).decode('utf-8')
+async def _aanalyze_local_image(file_path: str):
+    try:
+        path, error = _local_image_path(file_path)
+        if error:
+            return error, None
 
-        # detect image format
-        image_format = save_format.lower()
+        return _local_image_result(path, *await get_image_cache().aencode_file(path))
 
-        # create data URL
-        mime_type = f"image/{image_format}"
-        data_url = f"data:{mime_type};base64,{base64_string}"
+    except Exception as e:
+        return f"Error preparing local image '{file_path}': {str(e)}", None
 
-        return f"LOCAL_IMAGE_READY:{data_url}|{path.name}"
 
-    except Exception as e:
-        return f"Error preparing local image '{file_path}': {str(e)}"
+# sync and async implementations, so async runs await the image workers directly
+analyze_local_image = StructuredTool.from_function(
+    func=_analyze_local_image, coroutine=_aanalyze_local_image, name="analyze_local_image",
+    response_format="content_and_artifact")
 
 
 @tool
@@ -254,14 +274,12 @@ def analyze_image_description(image_description: str) -> str:
 tools = [calculator, duckduckgo_search, fetch_user_from_database,
          analyze_image_url, analyze_local_image, analyze_image_description]
 
+# answers that used no tools besides these don't depend on when they were asked,
+# so the semantic cache may reuse them (search results and user records change)
+SEMANTIC_CACHE_TOOLS = {"calculator", "analyze_image_description"}
 
-def call_model(state: AgentState):
-    """Call the model with the current state"""
-    messages = state["messages"]
 
-    # Add system message if it's the first message
-    if len(messages) == 1 and isinstance(messages[0], HumanMessage):
-        system_msg = SystemMessage(content="""You are a helpful AI assistant with access to several tools:
+SYSTEM_PROMPT = """You are a helpful AI assistant with access to several tools:
 
 1. Calculator - for mathematical calculations
 2. DuckDuckGo Search - for web searches  
@@ -274,79 +292,193 @@ When a user provides an image URL, use the analyze_image_url tool.
 When they provide a file path to a local image, use analyze_local_image tool.
 When they describe an image, use analyze_image_description.
 
-Use tools when needed to provide accurate information. Always be helpful and explain your reasoning.""")
-        messages = [system_msg] + messages
-
-    # check if any tool results contain image data that needs vision analysis
-    vision_content = None
-    vision_context = ""
-
-    for i, msg in enumerate(reversed(messages)):
-        if hasattr(msg, 'content') and isinstance(msg.content, str):
-            if msg.content.startswith("IMAGE_URL_READY:"):
-                image_url = msg.content.replace("IMAGE_URL_READY:", "")
-                vision_content = [
-                    {"type": "text", "text": "Please analyze this image and describe what you see in detail."},
-                    {"type": "image_url", "image_url": {"url": image_url}}
-                ]
-                vision_context = f"Image from URL: {image_url}"
-                break
-            elif msg.content.startswith("LOCAL_IMAGE_READY:"):
-                parts = msg.content.replace(
-                    "LOCAL_IMAGE_READY:", "").split("|")
-                data_url = parts[0]
-                filename = parts[1] if len(parts) > 1 else "unknown"
-                vision_content = [
-                    {"type": "text",
-                        "text": f"Please analyze this local image ({filename}) and describe what you see in detail. Include information about objects, people, colors, composition, and any text visible in the image."},
-                    {"type": "image_url", "image_url": {"url": data_url}}
-                ]
-                vision_context = f"Local image: {filename}"
-                break
-
-    # If we have vision content, use vision model
-    if vision_content:
+Use tools when needed to provide accurate information. Always be helpful and explain your reasoning."""
+
+
+def _with_system_message(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Add the system message unless the conversation already starts with one"""
+    if messages and not isinstance(messages[0], SystemMessage):
+        return [SystemMessage(content=SYSTEM_PROMPT)] + messages
+    return messages
+
+
+def _prompt(state: AgentState, context: ContextPolicy) -> List[BaseMessage]:
+    """Build the model prompt from the stored history and the context policy"""
+    messages = state["messages"]
+    if context is not None:
+        messages = context.apply(messages)
+    messages = _with_system_message(messages)
+    if state.get("summary"):
+        messages = messages[:1] + [summary_message(state["summary"])] + messages[1:]
+    return messages
+
+
+def _model_attempts(messages: List[BaseMessage], models: ModelRegistry):
+    """Yield (stage, model kind, model, input messages) in fallback order"""
+    # use normal model with tools
+    yield "full_prompt", "tools", models.tool_model, messages
+
+    # if there's an error with tool messages, try with just the last user message
+    user_messages = [msg for msg in messages if isinstance(
+        msg, (HumanMessage, SystemMessage))]
+    if user_messages:
+        # system + last user message
+        yield "last_user_message", "tools", models.tool_model, user_messages[-2:]
+        # final fallback - no tools
+        yield "no_tools", "chat", models.chat_model, [user_messages[-1]]
+
+
+def _model_answered(stage: str, kind: str, response):
+    record_response(kind, response)
+    if stage != "full_prompt":
+        MODEL_FALLBACKS.inc(stage)
+
+
+def _response_cache(cache: ResponseCache, config: RunnableConfig):
+    """The response cache, unless it is off or bypassed for this request"""
+    if cache is None or not (config or {}).get("configurable", {}).get("response_cache", True):
+        return None
+    return cache
+
+
+def call_model(state: AgentState, config: RunnableConfig = None, *, models: ModelRegistry,
+               context: ContextPolicy = None, vision: VisionAnalyzer = None,
+               response_cache: ResponseCache = None):
+    """Call the model with the current state"""
+    # images waiting for analysis go to the vision model together; once is enough
+    pending = pending_images(state.get("images"))
+    if pending:
+        vision = vision if vision is not None else VisionAnalyzer()
+        with model_timer("vision"):
+            message = vision.analyze(models.vision_model, pending)
+        return {"messages": [message], "images": consume(pending)}
+
+    # the system message and context policy only shape the prompt, the stored state is untouched
+    messages = _prompt(state, context)
+    cache = _response_cache(response_cache, config)
+
+    error = None
+    for stage, kind, model, model_input in _model_attempts(messages, models):
         try:
-            vision_model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-            vision_message = HumanMessage(content=vision_content)
-            vision_response = vision_model.invoke([vision_message])
-
-            # Create a response message with the vision analysis
-            analysis_response = AIMessage(
-                content=f"Image analysis for {vision_context}:\n\n{vision_response.content}")
-            return {"messages": messages + [analysis_response]}
+            with model_timer(kind):
+                if cache is not None:
+                    response = cache.invoke(model, model_input)
+                else:
+                    response = model.invoke(model_input)
+            _model_answered(stage, kind, response)
+            return {"messages": [response]}
         except Exception as e:
-            error_response = AIMessage(
-                content=f"Error analyzing image: {str(e)}")
-            return {"messages": messages + [error_response]}
+            print(f"Model error: {e}")
+            MODEL_ERRORS.inc(kind)
+            error = e
 
-    # use normal model with tools
+    return {"messages": [AIMessage(content=f"Error: {str(error)}")]}
+
+
+async def acall_model(state: AgentState, config: RunnableConfig = None, *, models: ModelRegistry,
+                      context: ContextPolicy = None, vision: VisionAnalyzer = None,
+                      response_cache: ResponseCache = None):
+    """Async version of call_model that awaits the model without blocking the loop"""
+    pending = pending_images(state.get("images"))
+    if pending:
+        vision = vision if vision is not None else VisionAnalyzer()
+        with model_timer("vision"):
+            message = await vision.aanalyze(models.vision_model, pending)
+        return {"messages": [message], "images": consume(pending)}
+
+    messages = _prompt(state, context)
+    cache = _response_cache(response_cache, config)
+
+    error = None
+    for stage, kind, model, model_input in _model_attempts(messages, models):
+        try:
+            with model_timer(kind):
+                if cache is not None:
+                    response = await cache.ainvoke(model, model_input)
+                else:
+                    response = await model.ainvoke(model_input)
+            _model_answered(stage, kind, response)
+            return {"messages": [response]}
+        except Exception as e:
+            print(f"Model error: {e}")
+            MODEL_ERRORS.inc(kind)
+            error = e
+
+    return {"messages": [AIMessage(content=f"Error: {str(error)}")]}
+
+
+def _summary_update(state: AgentState, old: List[BaseMessage], response) -> AgentState:
+    """State update replacing `old` with the new summary"""
+    if not isinstance(response.content, str) or not response.content:
+        return {}
+    return {"summary": response.content,
+            "messages": [RemoveMessage(id=m.id) for m in old]}
+
+
+def summarize(state: AgentState, *, models: ModelRegistry, summarizer: RollingSummary):
+    """Fold older turns into the running summary once the history is too long"""
+    old, _ = summarizer.split(state["messages"])
+    if not old:
+        return {}
     try:
-        model = ChatOpenAI(model="gpt-4o-mini",
-                           temperature=0).bind_tools(tools)
-        response = model.invoke(messages)
-        return {"messages": messages + [response]}
+        response = models.chat_model.invoke(
+            summarizer.request(state.get("summary", ""), old))
     except Exception as e:
-        # if there's an error with tool messages, try with just the last user message
-        print(f"Tool error: {e}")
-        user_messages = [msg for msg in messages if isinstance(
-            msg, (HumanMessage, SystemMessage))]
-        if user_messages:
-            try:
-                model = ChatOpenAI(model="gpt-4o-mini",
-                                   temperature=0).bind_tools(tools)
-                # system + last user message
-                response = model.invoke(user_messages[-2:])
-                return {"messages": messages + [response]}
-            except Exception as e2:
-                print(f"Fallback error: {e2}")
-                # final fallback - no tools
-                model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-                response = model.invoke([user_messages[-1]])
-                return {"messages": messages + [response]}
-        else:
-            error_response = AIMessage(content=f"Error: {str(e)}")
-            return {"messages": messages + [error_response]}
+        # keep the full history, the context policy still bounds the prompt
+        print(f"Summary error: {e}")
+        return {}
+    return _summary_update(state, old, response)
+
+
+async def asummarize(state: AgentState, *, models: ModelRegistry, summarizer: RollingSummary):
+    old, _ = summarizer.split(state["messages"])
+    if not old:
+        return {}
+    try:
+        response = await models.chat_model.ainvoke(
+            summarizer.request(state.get("summary", ""), old))
+    except Exception as e:
+        print(f"Summary error: {e}")
+        return {}
+    return _summary_update(state, old, response)
+
+
+def _fast_path_route(state: AgentState, router: FastPathRouter):
+    """The route for the new user message, unless it comes with images"""
+    last_message = state["messages"][-1]
+    if not isinstance(last_message, HumanMessage) or pending_images(state.get("images")):
+        return None
+    return router.route(last_message.content) if isinstance(last_message.content, str) else None
+
+
+def _fast_path_update(router: FastPathRouter, route, tool_call: dict, tool_message: ToolMessage) -> AgentState:
+    answer = router.answer(route, tool_message.content)
+    if answer is None:
+        # the tool couldn't handle it, let the model take the question from the start
+        return {"messages": []}
+    return {"messages": router.turn(tool_call, tool_message, answer)}
+
+
+def route_fast_path(state: AgentState, *, router: FastPathRouter, executor: ToolExecutor):
+    """Answer plain calculator/database requests with the tool alone"""
+    route = _fast_path_route(state, router)
+    if route is None:
+        return {"messages": []}
+    tool_call = router.tool_call(route)
+    return _fast_path_update(router, route, tool_call, executor.run([tool_call])[0])
+
+
+async def aroute_fast_path(state: AgentState, *, router: FastPathRouter, executor: ToolExecutor):
+    route = _fast_path_route(state, router)
+    if route is None:
+        return {"messages": []}
+    tool_call = router.tool_call(route)
+    return _fast_path_update(router, route, tool_call, (await executor.arun([tool_call]))[0])
+
+
+def fast_path_done(state: AgentState) -> bool:
+    """Whether the fast path answered the turn"""
+    return isinstance(state["messages"][-1], AIMessage)
 
 
 def should_continue(state: AgentState) -> Literal["tools", "__end__"]:
@@ -361,193 +493,387 @@ def should_continue(state: AgentState) -> Literal["tools", "__end__"]:
     return "__end__"
 
 
-def execute_tools(state: AgentState):
+# create a mapping of tool names to functions
+tool_map = {t.name: t for t in tools}
+
+
+def execute_tools(state: AgentState, *, executor: ToolExecutor):
     """Execute tools based on the last message's tool calls"""
-    messages = state["messages"]
-    last_message = messages[-1]
+    last_message = state["messages"][-1]
 
     if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
-        return {"messages": messages}
-
-    # create a mapping of tool names to functions
-    tool_map = {
-        "calculator": calculator,
-        "duckduckgo_search": duckduckgo_search,
-        "fetch_user_from_database": fetch_user_from_database,
-        "analyze_image_url": analyze_image_url,
-        "analyze_local_image": analyze_local_image,
-        "analyze_image_description": analyze_image_description,
-    }
-
-    # execute each tool call
-    tool_responses = []
-    for tool_call in last_message.tool_calls:
-        tool_name = tool_call["name"]
-        tool_args = tool_call["args"]
-        tool_id = tool_call["id"]
-
-        if tool_name in tool_map:
-            try:
-                # execute the tool
-                result = tool_map[tool_name].invoke(tool_args)
+        return {"messages": []}
 
-                # create a tool message with proper structure
-                from langchain_core.messages import ToolMessage
-                tool_message = ToolMessage(
-                    content=str(result),
-                    tool_call_id=tool_id
-                )
-                tool_responses.append(tool_message)
+    # run all tool calls of the response concurrently, results stay in call order
+    return _tool_update(executor.run(last_message.tool_calls))
 
-            except Exception as e:
-                # create error tool message
-                from langchain_core.messages import ToolMessage
-                error_message = ToolMessage(
-                    content=f"Error executing {tool_name}: {str(e)}",
-                    tool_call_id=tool_id
-                )
-                tool_responses.append(error_message)
 
-    return {"messages": messages + tool_responses}
+async def aexecute_tools(state: AgentState, *, executor: ToolExecutor):
+    """Async version of execute_tools; sync tools run in the executor's pool"""
+    last_message = state["messages"][-1]
+
+    if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
+        return {"messages": []}
+
+    return _tool_update(await executor.arun(last_message.tool_calls))
+
+
+def _tool_update(messages: List[ToolMessage]) -> AgentState:
+    """State update moving the image attachments produced by tools out of their messages"""
+    images = []
+    for i, message in enumerate(messages):
+        if isinstance(message.artifact, dict) and "consumed" in message.artifact:
+            images.append(message.artifact)
+            messages[i] = message.model_copy(update={"artifact": None})
+    return {"messages": messages, "images": images} if images else {"messages": messages}
+
+
+def _decode_base64_image(image):
+    """Return (raw bytes, save format) of an inline base64 image"""
+    data, mime_type = image.data, image.mime_type
+    # accept data URLs as well as bare base64
+    if data.startswith("data:"):
+        header, _, data = data.partition(",")
+        mime_type = mime_type or header[len("data:"):].split(";")[0] or None
+    return base64.b64decode(data), get_image_cache().processor.save_format(mime_type=mime_type)
+
+
+def _base64_image_attachment(image, encoded: bytes, save_format: str) -> ImageAttachment:
+    filename = image.filename or "uploaded_image"
+    return image_attachment("local", filename, to_data_url(encoded, save_format))
+
+
+def _handle_image_attachment(image) -> ImageAttachment:
+    """Reference an uploaded blob; its bytes are only read when the vision call is built"""
+    blob = get_blob_store().get(image.data)
+    if blob is None:
+        raise ValueError(f"Unknown image handle: {image.data}")
+    return image_attachment("upload", image.filename or blob.filename, f"{BLOB_URL_PREFIX}{blob.handle}")
+
+
+def _url_image_attachment(image) -> ImageAttachment:
+    content, attachment = analyze_image_url.func(image.data)
+    if attachment is None:
+        raise ValueError(content)
+    return attachment
 
 
 class LangGraphAgent:
     """LangGraph Agent class for handling conversations"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        models: ModelRegistry = None,
+        sessions: SessionStore = None,
+        context_policy: ContextPolicy = None,
+        summarizer: RollingSummary = None,
+        tool_executor: ToolExecutor = None,
+        vision: VisionAnalyzer = None,
+        response_cache: ResponseCache = None,
+        semantic_cache: "SemanticCache" = None,
+        fast_path: FastPathRouter = None,
+    ):
+        # build the chat models once and share them across requests
+        self.models = models if models is not None else ModelRegistry(tools)
+        # conversation memory keyed by session_id
+        self.sessions = sessions if sessions is not None else SessionStore()
+        # what part of the history each model call sees
+        self.context_policy = context_policy if context_policy is not None else default_context_policy()
+        # optional node folding old turns into a summary before each turn
+        self.summarizer = summarizer
+        # runs the tool calls of a response concurrently
+        self.tool_executor = tool_executor if tool_executor is not None else ToolExecutor(tools)
+        # sends all pending images of a turn to the vision model, in concurrent batches
+        self.vision = vision if vision is not None else VisionAnalyzer()
+        # optional exact-match cache of model responses, off unless RESPONSE_CACHE is set
+        self.response_cache = response_cache if response_cache is not None else default_response_cache()
+        # optional cache of final answers to near-duplicate questions, off unless SEMANTIC_CACHE is set
+        if semantic_cache is None and os.getenv("SEMANTIC_CACHE", "off") != "off":
+            from .semantic_cache import SemanticCache
+            semantic_cache = SemanticCache()
+        self.semantic_cache = semantic_cache
+        # optional router answering plain calculator/database requests without the model
+        self.fast_path = fast_path if fast_path is not None else default_fast_path()
+
         # create the graph
         workflow = StateGraph(AgentState)
 
-        # add nodes
-        workflow.add_node("agent", call_model)
-        workflow.add_node("tools", execute_tools)
+        # add nodes (sync functions serve invoke/stream, async ones ainvoke/astream)
+        agent_options = dict(models=self.models, context=self.context_policy, vision=self.vision,
+                             response_cache=self.response_cache)
+        workflow.add_node("agent", self._node(
+            "agent", partial(call_model, **agent_options), partial(acall_model, **agent_options)))
+        workflow.add_node("tools", self._node(
+            "tools", partial(execute_tools, executor=self.tool_executor),
+            partial(aexecute_tools, executor=self.tool_executor)))
 
         # set entry point
-        workflow.set_entry_point("agent")
+        model_entry = "agent"
+        if self.summarizer is not None:
+            workflow.add_node("summarize", self._node(
+                "summarize", partial(summarize, models=self.models, summarizer=self.summarizer),
+                partial(asummarize, models=self.models, summarizer=self.summarizer)))
+            workflow.add_edge("summarize", "agent")
+            model_entry = "summarize"
+
+        if self.fast_path is not None:
+            # the router answers what it can before the model gets involved
+            fast_path_options = dict(router=self.fast_path, executor=self.tool_executor)
+            workflow.add_node("router", self._node(
+                "router", partial(route_fast_path, **fast_path_options),
+                partial(aroute_fast_path, **fast_path_options)))
+            workflow.set_entry_point("router")
+            workflow.add_conditional_edges(
+                "router", fast_path_done, {True: END, False: model_entry})
+        else:
+            workflow.set_entry_point(model_entry)
 
         # add edges
         workflow.add_conditional_edges("agent", should_continue)
         workflow.add_edge("tools", "agent")
 
-        # compile the graph
+        # compile the graph, plus a variant that checkpoints each session
         self.graph = workflow.compile()
-
-    def chat(self, message: str, images: List = None) -> str:
-        """Chat with the agent"""
+        self.session_graph = workflow.compile(
+            checkpointer=self.sessions.checkpointer)
+
+    @staticmethod
+    def _node(name: str, func, afunc) -> RunnableLambda:
+        """A graph node from sync and async functions, timed in the node metrics"""
+        func, afunc = instrument_node(name, func, afunc)
+        return RunnableLambda(func, afunc=afunc, name=name)
+
+    def _initial_state(self, message: str, images: List = None) -> AgentState:
+        """Build the graph input from the user message and optional images"""
+        # If images are provided, process them first
+        processed_images = self._process_images(images) if images else []
+        return self._state_with_images(message, processed_images)
+
+    async def _ainitial_state(self, message: str, images: List = None) -> AgentState:
+        processed_images = await self._aprocess_images(images) if images else []
+        return self._state_with_images(message, processed_images)
+
+    def _state_with_images(self, message: str, processed_images: List) -> AgentState:
+        human_message = HumanMessage(content=message)
+        if processed_images:
+            # images become attachments, errors are reported to the model
+            attachments = [r for r in processed_images if isinstance(r, dict)]
+            errors = [HumanMessage(content=r) for r in processed_images if isinstance(r, str)]
+            return {"messages": [human_message] + errors, "images": attachments}
+
+        return {"messages": [human_message]}
+
+    def _trim_update(self, messages: List[BaseMessage], size: int) -> AgentState:
+        """State update removing the turns that no longer fit the session cap"""
+        kept = self.sessions.trim(messages, size)
+        dropped = messages[:len(messages) - len(kept)]
+        return {"messages": [RemoveMessage(id=m.id) for m in dropped]}
+
+    def _remember(self, session_id: str):
+        """Account for a finished turn and trim the session if it outgrew its cap"""
+        size = self.sessions.record(session_id)
+        if size <= self.sessions.max_session_bytes:
+            return
+        config = self.sessions.config(session_id)
+        messages = self.session_graph.get_state(config).values["messages"]
+        self.session_graph.update_state(
+            config, self._trim_update(messages, size), as_node="agent")
+        self.sessions.record(session_id)
+
+    async def _aremember(self, session_id: str):
+        size = await asyncio.to_thread(self.sessions.record, session_id)
+        if size <= self.sessions.max_session_bytes:
+            return
+        config = self.sessions.config(session_id)
+        snapshot = await self.session_graph.aget_state(config)
+        await self.session_graph.aupdate_state(
+            config, self._trim_update(snapshot.values["messages"], size), as_node="agent")
+        await asyncio.to_thread(self.sessions.record, session_id)
+
+    def _run(self, session_id: Optional[str], cache: bool):
+        """Return the graph and config for a turn"""
+        if session_id is None:
+            graph, config = self.graph, {"configurable": {}}
+        else:
+            graph, config = self.session_graph, self.sessions.config(session_id)
+        if not cache:
+            config["configurable"]["response_cache"] = False
+        return graph, config
+
+    def _semantic_cache_for(self, images: List, cache: bool) -> Optional["SemanticCache"]:
+        """The semantic cache, if a turn with these images may use it"""
+        if self.semantic_cache is None or not cache or images:
+            return None
+        return self.semantic_cache
+
+    def _store_answer(self, semantic_cache: "SemanticCache", message: str, result: AgentState, answer: str):
+        """Keep the answer of a fresh turn for near-duplicate questions, unless it used live data"""
+        used = {call["name"] for m in result["messages"] if isinstance(m, AIMessage) for call in m.tool_calls}
+        if answer and not answer.startswith("Error") and used <= SEMANTIC_CACHE_TOOLS:
+            semantic_cache.store(message, answer)
+
+    def _cached_turn(self, message: str, answer: str) -> AgentState:
+        """State update recording a turn answered from the semantic cache"""
+        return {"messages": [HumanMessage(content=message), AIMessage(content=answer)]}
+
+    def chat(self, message: str, images: List = None, session_id: str = None,
+             cache: bool = True) -> str:
+        """
+        Chat with the agent, continuing the conversation of `session_id` if
+        given. `cache=False` bypasses the response and semantic caches.
+        """
         try:
-            # Create initial state with message
-            human_message = HumanMessage(content=message)
-
-            # If images are provided, process them first
-            if images:
-                processed_images = self._process_images(images)
-                if processed_images:
-                    # Add image analysis results to the conversation
-                    image_messages = []
-                    for img_result in processed_images:
-                        image_messages.append(HumanMessage(content=img_result))
-
-                    initial_state = {"messages": [
-                        human_message] + image_messages}
-                else:
-                    initial_state = {"messages": [human_message]}
-            else:
-                initial_state = {"messages": [human_message]}
+            # a cached answer only fits a question asked without earlier context
+            semantic_cache = self._semantic_cache_for(images, cache)
+            if semantic_cache is not None and session_id is not None and self.sessions.exists(session_id):
+                semantic_cache = None
+            if semantic_cache is not None:
+                answer = semantic_cache.lookup(message)
+                if answer is not None:
+                    if session_id is not None:
+                        self.session_graph.update_state(
+                            self.sessions.config(session_id), self._cached_turn(message, answer), as_node="agent")
+                        self._remember(session_id)
+                    return answer
+
+            initial_state = self._initial_state(message, images)
+            graph, config = self._run(session_id, cache)
+
+            # with a session the checkpointer appends the turn to the stored
+            # history; only the final state is kept, so skip per-step checkpoints
+            result = graph.invoke(initial_state, config, checkpoint_during=False)
+            if session_id is not None:
+                self._remember(session_id)
+            answer = self._final_response(result)
+            if semantic_cache is not None:
+                self._store_answer(semantic_cache, message, result, answer)
+            return answer
 
-            # Run the graph
-            result = self.graph.invoke(initial_state)
-
-            # Extract the final response
-            messages = result["messages"]
-            for msg in reversed(messages):
-                if isinstance(msg, AIMessage):
-                    return msg.content
+        except Exception as e:
+            return f"Error: {str(e)}"
 
-            return "I couldn't generate a response."
+    async def achat(self, message: str, images: List = None, session_id: str = None,
+                    cache: bool = True) -> str:
+        """Async version of chat that never blocks the event loop"""
+        try:
+            semantic_cache = self._semantic_cache_for(images, cache)
+            if (semantic_cache is not None and session_id is not None
+                    and await asyncio.to_thread(self.sessions.exists, session_id)):
+                semantic_cache = None
+            if semantic_cache is not None:
+                answer = semantic_cache.lookup(message)
+                if answer is not None:
+                    if session_id is not None:
+                        await self.session_graph.aupdate_state(
+                            self.sessions.config(session_id), self._cached_turn(message, answer), as_node="agent")
+                        await self._aremember(session_id)
+                    return answer
+
+            initial_state = await self._ainitial_state(message, images)
+            graph, config = self._run(session_id, cache)
+
+            result = await graph.ainvoke(initial_state, config, checkpoint_during=False)
+            if session_id is not None:
+                await self._aremember(session_id)
+            answer = self._final_response(result)
+            if semantic_cache is not None:
+                self._store_answer(semantic_cache, message, result, answer)
+            return answer
 
         except Exception as e:
             return f"Error: {str(e)}"
 
-    def _process_images(self, images: List) -> List[str]:
-        """Process images and return analysis results"""
+    def _final_response(self, result: AgentState) -> str:
+        """Extract the final response from the graph output"""
+        for msg in reversed(result["messages"]):
+            if isinstance(msg, AIMessage):
+                return msg.content
+
+        return "I couldn't generate a response."
+
+    def _process_images(self, images: List) -> List:
+        """Turn request images into attachments, or error messages"""
         results = []
 
         for image in images:
             try:
                 if image.type == "url":
-                    # Process URL image
-                    result = analyze_image_url.invoke(
-                        {"image_url": image.data})
-                    results.append(result)
+                    # fetched and downscaled when the vision request is built
+                    results.append(_url_image_attachment(image))
                 elif image.type == "base64":
-                    # Process base64 image - create a data URL
-                    mime_type = image.mime_type or "image/jpeg"
-                    data_url = f"data:{mime_type};base64,{image.data}"
-                    filename = image.filename or "uploaded_image"
-                    result = f"LOCAL_IMAGE_READY:{data_url}|{filename}"
-                    results.append(result)
+                    # downscale and re-encode in the image worker processes
+                    data, save_format = _decode_base64_image(image)
+                    encoded, _ = get_image_cache().encode(data, save_format)
+                    results.append(_base64_image_attachment(image, encoded, save_format))
+                elif image.type == "handle":
+                    results.append(_handle_image_attachment(image))
             except Exception as e:
                 results.append(f"Error processing image: {str(e)}")
 
         return results
 
-    def chat_stream(self, message: str, images: List = None) -> Generator[dict, None, None]:
+    async def _aprocess_images(self, images: List) -> List:
+        """Async version of _process_images; all images are processed concurrently"""
+        async def process(image):
+            try:
+                if image.type == "url":
+                    return _url_image_attachment(image)
+                if image.type == "handle":
+                    return _handle_image_attachment(image)
+                data, save_format = _decode_base64_image(image)
+                encoded, _ = await get_image_cache().aencode(data, save_format)
+                return _base64_image_attachment(image, encoded, save_format)
+            except Exception as e:
+                return f"Error processing image: {str(e)}"
+
+        return list(await asyncio.gather(*(process(image) for image in images)))
+
+    def _stream_events(self, mode: str, payload, stream_state: dict) -> Generator[dict, None, None]:
+        """Translate one LangGraph stream item into client events"""
+        if mode == "messages":
+            message, metadata = payload
+            if metadata.get("langgraph_node") not in ("agent", "router"):
+                return
+            step = metadata.get("langgraph_step")
+
+            if isinstance(message, AIMessageChunk):
+                # a delta streamed by the model as it is generated
+                if message.content and isinstance(message.content, str):
+                    stream_state["streamed_steps"].add(step)
+                    yield {"event": "token", "data": message.content}
+            elif isinstance(message, AIMessage):
+                # a complete message the node produced without streaming
+                # (e.g. error responses), forward it as a single token
+                if (message.content and isinstance(message.content, str)
+                        and not message.tool_calls
+                        and step not in stream_state["streamed_steps"]):
+                    yield {"event": "token", "data": message.content}
+
+        elif mode == "updates":
+            if "agent" in payload:
+                messages = payload["agent"]["messages"]
+                last_message = messages[-1] if messages else None
+                if getattr(last_message, "tool_calls", None) and not stream_state["tool_phase"]:
+                    yield {"event": "tool_start", "data": "Executing tools..."}
+                    stream_state["tool_phase"] = True
+            elif "tools" in payload and stream_state["tool_phase"]:
+                yield {"event": "tool_end", "data": "Tools completed"}
+                stream_state["tool_phase"] = False
+
+    def chat_stream(self, message: str, images: List = None, session_id: str = None,
+                    cache: bool = True) -> Generator[dict, None, None]:
         """Chat with the agent with streaming support"""
         try:
-            # Create initial state with message
-            human_message = HumanMessage(content=message)
-
-            # If images are provided, process them first
-            if images:
-                processed_images = self._process_images(images)
-                if processed_images:
-                    # Add image analysis results to the conversation
-                    image_messages = []
-                    for img_result in processed_images:
-                        image_messages.append(HumanMessage(content=img_result))
-
-                    initial_state = {"messages": [
-                        human_message] + image_messages}
-                else:
-                    initial_state = {"messages": [human_message]}
-            else:
-                initial_state = {"messages": [human_message]}
-
-            # Track tool execution phase and final response
-            tool_phase = False
-            final_response_sent = False
-
-            # Run the streaming graph
-            for event in self.graph.stream(initial_state):
-                # Check if we're entering or exiting tool phase
-                if "tools" in event:
-                    if not tool_phase:
-                        yield {"event": "tool_start", "data": "Executing tools..."}
-                        tool_phase = True
-                elif tool_phase and "agent" in event:
-                    yield {"event": "tool_end", "data": "Tools completed"}
-                    tool_phase = False
-
-                # Process agent responses
-                if "agent" in event:
-                    messages = event["agent"]["messages"]
-                    last_message = messages[-1] if messages else None
-
-                    if isinstance(last_message, AIMessage) and last_message.content:
-                        # Check if this is a final response (no tool calls)
-                        has_tool_calls = hasattr(
-                            last_message, 'tool_calls') and last_message.tool_calls
-
-                        if not has_tool_calls and not final_response_sent:
-                            # This is the final response, stream it token by token
-                            content = last_message.content
-                            # Stream word by word for better UX
-                            words = content.split()
-                            for i, word in enumerate(words):
-                                token = word + \
-                                    (" " if i < len(words) - 1 else "")
-                                yield {"event": "token", "data": token}
-                            final_response_sent = True
+            initial_state = self._initial_state(message, images)
+            stream_state = {"tool_phase": False, "streamed_steps": set()}
+            graph, config = self._run(session_id, cache)
+
+            # Forward model deltas as they are generated
+            for mode, payload in graph.stream(initial_state, config, stream_mode=["updates", "messages"], checkpoint_during=False):
+                yield from self._stream_events(mode, payload, stream_state)
+
+            if session_id is not None:
+                self._remember(session_id)
 
             # Signal completion
             yield {"event": "done", "data": ""}
@@ -555,40 +881,35 @@ class LangGraphAgent:
         except Exception as e:
             yield {"event": "error", "data": str(e)}
 
-    async def chat_stream_async(self, message: str, images: List = None) -> AsyncGenerator[dict, None]:
-        """Async version of chat_stream with real-time streaming"""
+    async def astream(self, message: str, images: List = None, session_id: str = None,
+                      cache: bool = True) -> AsyncGenerator[dict, None]:
+        """Async version of chat_stream built on graph.astream"""
         try:
-            # Send connection event
-            yield {"event": "connected", "data": "Stream started"}
-
-            # Use asyncio to run the synchronous streaming in a thread
-            loop = asyncio.get_event_loop()
-
-            def collect_events():
-                """Collect all streaming events"""
-                events = []
-                try:
-                    for event in self.chat_stream(message, images):
-                        events.append(event)
-                except Exception as e:
-                    events.append({"event": "error", "data": str(e)})
-                return events
-
-            # Run in thread pool executor
-            events = await loop.run_in_executor(None, collect_events)
-
-            # Yield events with delays for streaming effect
-            for event in events:
-                yield event
-                # Add delay based on event type for better UX
-                if event.get("event") == "token":
-                    await asyncio.sleep(0.03)  # Faster for tokens
-                else:
-                    await asyncio.sleep(0.1)   # Slower for other events
+            initial_state = await self._ainitial_state(message, images)
+            stream_state = {"tool_phase": False, "streamed_steps": set()}
+            graph, config = self._run(session_id, cache)
+
+            async for mode, payload in graph.astream(initial_state, config, stream_mode=["updates", "messages"], checkpoint_during=False):
+                for event in self._stream_events(mode, payload, stream_state):
+                    yield event
+
+            if session_id is not None:
+                await self._aremember(session_id)
+
+            yield {"event": "done", "data": ""}
 
         except Exception as e:
             yield {"event": "error", "data": str(e)}
 
+    async def chat_stream_async(self, message: str, images: List = None, session_id: str = None,
+                                cache: bool = True) -> AsyncGenerator[dict, None]:
+        """Stream events for the SSE endpoint, starting with a connected event"""
+        # Send connection event
+        yield {"event": "connected", "data": "Stream started"}
+
+        async for event in self.astream(message, images, session_id, cache):
+            yield event
+
     def get_capabilities(self):
         """Get agent capabilities for API documentation"""
         return [
@@ -0,0 +1,53 @@
+import uuid
+from typing import List, Literal, Optional, TypedDict
+
+
+class ImageAttachment(TypedDict):
+    """
+    An image for the vision model, kept in the agent state next to the messages.
+
+    `url` is a data URL, a remote http(s) URL or a blob: reference to an
+    upload; remote and blob images are resolved when the vision request is
+    built. Once analyzed, an attachment is marked consumed and its url is
+    dropped, so the payload isn't checkpointed with the session again.
+    """
+    id: str
+    kind: Literal["url", "local", "upload"]
+    # the URL or filename, as shown to the user
+    name: str
+    url: str
+    consumed: bool
+
+
+def image_attachment(kind: str, name: str, url: str) -> ImageAttachment:
+    return {"id": str(uuid.uuid4()), "kind": kind, "name": name, "url": url, "consumed": False}
+
+
+def merge_images(left: Optional[List[ImageAttachment]],
+                 right: Optional[List[ImageAttachment]]) -> List[ImageAttachment]:
+    """
+    Reducer for image attachments: entries replace those with the same id
+    and new ones are appended, so unconsumed attachments are always the
+    newest ones.
+    """
+    left = left or []
+    if not right:
+        return left
+    updates = {a["id"]: a for a in right}
+    merged = [updates.pop(a["id"], a) for a in left]
+    return merged + list(updates.values())
+
+
+def pending_images(images: Optional[List[ImageAttachment]]) -> List[ImageAttachment]:
+    """The attachments waiting for analysis, found from the end of the list"""
+    if not images or images[-1]["consumed"]:
+        return []
+    start = len(images) - 1
+    while start and not images[start - 1]["consumed"]:
+        start -= 1
+    return images[start:]
+
+
+def consume(images: List[ImageAttachment]) -> List[ImageAttachment]:
+    """State update marking `images` as analyzed"""
+    return [{**a, "url": "", "consumed": True} for a in images]
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import mimetypes
+import os
+import re
+import secrets
+import threading
+import time
+from typing import AsyncIterator, NamedTuple, Optional
+
+# 22 url-safe characters, so handles can't escape the blob directory
+HANDLE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{22}$")
+# prefix of image URLs that are resolved from the blob store at vision time
+BLOB_URL_PREFIX = "blob:"
+
+
+class BlobTooLarge(ValueError):
+    """Raised when an upload exceeds the blob store's size limit"""
+
+
+class Blob(NamedTuple):
+    handle: str
+    path: str
+    mime_type: str
+    filename: str
+    size: int
+
+
+class BlobStore:
+    """
+    Local file store for uploaded images, addressed by short random handles.
+
+    Uploads are written chunk by chunk and rejected once they exceed
+    `max_bytes`, so no upload is ever held in memory whole. Blobs older than
+    `ttl_seconds` are removed. Settings default to the BLOB_* environment
+    variables.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None):
+        self.directory = directory or os.getenv("BLOB_DIR", "blobs")
+        self.max_bytes = max_bytes or int(os.getenv("BLOB_MAX_BYTES", str(20 * 1024 * 1024)))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("BLOB_TTL", "86400"))
+        os.makedirs(self.directory, exist_ok=True)
+        self._last_cleanup = 0.0
+
+    def _meta_path(self, handle: str) -> str:
+        return os.path.join(self.directory, f"{handle}.json")
+
+    async def save(self, chunks: AsyncIterator[bytes], mime_type: str,
+                   filename: Optional[str] = None) -> Blob:
+        """Stream `chunks` into a new blob and return it"""
+        handle = secrets.token_urlsafe(16)
+        extension = mimetypes.guess_extension(mime_type) or ""
+        path = os.path.join(self.directory, f"{handle}{extension}")
+        tmp = f"{path}.part"
+
+        size = 0
+        f = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise BlobTooLarge(
+                        f"Upload exceeds the {self.max_bytes:,} byte limit")
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            f.close()
+            os.remove(tmp)
+            raise
+        f.close()
+
+        blob = Blob(handle, path, mime_type, filename or "uploaded_image", size)
+        await asyncio.to_thread(self._commit, tmp, blob)
+        self.cleanup()
+        return blob
+
+    def _commit(self, tmp: str, blob: Blob):
+        os.replace(tmp, blob.path)
+        with open(self._meta_path(blob.handle), "w") as f:
+            json.dump({"path": os.path.basename(blob.path), "mime_type": blob.mime_type,
+                       "filename": blob.filename, "size": blob.size}, f)
+
+    def get(self, handle: str) -> Optional[Blob]:
+        """The blob of `handle`, or None if it doesn't exist or has expired"""
+        if not HANDLE_PATTERN.match(handle):
+            return None
+        meta_path = self._meta_path(handle)
+        try:
+            # an expired blob stays on disk until the next cleanup, but is already gone
+            if os.stat(meta_path).st_mtime < time.time() - self.ttl_seconds:
+                return None
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        return Blob(handle, os.path.join(self.directory, meta["path"]),
+                    meta["mime_type"], meta["filename"], meta["size"])
+
+    def delete(self, handle: str):
+        blob = self.get(handle)
+        if blob is None:
+            return
+        for path in (blob.path, self._meta_path(handle)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def cleanup(self, now: Optional[float] = None):
+        """Remove expired blobs; runs at most once a minute"""
+        now = now or time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.stat().st_mtime < now - self.ttl_seconds:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """The process-wide blob store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore()
+    return _store
+
+
+def set_blob_store(store: Optional[BlobStore]):
+    global _store
+    with _store_lock:
+        _store = store
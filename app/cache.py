@@ -0,0 +1,298 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from .shared_state import SharedStore, SqliteStore
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    function, the others wait for its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared), where shared means another caller ran fn"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl_seconds`.
+
+    With a `store` (see app.shared_state), or a `path` for a SqliteStore,
+    entries are also written to it and the freshest ones are loaded back on
+    startup, so the cache survives restarts; values must then be
+    JSON-serializable. A local miss reads through to the store, so with a
+    SQLite file every worker process sees the entries the others loaded.
+    `get_or_load` fills misses through a SingleFlight so concurrent misses
+    for one key load it once.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0,
+                 path: Optional[str] = None, name: str = "cache", store: Optional[SharedStore] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flight = SingleFlight()
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+
+        self._store = store if store is not None else SqliteStore(path) if path else None
+        if self._store is not None:
+            self._load()
+
+    def _load(self):
+        """Read unexpired entries back from the store, oldest first"""
+        rows = self._store.freshest(self.max_entries)
+        with self._lock:
+            for key, value, expires in reversed(rows):
+                self._entries[self._decode_key(key)] = (expires, json.loads(value))
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        return json.dumps(key)
+
+    @staticmethod
+    def _decode_key(key: str) -> Hashable:
+        value = json.loads(key)
+        return tuple(value) if isinstance(value, list) else value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            if self._store is None:
+                self.misses += 1
+                return default
+
+        # another worker may have loaded it
+        row = self._store.get(self._encode_key(key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return default
+            value, expires = json.loads(row[0]), row[1]
+            self._insert(key, value, expires)
+            self.shared_hits += 1
+            return value
+
+    def _insert(self, key: Hashable, value: Any, expires: float) -> list:
+        # caller holds the lock; returns the evicted keys
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._entries.popitem(last=False)[0])
+        return evicted
+
+    def set(self, key: Hashable, value: Any):
+        expires = time.time() + self.ttl_seconds
+        with self._lock:
+            evicted = self._insert(key, value, expires)
+
+        if self._store is not None:
+            self._store.put(self._encode_key(key), json.dumps(value), expires)
+            # keeps the store bounded; a key another worker still uses is reloaded on its next miss
+            self._store.delete(self._encode_key(k) for k in evicted)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value, or load it once however many callers miss at the same time"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        def load():
+            start = time.perf_counter()
+            value = loader()
+            with self._lock:
+                self.loads += 1
+                self.load_seconds += time.perf_counter() - start
+            self.set(key, value)
+            return value
+
+        value, shared = self._flight.do(key, load)
+        if shared:
+            with self._lock:
+                self.coalesced += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._store is not None:
+            self._store.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and upstream load latency since startup"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "loads": self.loads,
+                "avg_load_ms": self.load_seconds / self.loads * 1000 if self.loads else 0.0,
+            }
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+
+class ByteLRUCache:
+    """
+    Thread-safe LRU cache of byte strings bounded by their total size.
+
+    With `directory`, values are also stored as files named by their key, so
+    they survive restarts; entries evicted from memory stay on disk and are
+    read back on the next lookup. The directory is pruned, least recently
+    used first, once it grows past `max_disk_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, directory: Optional[str] = None,
+                 max_disk_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes or 4 * max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_size = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_size = sum(e.stat().st_size for e in os.scandir(directory) if e.is_file())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _store(self, key: str, value: bytes):
+        # caller holds the lock
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key))
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self.size -= len(self._entries.popitem(last=False)[1])
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    value = f.read()
+                # the file's mtime orders disk entries for pruning
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._store(key, value)
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes):
+        with self._lock:
+            self._store(key, value)
+        if self.directory:
+            # write then rename so readers never see a partial file
+            tmp = f"{self._path(key)}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(value)
+            os.replace(tmp, self._path(key))
+            with self._lock:
+                self.disk_size += len(value)
+                prune = self.disk_size > self.max_disk_bytes
+            if prune:
+                self._prune_disk()
+
+    def _prune_disk(self):
+        """Delete the least recently used files until the directory fits"""
+        files = sorted((e.stat().st_mtime, e.stat().st_size, e.path)
+                       for e in os.scandir(self.directory) if e.is_file())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self.disk_size = total
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
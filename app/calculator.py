@@ -0,0 +1,240 @@
+import ast
+import math
+import os
+from functools import lru_cache, reduce
+from types import CodeType
+from typing import Dict, List, Sequence
+
+# an int result may have at most this many bits (about 3000 decimal digits)
+MAX_INT_BITS = int(os.getenv("CALCULATOR_MAX_INT_BITS", "10000"))
+MAX_LENGTH = int(os.getenv("CALCULATOR_MAX_LENGTH", "1000"))
+MAX_NODES = int(os.getenv("CALCULATOR_MAX_NODES", "200"))
+MAX_ARRAY_SIZE = int(os.getenv("CALCULATOR_MAX_ARRAY_SIZE", "1000000"))
+
+
+class ExpressionError(ValueError):
+    """The expression is not allowed, or too large to evaluate"""
+
+
+def _check_int(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise ExpressionError(f"Result exceeds {MAX_INT_BITS} bits")
+    return value
+
+
+def _pow(base, exponent):
+    # a huge int power would take minutes and gigabytes, so estimate its size first
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if exponent * math.log2(abs(base)) > MAX_INT_BITS:
+            raise ExpressionError(f"Result exceeds {MAX_INT_BITS} bits")
+    result = base ** exponent
+    # a negative base to a fractional power, e.g. (-8) ** 0.5
+    if isinstance(result, complex):
+        raise ExpressionError("Result is not a real number")
+    return result
+
+
+def _mul(left, right):
+    if (isinstance(left, int) and isinstance(right, int)
+            and left.bit_length() + right.bit_length() > MAX_INT_BITS + 1):
+        raise ExpressionError(f"Result exceeds {MAX_INT_BITS} bits")
+    return left * right
+
+
+def _round(number, ndigits=None):
+    # int rounding to -n digits builds 10**n, which takes minutes for a huge n
+    if ndigits is not None and abs(ndigits) > MAX_INT_BITS // 3:
+        raise ExpressionError(f"round() takes at most {MAX_INT_BITS // 3} digits")
+    return round(number, ndigits)
+
+
+def _items(args):
+    """The values of sum/min/max, called as f(1, 2, 3) or f([1, 2, 3])"""
+    return args[0] if len(args) == 1 and isinstance(args[0], (list, tuple)) else args
+
+
+def _checked(function):
+    def call(*args):
+        return _check_int(function(*args))
+    return call
+
+
+SCALAR_FUNCTIONS = {
+    "abs": abs, "round": _round, "min": min, "max": max, "sum": lambda *args: sum(_items(args)),
+    "pow": _pow, "sqrt": math.sqrt, "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "log": math.log, "log10": math.log10, "exp": math.exp,
+}
+
+
+# functions taking a list or tuple literal, e.g. sum([1, 2, 3])
+SEQUENCE_FUNCTIONS = {"sum", "min", "max"}
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+_BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+_CHECKED_OPERATORS = {ast.Pow: "_pow", ast.Mult: "_mul"}
+
+
+class _Validator(ast.NodeVisitor):
+    """
+    Rejects everything but arithmetic, the whitelisted functions and known
+    names, and routes the operators whose result size can explode through
+    checked functions. One pass; each visit returns the node to keep.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.nodes = 0
+
+    def visit(self, node):
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise ExpressionError(f"Expression has more than {MAX_NODES} parts")
+        return super().visit(node)
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BINARY_OPERATORS):
+            raise ExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        checked = _CHECKED_OPERATORS.get(type(node.op))
+        if checked is None:
+            return node
+        function = ast.copy_location(ast.Name(checked, ast.Load()), node)
+        return ast.copy_location(ast.Call(function, [node.left, node.right], []), node)
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARY_OPERATORS):
+            raise ExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ExpressionError(f"Constant {node.value!r} is not a number")
+        _check_int(node.value)
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in self.names:
+            raise ExpressionError(f"Unknown name '{node.id}'")
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in SCALAR_FUNCTIONS:
+            raise ExpressionError("Only the calculator functions can be called")
+        if node.keywords:
+            raise ExpressionError("Keyword arguments are not allowed")
+        if (node.func.id in SEQUENCE_FUNCTIONS and len(node.args) == 1
+                and isinstance(node.args[0], (ast.List, ast.Tuple))):
+            # the literal's items are counted like any other part, so MAX_NODES bounds its size
+            node.args[0].elts = [self.visit(item) for item in node.args[0].elts]
+            return node
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def generic_visit(self, node):
+        raise ExpressionError(f"{type(node).__name__} is not allowed in an expression")
+
+
+@lru_cache(maxsize=int(os.getenv("CALCULATOR_CACHE_SIZE", "1024")))
+def compile_expression(expression: str, variables: tuple = ()) -> CodeType:
+    """
+    Parse, validate and compile an expression once; later calls are cache hits.
+
+    Only numbers, + - * / // % ** (or ^), the calculator functions, pi, e
+    and `variables` are allowed, plus a list or tuple as the only argument of
+    sum, min and max. Raises ExpressionError otherwise.
+    """
+    if len(expression) > MAX_LENGTH:
+        raise ExpressionError(f"Expression is longer than {MAX_LENGTH} characters")
+    try:
+        # people write powers as ^, which Python reads as a (lower precedence) xor
+        tree = ast.parse(expression.strip().replace("^", "**"), mode="eval")
+    except (SyntaxError, RecursionError, MemoryError) as e:
+        raise ExpressionError(f"Invalid expression: {getattr(e, 'msg', None) or type(e).__name__}")
+    return compile(_Validator(set(CONSTANTS) | set(variables)).visit(tree), "<expression>", "eval")
+
+
+_SCALAR_NAMESPACE = {"__builtins__": {}, "_pow": _pow, "_mul": _mul,
+                     **{name: _checked(f) for name, f in SCALAR_FUNCTIONS.items()}, **CONSTANTS}
+
+
+@lru_cache(maxsize=1)
+def _array_namespace() -> dict:
+    """NumPy versions of the calculator functions; NumPy is only imported for array evaluation"""
+    import numpy as np
+
+    def power(base, exponent):
+        # NumPy int powers wrap around silently, float ones overflow to inf
+        return np.power(np.asarray(base, dtype=np.float64), exponent)
+
+    def multiply(left, right):
+        return np.multiply(np.asarray(left, dtype=np.float64), right)
+
+    functions = {
+        "abs": np.abs, "round": np.round, "sum": lambda *args: sum(_items(args)),
+        "min": lambda *args: reduce(np.minimum, _items(args)), "max": lambda *args: reduce(np.maximum, _items(args)),
+        "pow": power, "sqrt": np.sqrt, "sin": np.sin, "cos": np.cos, "tan": np.tan,
+        "log": lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+        "log10": np.log10, "exp": np.exp,
+    }
+    return {"__builtins__": {}, "_pow": power, "_mul": multiply, **functions, **CONSTANTS}
+
+
+def evaluate(expression: str):
+    """The value of one expression, evaluated with Python numbers"""
+    code = compile_expression(expression)
+    try:
+        # the validated code can't assign names, so the namespace is shared
+        return _check_int(eval(code, _SCALAR_NAMESPACE))
+    except ExpressionError:
+        raise
+    except (ArithmeticError, ValueError, TypeError) as e:
+        raise ExpressionError(str(e))
+
+
+def evaluate_many(expressions: Sequence[str]) -> List:
+    """Values of several expressions; a failing one gives its ExpressionError"""
+    results = []
+    for expression in expressions:
+        try:
+            results.append(evaluate(expression))
+        except ExpressionError as e:
+            results.append(e)
+    return results
+
+
+def evaluate_array(expression: str, variables: Dict[str, Sequence[float]]):
+    """
+    Evaluate an expression over arrays in one NumPy pass, e.g.
+    evaluate_array("x**2 + 1", {"x": [1, 2, 3]}). Values are float64, so
+    results out of range become inf rather than exact big ints, and results
+    that aren't real numbers nan.
+    """
+    import numpy as np
+
+    arrays = {name: np.asarray(values, dtype=np.float64) for name, values in variables.items()}
+    if any(a.size > MAX_ARRAY_SIZE for a in arrays.values()):
+        raise ExpressionError(f"Arrays are limited to {MAX_ARRAY_SIZE:,} values")
+    code = compile_expression(expression, tuple(sorted(arrays)))
+    try:
+        with np.errstate(all="ignore"):
+            return np.asarray(eval(code, {**_array_namespace(), **arrays}), dtype=np.float64)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        raise ExpressionError(str(e))
+
+
+def format_value(value) -> str:
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, complex):
+        raise ExpressionError("Result is not a real number")
+    import numpy as np
+
+    return np.array2string(value, separator=", ", threshold=50)
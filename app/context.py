@@ -0,0 +1,238 @@
+import json
+import os
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+# chars per token when no local tokenizer is available
+APPROX_CHARS_PER_TOKEN = 4
+# per-message framing tokens added by the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens with the model's tiktoken encoding.
+
+    Falls back to a character-based estimate when the encoding can't be
+    loaded (tiktoken downloads it on first use). Counts are cached by message
+    id and content: stored messages don't change, but policies may hand over
+    copies with the same id and new content (e.g. DropStaleToolOutput).
+    """
+
+    def __init__(self, model_name: Optional[str] = None, cache_size: int = 10000):
+        self.model_name = model_name or os.getenv("MODEL_NAME", "gpt-4o-mini")
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int], int]" = OrderedDict()
+        self._encoding = None
+        self._loaded = False
+
+    @property
+    def encoding(self):
+        """The tiktoken encoding, or None if it is unavailable"""
+        if not self._loaded:
+            self._loaded = True
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(
+                        self.model_name)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                print(f"Tokenizer unavailable, estimating token counts: {e}")
+        return self._encoding
+
+    def count_text(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + APPROX_CHARS_PER_TOKEN - 1) // APPROX_CHARS_PER_TOKEN
+
+    @staticmethod
+    def _key(message: BaseMessage) -> Optional[Tuple[str, int]]:
+        if message.id is None:
+            return None
+        content = message.content
+        return message.id, hash(content if isinstance(content, str) else json.dumps(content, sort_keys=True))
+
+    def count_message(self, message: BaseMessage) -> int:
+        key = self._key(message)
+        if key is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        tokens = MESSAGE_OVERHEAD_TOKENS
+        if isinstance(message.content, str):
+            tokens += self.count_text(message.content)
+        else:
+            for part in message.content:
+                if isinstance(part, str):
+                    tokens += self.count_text(part)
+                elif part.get("type") == "text":
+                    tokens += self.count_text(part["text"])
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            tokens += self.count_text(tool_call["name"] +
+                                      json.dumps(tool_call["args"]))
+
+        if key is not None:
+            self._cache[key] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count(self, messages: List[BaseMessage]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+
+def split_turns(messages: List[BaseMessage]) -> Tuple[List[BaseMessage], List[List[BaseMessage]]]:
+    """
+    Split a prompt into leading system messages and turns.
+
+    A turn starts at a user message, so an AI tool call always stays in the
+    same turn as its tool results.
+    """
+    start = 0
+    while start < len(messages) and isinstance(messages[start], SystemMessage):
+        start += 1
+
+    turns: List[List[BaseMessage]] = []
+    for message in messages[start:]:
+        if isinstance(message, HumanMessage):
+            turns.append([message])
+        elif turns:
+            turns[-1].append(message)
+        else:
+            turns.append([message])
+    return messages[:start], turns
+
+
+class ContextPolicy:
+    """Shapes the history sent to the model on each call; the base policy keeps everything"""
+
+    def apply(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        return messages
+
+    def __call__(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        return self.apply(messages)
+
+
+class ChainPolicy(ContextPolicy):
+    """Applies several policies in order"""
+
+    def __init__(self, *policies: ContextPolicy):
+        self.policies = policies
+
+    def apply(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        for policy in self.policies:
+            messages = policy.apply(messages)
+        return messages
+
+
+class DropStaleToolOutput(ContextPolicy):
+    """
+    Replaces tool results from older turns with a short placeholder. The
+    model already answered from them, and search results are by far the
+    largest messages in a conversation.
+    """
+
+    def __init__(self, keep_turns: int = 1):
+        self.keep_turns = keep_turns
+
+    def apply(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        system, turns = split_turns(messages)
+        if len(turns) <= self.keep_turns:
+            return messages
+
+        stale = turns[:len(turns) - self.keep_turns] if self.keep_turns else turns
+        result = list(system)
+        for turn in stale:
+            for message in turn:
+                if isinstance(message, ToolMessage):
+                    message = message.model_copy(update={
+                        "content": f"[output of {message.name or 'tool'} omitted from earlier turn]"})
+                result.append(message)
+        for turn in turns[len(stale):]:
+            result.extend(turn)
+        return result
+
+
+class TokenBudget(ContextPolicy):
+    """
+    Drops the oldest whole turns until the prompt fits `max_tokens`.
+
+    System messages and the current turn are always kept.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, counter: TokenCounter = None):
+        self.max_tokens = max_tokens or int(
+            os.getenv("CONTEXT_MAX_TOKENS", "16000"))
+        self.counter = counter if counter is not None else TokenCounter()
+
+    def apply(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        total = self.counter.count(messages)
+        if total <= self.max_tokens:
+            return messages
+
+        system, turns = split_turns(messages)
+        while len(turns) > 1 and total > self.max_tokens:
+            total -= self.counter.count(turns.pop(0))
+        return system + [m for turn in turns for m in turn]
+
+
+class RollingSummary:
+    """
+    Folds older turns into a running summary once the stored history grows
+    past `trigger_tokens`, keeping the last `keep_turns` turns verbatim.
+
+    Unlike the prompt policies this rewrites the stored state, so it runs as
+    its own graph node before the agent.
+    """
+
+    prompt = ("Summarize the conversation so far in a few sentences. Keep facts, "
+              "numbers, names and tool results the user may refer back to.")
+
+    def __init__(self, trigger_tokens: Optional[int] = None, keep_turns: int = 2,
+                 counter: TokenCounter = None):
+        self.trigger_tokens = trigger_tokens or int(
+            os.getenv("CONTEXT_SUMMARY_TOKENS", "8000"))
+        self.keep_turns = keep_turns
+        self.counter = counter if counter is not None else TokenCounter()
+
+    def split(self, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        """Return (messages to fold into the summary, messages to keep)"""
+        if self.counter.count(messages) <= self.trigger_tokens:
+            return [], messages
+        _, turns = split_turns(messages)
+        if len(turns) <= self.keep_turns:
+            return [], messages
+        old = [m for turn in turns[:-self.keep_turns] for m in turn]
+        return old, messages[len(old):]
+
+    def request(self, summary: str, old: List[BaseMessage]) -> List[BaseMessage]:
+        """Messages asking the model to extend `summary` with `old`"""
+        transcript = DropStaleToolOutput(keep_turns=0).apply(old)
+        lines = [f"{type(m).__name__}: {m.content}" for m in transcript
+                 if isinstance(m.content, str) and m.content]
+        if summary:
+            lines.insert(0, f"Summary so far: {summary}")
+        return [SystemMessage(content=self.prompt), HumanMessage(content="\n".join(lines))]
+
+
+def summary_message(summary: str) -> SystemMessage:
+    return SystemMessage(content=f"Summary of the earlier conversation: {summary}")
+
+
+def default_context_policy() -> ContextPolicy:
+    """
+    Enforce the token budget; with CONTEXT_DROP_TOOL_OUTPUT=true, drop stale
+    tool output first
+    """
+    if os.getenv("CONTEXT_DROP_TOOL_OUTPUT", "false").lower() == "true":
+        return ChainPolicy(DropStaleToolOutput(), TokenBudget())
+    return TokenBudget()
@@ -0,0 +1,153 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# the queries are constants so each pooled connection's statement cache
+# keeps them prepared; json_each lets one statement take any number of ids
+USER_COLUMNS = ("id", "name", "email", "age", "city")
+SELECT_USER = "SELECT id, name, email, age, city FROM users WHERE id = ?"
+SELECT_USERS = ("SELECT id, name, email, age, city FROM users "
+                "WHERE id IN (SELECT value FROM json_each(?))")
+
+SAMPLE_USERS = [
+    ('user1', 'Alice Johnson', 'alice@example.com', 28, 'New York'),
+    ('user2', 'Bob Smith', 'bob@example.com', 35, 'San Francisco'),
+    ('user3', 'Carol Davis', 'carol@example.com', 42, 'Chicago'),
+    ('user4', 'David Wilson', 'david@example.com', 31, 'Austin'),
+]
+
+
+class UserDatabase:
+    """
+    Thread-safe pool of connections to the users database.
+
+    `dsn` is "sqlite:///path/to/users.sqlite" (or "sqlite:///:memory:"). A
+    missing users table is created and filled with the sample users, then
+    `pool_size` connections are opened once and shared by all tool calls.
+    With `read_only` (the default) connections can't modify the database.
+    Settings default to the USER_DB_* environment variables.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        read_only: Optional[bool] = None,
+        timeout: float = 5.0,
+    ):
+        self.dsn = dsn or os.getenv("USER_DB_DSN", "sqlite:///users.sqlite")
+        self.pool_size = pool_size or int(os.getenv("USER_DB_POOL_SIZE", "8"))
+        if read_only is None:
+            read_only = os.getenv("USER_DB_READ_ONLY", "true").lower() == "true"
+        self.read_only = read_only
+        self.timeout = timeout
+
+        if not self.dsn.startswith("sqlite:///"):
+            raise ValueError(f"Unsupported database DSN: {self.dsn}")
+        path = self.dsn[len("sqlite:///"):]
+        if path == ":memory:":
+            # a named shared-cache database, kept alive by the setup connection
+            self._uri = f"file:users-{id(self)}?mode=memory&cache=shared"
+            self._setup_conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        else:
+            self._uri = f"file:{path}"
+            self._setup_conn = None
+        self._setup()
+
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._connections = [self._connect() for _ in range(self.pool_size)]
+        for conn in self._connections:
+            self._pool.put(conn)
+
+    def _setup(self):
+        """Create and fill the users table if the database doesn't have one"""
+        conn = self._setup_conn or sqlite3.connect(self._uri, uri=True)
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        id TEXT PRIMARY KEY,
+                        name TEXT,
+                        email TEXT,
+                        age INTEGER,
+                        city TEXT
+                    )
+                ''')
+                if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+                    conn.executemany(
+                        'INSERT INTO users VALUES (?, ?, ?, ?, ?)', SAMPLE_USERS)
+        finally:
+            if conn is not self._setup_conn:
+                conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = self._uri
+        if self.read_only and "mode=memory" not in uri:
+            uri += "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=64)
+        if self.read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection"""
+        try:
+            conn = self._pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("No database connection available") from None
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        with self.connection() as conn:
+            row = conn.execute(SELECT_USER, (user_id,)).fetchone()
+        return dict(zip(USER_COLUMNS, row)) if row else None
+
+    def get_users(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """Look up several users in one query, keyed by id; missing ids are left out"""
+        with self.connection() as conn:
+            rows = conn.execute(SELECT_USERS, (json.dumps(user_ids),)).fetchall()
+        return {row[0]: dict(zip(USER_COLUMNS, row)) for row in rows}
+
+    def user_ids(self, limit: int = 10) -> List[str]:
+        """A few existing ids, for hints in not-found messages"""
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT id FROM users ORDER BY id LIMIT ?", (limit,))]
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+        if self._setup_conn is not None:
+            self._setup_conn.close()
+
+
+_database: Optional[UserDatabase] = None
+_database_lock = threading.Lock()
+
+
+def get_user_database() -> UserDatabase:
+    """The process-wide users database, opened on first use"""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = UserDatabase()
+    return _database
+
+
+def close_user_database():
+    global _database
+    with _database_lock:
+        if _database is not None:
+            _database.close()
+            _database = None
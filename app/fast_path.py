@@ -0,0 +1,92 @@
+import json
+import os
+import re
+import uuid
+from typing import List, NamedTuple, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+# what the calculator can evaluate: numbers, operators, parentheses and its functions
+CALCULATOR_NAMES = ("sqrt", "sin", "cos", "tan", "log10", "log", "exp", "abs", "round",
+                    "min", "max", "sum", "pow", "pi", "e")
+_EXPRESSION = re.compile(
+    r"(?:\d+(?:\.\d*)?|\.\d+|[-+*/%^(),\s]|\*\*|" + "|".join(CALCULATOR_NAMES) + r")+")
+_FUNCTION_CALL = r"\b(?:" + "|".join(CALCULATOR_NAMES[:-2]) + r")\("
+_OPERATION = re.compile(r"[-+*/%^]|" + _FUNCTION_CALL)
+# without a calculate/compute verb, "9/11", "24/7" and "555-1234" are names, not sums:
+# an operator only counts with spaces around it, or in a function call
+_SPACED_OPERATION = re.compile(r"\s(?:\*\*|[-+*/%^])\s|" + _FUNCTION_CALL)
+
+_CALCULATE = re.compile(
+    r"(?:please\s+)?(?:(?P<verb>calculate|compute|evaluate|solve)|what\s+is|what's|whats)?\s*"
+    r"(?P<expression>.+?)\s*[?.!=]*", re.IGNORECASE)
+_USER_ID = r"user\s?\d+"
+_FETCH_USER = re.compile(
+    r"(?:please\s+)?(?:fetch|get|show|find|look\s*up)\s+(?:me\s+)?(?:the\s+)?"
+    r"(?:user\s+(?:info|information|details|data)\s+(?:for|of|about)\s+)?"
+    rf"(?P<ids>{_USER_ID}(?:\s*(?:,|and|&)\s*{_USER_ID})*)"
+    r"(?:\s+(?:from|in)\s+(?:the\s+)?(?:database|db))?\s*[?.!]*", re.IGNORECASE)
+
+
+class Route(NamedTuple):
+    """A tool call that answers the question on its own"""
+    tool: str
+    args: dict
+
+
+class FastPathRouter:
+    """
+    Answers plain calculator and user lookup requests without the model.
+
+    `route` recognizes a question with deterministic patterns that match the
+    whole message (e.g. "what is 2 + 2 * 3?", "fetch user2 from database"),
+    so anything with more to it goes to the model. Arithmetic needs a
+    calculate/compute verb or spaced operators, since "what is 9/11" is not. `answer` phrases the tool
+    result with a template, or gives up (returns None) when the tool failed.
+    """
+
+    def route(self, message: str) -> Optional[Route]:
+        message = message.strip()
+
+        match = _FETCH_USER.fullmatch(message)
+        if match:
+            ids = re.findall(_USER_ID, match.group("ids"), re.IGNORECASE)
+            return Route("fetch_user_from_database",
+                         {"user_id": ",".join(i.replace(" ", "").lower() for i in ids)})
+
+        match = _CALCULATE.fullmatch(message)
+        if match:
+            expression = match.group("expression")
+            if (_EXPRESSION.fullmatch(expression) and re.search(r"\d|\bpi\b", expression)
+                    and _OPERATION.search(expression)
+                    and (match.group("verb") or _SPACED_OPERATION.search(expression))):
+                return Route("calculator", {"expression": expression})
+        return None
+
+    def answer(self, route: Route, result: str) -> Optional[str]:
+        if route.tool == "calculator":
+            if not result.startswith("Result: "):
+                return None
+            return f"{route.args['expression']} = {result[len('Result: '):]}"
+
+        if result.startswith("User found: "):
+            user = json.loads(result[len("User found: "):])
+            return (f"Here is the information for {user['id']}:\n\n"
+                    + "\n".join(f"- {key.capitalize()}: {value}" for key, value in user.items()))
+        if result.startswith("Users found: ") or "not found" in result:
+            return result
+        return None
+
+    def tool_call(self, route: Route) -> dict:
+        return {"name": route.tool, "args": route.args, "id": f"call_{uuid.uuid4().hex[:24]}"}
+
+    def turn(self, tool_call: dict, tool_message: ToolMessage, answer: str) -> List[BaseMessage]:
+        """The messages of a fast-path turn, shaped like a model-driven one"""
+        return [AIMessage(content="", tool_calls=[tool_call]), tool_message, AIMessage(content=answer)]
+
+
+def default_fast_path() -> Optional[FastPathRouter]:
+    """The router, if FAST_PATH is on; it is off by default"""
+    if os.getenv("FAST_PATH", "off") == "off":
+        return None
+    return FastPathRouter()
@@ -0,0 +1,533 @@
+import asyncio
+import base64
+import hashlib
+import ipaddress
+import multiprocessing
+import os
+import socket
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from .cache import ByteLRUCache, TTLCache
+from .shared_state import shared_dir, shared_path
+
+# bump when the processing changes so cached thumbnails aren't reused
+PROCESSING_VERSION = "v3"
+
+VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+# formats images can be re-encoded to; "auto" keeps JPEG for photos, PNG otherwise
+OUTPUT_FORMATS = {'AUTO', 'JPEG', 'PNG', 'WEBP'}
+# the vision API's detail levels; "low" images are scaled to 512px by the API anyway
+DETAIL_LEVELS = {'auto', 'low', 'high'}
+LOW_DETAIL_MAX_SIZE = 512
+
+
+def save_format_for(suffix: str) -> str:
+    """JPEG for photos, PNG for formats that may carry transparency or palettes"""
+    return 'PNG' if suffix.lower() in ['.png', '.gif', '.webp'] else 'JPEG'
+
+
+def save_format_for_mime(mime_type: Optional[str]) -> str:
+    return save_format_for("." + (mime_type or "image/jpeg").split("/")[-1])
+
+
+def load_pillow():
+    """Import Pillow and its format plugins, which it otherwise does on the first image"""
+    from PIL import Image
+
+    Image.init()
+
+
+def encode_image(data: bytes, save_format: str, max_size: int = 1024,
+                 quality: int = 85, draft: bool = True) -> bytes:
+    """Convert, downscale to `max_size` and re-encode an image"""
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as img:
+        # JPEGs can be decoded at a reduced scale, which is much cheaper than
+        # decoding every pixel and then throwing most of them away
+        if draft and img.format == 'JPEG':
+            img.draft('RGB', (max_size, max_size))
+
+        # JPEG has no alpha channel; PNG and WebP keep transparency
+        if save_format == 'JPEG':
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA', 'L'):
+            has_alpha = 'A' in img.mode or 'transparency' in img.info
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+
+        # resize if image is too large (to keep base64 size manageable)
+        if img.size[0] > max_size or img.size[1] > max_size:
+            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+        img_bytes = BytesIO()
+        img.save(img_bytes, format=save_format, quality=quality, optimize=True)
+        return img_bytes.getvalue()
+
+
+def encode_image_file(path: str, save_format: str, max_size: int = 1024,
+                      quality: int = 85, draft: bool = True) -> bytes:
+    """encode_image for a file, read by the worker so the bytes never pass through the caller"""
+    with open(path, "rb") as f:
+        return encode_image(f.read(), save_format, max_size, quality, draft)
+
+
+def to_data_url(encoded: bytes, save_format: str) -> str:
+    return f"data:image/{save_format.lower()};base64,{base64.b64encode(encoded).decode('utf-8')}"
+
+
+class ImageProcessor:
+    """
+    Runs the CPU-bound image pipeline in a pool of worker processes, so
+    decoding and re-encoding neither hold the GIL of the API process nor
+    stall other requests.
+
+    `workers=0` processes images inline. `output_format` re-encodes every
+    image to one format (e.g. WEBP) instead of picking per source, and
+    `detail` is the hint sent to the vision model with each image; "low"
+    also caps the size at 512px. Settings default to the IMAGE_*
+    environment variables.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_size: Optional[int] = None,
+                 quality: Optional[int] = None, draft: bool = True,
+                 output_format: Optional[str] = None, detail: Optional[str] = None):
+        if workers is None:
+            workers = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+        self.workers = workers
+        self.max_size = max_size or int(os.getenv("IMAGE_MAX_SIZE", "1024"))
+        self.quality = quality or int(os.getenv("IMAGE_QUALITY", "85"))
+        self.draft = draft
+        self.output_format = (output_format or os.getenv("IMAGE_FORMAT", "auto")).upper()
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported image format {self.output_format}, "
+                             f"expected one of {', '.join(sorted(OUTPUT_FORMATS))}")
+        self.detail = (detail or os.getenv("IMAGE_DETAIL", "auto")).lower()
+        if self.detail not in DETAIL_LEVELS:
+            raise ValueError(f"Unsupported detail level {self.detail}, "
+                             f"expected one of {', '.join(sorted(DETAIL_LEVELS))}")
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def target_size(self) -> int:
+        """Longest side of processed images"""
+        if self.detail == 'low':
+            return min(self.max_size, LOW_DETAIL_MAX_SIZE)
+        return self.max_size
+
+    @property
+    def version(self) -> str:
+        """Identifies the output, for cache keys"""
+        return f"{PROCESSING_VERSION}-{self.target_size}-q{self.quality}{'-draft' if self.draft else ''}"
+
+    def save_format(self, suffix: Optional[str] = None, mime_type: Optional[str] = None) -> str:
+        """Output format for a source image with this file suffix or MIME type"""
+        if self.output_format != 'AUTO':
+            return self.output_format
+        return save_format_for(suffix) if suffix else save_format_for_mime(mime_type)
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn, since forking a process that runs threads can deadlock
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _args(self, data: bytes, save_format: str, fn=encode_image):
+        return (fn, data, save_format, self.target_size, self.quality, self.draft)
+
+    def _broken(self, error: Exception):
+        # e.g. a script without an `if __name__ == "__main__"` guard can't spawn workers
+        print(f"Image worker pool unavailable, processing images inline: {error}")
+        self.close()
+        self.workers = 0
+
+    def encode(self, data: bytes, save_format: str, fn=encode_image) -> bytes:
+        """Process image bytes (or, with fn=encode_image_file, a file path)"""
+        if self.workers:
+            try:
+                return self.pool.submit(*self._args(data, save_format, fn)).result()
+            except BrokenProcessPool as e:
+                self._broken(e)
+        fn, *args = self._args(data, save_format, fn)
+        return fn(*args)
+
+    async def aencode(self, data: bytes, save_format: str, fn=encode_image) -> bytes:
+        if self.workers:
+            try:
+                return await asyncio.wrap_future(self.pool.submit(*self._args(data, save_format, fn)))
+            except BrokenProcessPool as e:
+                self._broken(e)
+        fn, *args = self._args(data, save_format, fn)
+        return await asyncio.to_thread(fn, *args)
+
+    def start(self):
+        """Spawn the workers and load Pillow now rather than on the first image"""
+        if self.workers:
+            for future in [self.pool.submit(load_pillow) for _ in range(self.workers)]:
+                future.result()
+        else:
+            load_pillow()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def _host_port(request: httpx.Request) -> Tuple[str, int]:
+    url = request.url
+    return url.raw_host.decode("ascii"), url.port or (443 if url.scheme == "https" else 80)
+
+
+def _at_address(request: httpx.Request, address: str) -> httpx.Request:
+    """`request` sent to `address`; the Host header and TLS (SNI and certificate) keep the URL's name"""
+    extensions = request.extensions
+    if request.url.scheme == "https":
+        extensions = {**extensions, "sni_hostname": _host_port(request)[0]}
+    return httpx.Request(request.method, request.url.copy_with(host=address),
+                         headers=request.headers, stream=request.stream, extensions=extensions)
+
+
+class _CheckedTransport(httpx.BaseTransport):
+    """
+    Sends requests only to addresses `check` allowed, and to exactly those:
+    the host is resolved once, and the request goes to the checked address,
+    since resolving once more for the connection would let a host pass the
+    check and then point somewhere else (DNS rebinding).
+    """
+
+    def __init__(self, check: Callable[[str, list], List[str]], limits: httpx.Limits):
+        self.check = check
+        self.transport = httpx.HTTPTransport(limits=limits)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host, port = _host_port(request)
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpx.ConnectError(str(e), request=request)
+        error = None
+        for address in self.check(host, infos):
+            try:
+                return self.transport.handle_request(_at_address(request, address))
+            except httpx.ConnectError as e:
+                error = e
+        raise error
+
+    def close(self):
+        self.transport.close()
+
+
+class _AsyncCheckedTransport(httpx.AsyncBaseTransport):
+    """_CheckedTransport for the async client"""
+
+    def __init__(self, check: Callable[[str, list], List[str]], limits: httpx.Limits):
+        self.check = check
+        self.transport = httpx.AsyncHTTPTransport(limits=limits)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host, port = _host_port(request)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpx.ConnectError(str(e), request=request)
+        error = None
+        for address in self.check(host, infos):
+            try:
+                return await self.transport.handle_async_request(_at_address(request, address))
+            except httpx.ConnectError as e:
+                error = e
+        raise error
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ImageFetcher:
+    """
+    Downloads images over keep-alive connection pools, one per client flavour.
+
+    Responses must be images no larger than `max_bytes`, checked while they
+    stream in. Unless `allow_private`, connections go only to global unicast
+    addresses (no private, loopback or link-local ones), redirects included; the check is
+    made on the addresses actually connected to, so the fetcher connects
+    directly rather than through HTTP(S)_PROXY. Settings default to the
+    IMAGE_FETCH_* environment variables.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, timeout: Optional[float] = None,
+                 allow_private: Optional[bool] = None, max_connections: int = 20):
+        self.max_bytes = max_bytes or int(os.getenv("IMAGE_FETCH_MAX_BYTES", str(20 * 1024 * 1024)))
+        timeout = timeout or float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+        if allow_private is None:
+            allow_private = os.getenv("IMAGE_FETCH_ALLOW_PRIVATE", "false").lower() == "true"
+        self.allow_private = allow_private
+
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections)
+        transport = async_transport = None
+        if not allow_private:
+            # every connection, redirects included, goes through the address check
+            transport = _CheckedTransport(self._check_addresses, limits)
+            async_transport = _AsyncCheckedTransport(self._check_addresses, limits)
+        self.client = httpx.Client(
+            limits=limits, timeout=timeout, follow_redirects=True, transport=transport)
+        self.async_client = httpx.AsyncClient(
+            limits=limits, timeout=timeout, follow_redirects=True, transport=async_transport)
+
+    def _check_addresses(self, host: str, infos) -> List[str]:
+        """The addresses of `host` to connect to; refuses the host if any of them isn't public"""
+        addresses = []
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0])
+            # ::ffff:127.0.0.1 is 127.0.0.1
+            address = getattr(address, "ipv4_mapped", None) or address
+            # not global: private, loopback, link-local, shared (CGNAT) and reserved ranges
+            if not address.is_global or address.is_multicast:
+                raise ValueError(f"Refusing to fetch images from {host}")
+            if str(address) not in addresses:
+                addresses.append(str(address))
+        return addresses
+
+    def _check_response(self, response: httpx.Response):
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if not content_type.startswith("image/"):
+            raise ValueError(f"Not an image: {response.url} ({content_type or 'no content type'})")
+        if int(response.headers.get("content-length", 0)) > self.max_bytes:
+            raise ValueError(f"Image at {response.url} exceeds the {self.max_bytes:,} byte limit")
+        return content_type
+
+    def _limit(self, size: int, url):
+        if size > self.max_bytes:
+            raise ValueError(f"Image at {url} exceeds the {self.max_bytes:,} byte limit")
+
+    @staticmethod
+    def _check_url(url: str):
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise ValueError(f"Invalid image URL: {url}")
+
+    def fetch(self, url: str) -> Tuple[bytes, str]:
+        """Return (image bytes, MIME type)"""
+        self._check_url(url)
+        with self.client.stream("GET", url) as response:
+            mime_type = self._check_response(response)
+            chunks, size = [], 0
+            for chunk in response.iter_bytes():
+                size += len(chunk)
+                self._limit(size, response.url)
+                chunks.append(chunk)
+        return b"".join(chunks), mime_type
+
+    async def afetch(self, url: str) -> Tuple[bytes, str]:
+        self._check_url(url)
+        async with self.async_client.stream("GET", url) as response:
+            mime_type = self._check_response(response)
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                self._limit(size, response.url)
+                chunks.append(chunk)
+        return b"".join(chunks), mime_type
+
+    async def aclose(self):
+        self.client.close()
+        await self.async_client.aclose()
+
+
+class ImageCache:
+    """
+    Content-addressed cache of processed images.
+
+    Thumbnails are stored under the SHA-256 of the source bytes and the
+    processing settings, so the same picture at several paths is encoded
+    once. A (path, mtime, size) index skips re-hashing files that haven't
+    changed, and image URLs are fetched again only after `url_ttl_seconds`.
+    Memory use is bounded by `max_bytes`; with `directory` the thumbnails
+    also persist on disk. Settings default to the IMAGE_CACHE_* environment
+    variables.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, directory: Optional[str] = None,
+                 max_index_entries: int = 4096, processor: ImageProcessor = None,
+                 fetcher: ImageFetcher = None, url_ttl_seconds: float = 600.0):
+        self.processor = processor if processor is not None else get_image_processor()
+        self.fetcher = fetcher if fetcher is not None else ImageFetcher()
+        self.store = ByteLRUCache(
+            max_bytes=max_bytes or int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            directory=directory or os.getenv("IMAGE_CACHE_DIR") or shared_dir("images"),
+        )
+        self.max_index_entries = max_index_entries
+        self._index: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        # url -> (digest, save format) of its thumbnail
+        self._urls = TTLCache(max_entries=max_index_entries, ttl_seconds=url_ttl_seconds,
+                              path=shared_path("image_urls"), name="image_urls")
+        self._lock = threading.Lock()
+
+    def digest(self, data: bytes, save_format: str) -> str:
+        h = hashlib.sha256(data)
+        h.update(f"|{save_format}|{self.processor.version}".encode())
+        return h.hexdigest()
+
+    def _lookup_file(self, path: Path):
+        """Return (stat key, cached thumbnail or None) without reading the file"""
+        stat = path.stat()
+        stat_key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._index.get(stat_key)
+            if digest is not None:
+                self._index.move_to_end(stat_key)
+        return stat_key, self.store.get(digest) if digest is not None else None
+
+    def _remember_file(self, stat_key, digest: str):
+        with self._lock:
+            self._index[stat_key] = digest
+            while len(self._index) > self.max_index_entries:
+                self._index.popitem(last=False)
+
+    def encode(self, data: bytes, save_format: str) -> Tuple[bytes, str]:
+        """Return (encoded thumbnail, digest) for image bytes"""
+        digest = self.digest(data, save_format)
+        encoded = self.store.get(digest)
+        if encoded is None:
+            encoded = self.processor.encode(data, save_format)
+            self.store.set(digest, encoded)
+        return encoded, digest
+
+    async def aencode(self, data: bytes, save_format: str) -> Tuple[bytes, str]:
+        digest = await asyncio.to_thread(self.digest, data, save_format)
+        encoded = self.store.get(digest)
+        if encoded is None:
+            encoded = await self.processor.aencode(data, save_format)
+            self.store.set(digest, encoded)
+        return encoded, digest
+
+    def encode_path(self, path: str, save_format: str, key: str) -> bytes:
+        """
+        Encode an immutable file (e.g. an uploaded blob) cached under `key`.
+
+        The file is neither read nor hashed here; a worker reads it.
+        """
+        key = hashlib.sha256(f"{key}|{save_format}|{self.processor.version}".encode()).hexdigest()
+        encoded = self.store.get(key)
+        if encoded is None:
+            encoded = self.processor.encode(path, save_format, fn=encode_image_file)
+            self.store.set(key, encoded)
+        return encoded
+
+    async def aencode_path(self, path: str, save_format: str, key: str) -> bytes:
+        key = hashlib.sha256(f"{key}|{save_format}|{self.processor.version}".encode()).hexdigest()
+        encoded = self.store.get(key)
+        if encoded is None:
+            encoded = await self.processor.aencode(path, save_format, fn=encode_image_file)
+            self.store.set(key, encoded)
+        return encoded
+
+    def _lookup_url(self, url: str):
+        """Return (cached thumbnail, save format), or (None, None) if it must be fetched"""
+        entry = self._urls.get(url)
+        if entry is not None:
+            digest, save_format = entry
+            encoded = self.store.get(digest)
+            if encoded is not None:
+                return encoded, save_format
+        return None, None
+
+    def encode_url(self, url: str) -> Tuple[bytes, str]:
+        """Fetch, downscale and re-encode a remote image; return (encoded, save format)"""
+        encoded, save_format = self._lookup_url(url)
+        if encoded is None:
+            data, mime_type = self.fetcher.fetch(url)
+            save_format = self.processor.save_format(mime_type=mime_type)
+            encoded, digest = self.encode(data, save_format)
+            self._urls.set(url, (digest, save_format))
+        return encoded, save_format
+
+    async def aencode_url(self, url: str) -> Tuple[bytes, str]:
+        encoded, save_format = self._lookup_url(url)
+        if encoded is None:
+            data, mime_type = await self.fetcher.afetch(url)
+            save_format = self.processor.save_format(mime_type=mime_type)
+            encoded, digest = await self.aencode(data, save_format)
+            self._urls.set(url, (digest, save_format))
+        return encoded, save_format
+
+    def encode_file(self, path: Path) -> Tuple[bytes, str]:
+        """Return (encoded thumbnail, save format) for an image file"""
+        save_format = self.processor.save_format(suffix=path.suffix)
+        stat_key, encoded = self._lookup_file(path)
+        if encoded is None:
+            encoded, digest = self.encode(path.read_bytes(), save_format)
+            self._remember_file(stat_key, digest)
+        return encoded, save_format
+
+    async def aencode_file(self, path: Path) -> Tuple[bytes, str]:
+        save_format = self.processor.save_format(suffix=path.suffix)
+        stat_key, encoded = self._lookup_file(path)
+        if encoded is None:
+            data = await asyncio.to_thread(path.read_bytes)
+            encoded, digest = await self.aencode(data, save_format)
+            self._remember_file(stat_key, digest)
+        return encoded, save_format
+
+    def stats(self) -> Dict:
+        return {**self.store.stats(), "urls": self._urls.stats()}
+
+    async def aclose(self):
+        await self.fetcher.aclose()
+
+
+_processor: Optional[ImageProcessor] = None
+_processor_lock = threading.Lock()
+_cache: Optional[ImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_processor() -> ImageProcessor:
+    """The process-wide image processor, created on first use"""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = ImageProcessor()
+    return _processor
+
+
+def get_image_cache() -> ImageCache:
+    """The process-wide image cache, created on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageCache()
+    return _cache
+
+
+def set_image_cache(cache: Optional[ImageCache]):
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+async def aclose_image_cache():
+    """Release the fetcher's pooled connections, if the cache was ever created"""
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        await cache.aclose()
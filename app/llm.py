@@ -0,0 +1,68 @@
+import os
+from typing import List, Optional
+
+import httpx
+from langchain_core.tools import BaseTool
+from langchain_openai import ChatOpenAI
+
+from .metrics import arecord_http_request, arecord_http_response, record_http_request, record_http_response
+
+
+class ModelRegistry:
+    """Chat models built once per agent and shared across requests and graph steps"""
+
+    def __init__(
+        self,
+        tools: List[BaseTool],
+        model_name: Optional[str] = None,
+        vision_model_name: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 60.0,
+    ):
+        self.model_name = model_name or os.getenv("MODEL_NAME", "gpt-4o-mini")
+        self.vision_model_name = vision_model_name or os.getenv(
+            "VISION_MODEL_NAME", self.model_name)
+        self.temperature = temperature if temperature is not None else float(
+            os.getenv("TEMPERATURE", "0"))
+
+        # one keep-alive connection pool per client flavour, shared by all models
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # request/response sizes go to the model payload metrics
+        self.http_client = httpx.Client(limits=limits, timeout=timeout, event_hooks={
+            "request": [record_http_request], "response": [record_http_response]})
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout, event_hooks={
+            "request": [arecord_http_request], "response": [arecord_http_response]})
+
+        # plain chat model, used as the no-tools fallback
+        self.chat_model = self._build(self.model_name)
+        # tool schemas are serialized once here instead of on every turn
+        self.tool_model = self.chat_model.bind_tools(tools)
+        self.vision_model = (
+            self.chat_model if self.vision_model_name == self.model_name
+            else self._build(self.vision_model_name)
+        )
+
+    def _build(self, model_name: str) -> ChatOpenAI:
+        """Create a chat model wired to the shared connection pools"""
+        return ChatOpenAI(
+            model=model_name,
+            temperature=self.temperature,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+
+    def close(self):
+        """Release pooled connections held by the sync client"""
+        self.http_client.close()
+
+    async def aclose(self):
+        """Release pooled connections held by both clients"""
+        self.http_client.close()
+        await self.http_async_client.aclose()
@@ -1,13 +1,13 @@
-from fastapi import FastAPI, HTTPException, status, File, UploadFile, Form
+from fastapi import FastAPI, Header, HTTPException, Request, status, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
-from typing import Dict, Any, List
+from typing import Annotated, Dict, Any, List, Optional
 import uuid
 import json
-import asyncio
-import base64
 
 from .models import (
     ChatRequest,
@@ -20,7 +20,15 @@ from .models import (
     AgentCapabilities,
     ImageData
 )
+from .admission import Admission, Overloaded, get_admission_controller
 from .agent import LangGraphAgent
+from .blobs import BlobTooLarge, get_blob_store
+from .database import close_user_database, get_user_database
+from .images import aclose_image_cache, get_image_cache, get_image_processor
+from .metrics import REGISTRY, render as render_metrics
+from .search import get_search_service
+from .startup import StartupProfile, warm_up
+from .uploads import MultipartFile, UploadError
 
 # configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,26 +36,56 @@ logger = logging.getLogger(__name__)
 
 # global agent instance
 agent_instance = None
+# pre-initializes clients and dependencies; /health reports ready once it is done
+warmup_task = None
+
+# allowance for the multipart framing around the file
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+# /upload-image reads its form itself, so the file field is declared for the docs here
+UPLOAD_REQUEST_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}}}}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan"""
-    global agent_instance
+    global agent_instance, warmup_task
 
     # startup
     logger.info("🚀 Starting LangGraph Agent API...")
+    profile = StartupProfile()
     try:
-        agent_instance = LangGraphAgent()
+        with profile.step("build agent and compile graph"):
+            agent_instance = LangGraphAgent()
+        # open the users database pool before the first tool call needs it
+        with profile.step("open users database"):
+            get_user_database()
         logger.info("✅ Agent initialized successfully")
     except Exception as e:
         logger.error(f"❌ Failed to initialize agent: {e}")
         raise
 
+    # the server accepts requests meanwhile, but /health reports not ready until it is done
+    if os.getenv("WARMUP", "true").lower() == "true":
+        warmup_task = asyncio.create_task(warm_up(agent_instance, profile))
+    else:
+        profile.log()
+
     yield
 
     # shutdown
     logger.info("🛑 Shutting down LangGraph Agent API...")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await agent_instance.models.aclose()
+    agent_instance.sessions.close()
+    agent_instance.tool_executor.close()
+    if agent_instance.response_cache is not None:
+        agent_instance.response_cache.close()
+    close_user_database()
+    await aclose_image_cache()
+    get_image_processor().close()
+    get_search_service().close()
 
 # create FastAPI app
 app = FastAPI(
@@ -76,7 +114,17 @@ async def http_exception_handler(request, exc):
     """Handle HTTP exceptions"""
     return JSONResponse(
         status_code=exc.status_code,
-        content=ErrorResponse(error=str(exc.detail)).model_dump()
+        content=ErrorResponse(error=str(exc.detail)).model_dump(mode="json")
+    )
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc):
+    """Turn away runs the admission controller has no room for"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=ErrorResponse(error=str(exc)).model_dump(mode="json"),
+        headers={"Retry-After": str(exc.retry_after)}
     )
 
 
@@ -86,7 +134,7 @@ async def general_exception_handler(request, exc):
     logger.error(f"Unexpected error: {exc}")
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        content=ErrorResponse(error="Internal server error").model_dump()
+        content=ErrorResponse(error="Internal server error").model_dump(mode="json")
     )
 
 # routes
@@ -100,7 +148,8 @@ async def root():
         "docs": "/docs",
         "health": "/health",
         "agent_info": "/agent/info",
-        "streaming_chat": "/chat/stream"
+        "streaming_chat": "/chat/stream",
+        "metrics": "/metrics"
     }
 
 
@@ -114,6 +163,11 @@ async def health_check():
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Agent not initialized"
         )
+    if warmup_task is not None and not warmup_task.done():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Agent warming up"
+        )
 
     return HealthResponse()
 
@@ -142,8 +196,14 @@ async def get_agent_info():
     return AgentInfoResponse(capabilities=capabilities)
 
 
+def use_response_cache(cache_control: Optional[str]) -> bool:
+    """A request with Cache-Control: no-cache (or no-store) bypasses the response cache"""
+    directives = {d.strip().lower() for d in (cache_control or "").split(",")}
+    return not directives & {"no-cache", "no-store"}
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(request: ChatRequest):
+async def chat_with_agent(request: ChatRequest, cache_control: Annotated[Optional[str], Header()] = None):
     """Chat with the LangGraph agent"""
     global agent_instance
 
@@ -153,29 +213,51 @@ async def chat_with_agent(request: ChatRequest):
             detail="Agent not initialized"
         )
 
-    try:
-        # generate session ID if not provided
-        session_id = request.session_id or str(uuid.uuid4())
+    # generate session ID if not provided
+    session_id = request.session_id or str(uuid.uuid4())
 
-        logger.info(
-            f"Processing chat request - Session: {session_id}, Message: {request.message[:100]}...")
+    async with get_admission_controller().admit(session_id):
+        try:
+            logger.info(
+                f"Processing chat request - Session: {session_id}, Message: {request.message[:100]}...")
 
-        # get response from agent with images if provided
-        response = agent_instance.chat(request.message, request.images)
+            # get response from agent with images if provided
+            response = await agent_instance.achat(
+                request.message, request.images, session_id,
+                cache=use_response_cache(cache_control))
 
-        logger.info(f"Agent response generated - Session: {session_id}")
+            logger.info(f"Agent response generated - Session: {session_id}")
 
-        return ChatResponse(
-            response=response,
-            session_id=session_id
-        )
+            return ChatResponse(
+                response=response,
+                session_id=session_id
+            )
+
+        except Exception as e:
+            logger.error(f"Error processing chat request: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error processing request: {str(e)}"
+            )
 
-    except Exception as e:
-        logger.error(f"Error processing chat request: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing request: {str(e)}"
-        )
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Streams the response of an admitted run and frees its slot when the
+    response ends, however it ends: iterated, never iterated or cut off by a
+    failed send. The release runs on the event loop, where the admission
+    controller lives.
+    """
+
+    def __init__(self, content, admission: Admission, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.admission.release()
 
 
 @app.options("/chat/stream")
@@ -186,14 +268,15 @@ async def stream_chat_options():
         headers={
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Cache-Control",
             "Access-Control-Max-Age": "86400",
         }
     )
 
 
 @app.post("/chat/stream")
-async def stream_chat_with_agent(request: StreamingChatRequest):
+async def stream_chat_with_agent(request: StreamingChatRequest,
+                                 cache_control: Annotated[Optional[str], Header()] = None):
     """Stream chat responses from the LangGraph agent using Server-Sent Events"""
     global agent_instance
 
@@ -209,20 +292,21 @@ async def stream_chat_with_agent(request: StreamingChatRequest):
     logger.info(
         f"Processing streaming chat request - Session: {session_id}, Message: {request.message[:100]}...")
 
+    # admitted before the response starts, so an overloaded server answers 429/503 rather than an error event
+    admission = await get_admission_controller().acquire(session_id)
+
     async def generate_stream():
         """Generate Server-Sent Events stream"""
         try:
             # Stream the agent response (agent will send its own connected event)
-            async for event_data in agent_instance.chat_stream_async(request.message, request.images):
+            async for event_data in agent_instance.chat_stream_async(
+                    request.message, request.images, session_id, cache=use_response_cache(cache_control)):
                 # Add session_id to each event
                 event_data['session_id'] = session_id
 
                 # Format as Server-Sent Event
                 yield f"data: {json.dumps(event_data)}\n\n"
 
-                # Add small delay between events for better UX
-                await asyncio.sleep(0.01)
-
             logger.info(f"Streaming completed - Session: {session_id}")
 
         except Exception as e:
@@ -233,9 +317,12 @@ async def stream_chat_with_agent(request: StreamingChatRequest):
                 "session_id": session_id
             }
             yield f"data: {json.dumps(error_event)}\n\n"
+        finally:
+            admission.release()
 
-    return StreamingResponse(
+    return AdmittedStreamingResponse(
         generate_stream(),
+        admission,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -243,7 +330,7 @@ async def stream_chat_with_agent(request: StreamingChatRequest):
             "Content-Type": "text/event-stream",
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Cache-Control",
             "X-Accel-Buffering": "no",  # Disable nginx buffering
         }
     )
@@ -281,13 +368,50 @@ async def get_agent_status():
 
     return {
         "initialized": agent_instance is not None,
-        "status": "ready" if agent_instance is not None else "not_initialized"
+        "status": "ready" if agent_instance is not None else "not_initialized",
+        "caches": cache_stats(),
+        "admission": get_admission_controller().stats(),
+    }
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Stats of each cache, None for the ones that are off"""
+    return {
+        "search": get_search_service().stats(),
+        "images": get_image_cache().stats(),
+        "responses": (agent_instance.response_cache.stats()
+                      if agent_instance is not None and agent_instance.response_cache is not None
+                      else None),
+        "semantic": (agent_instance.semantic_cache.stats()
+                     if agent_instance is not None and agent_instance.semantic_cache is not None
+                     else None),
     }
 
 
-@app.post("/upload-image", response_model=ImageData)
-async def upload_image(file: UploadFile = File(...)):
-    """Upload an image and return its base64 representation"""
+@REGISTRY.collector
+def cache_metrics():
+    """Cache hit and miss counters, read from the caches when /metrics is scraped"""
+    caches = {name: stats for name, stats in cache_stats().items() if stats is not None}
+    # hits from the shared store or disk count as hits too
+    hits = {name: stats["hits"] + stats.get("shared_hits", 0) + stats.get("disk_hits", 0)
+            for name, stats in caches.items()}
+    yield ("agent_cache_hits", "counter", "Cache lookups answered by the cache",
+           [({"cache": name}, value) for name, value in hits.items()])
+    yield ("agent_cache_misses", "counter", "Cache lookups that missed",
+           [({"cache": name}, stats["misses"]) for name, stats in caches.items()])
+    yield ("agent_cache_entries", "gauge", "Entries held in memory by each cache",
+           [({"cache": name}, stats["entries"]) for name, stats in caches.items()])
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/upload-image", response_model=ImageData, openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_image(request: Request):
+    """Store an uploaded image and return a handle to send with chat requests"""
     global agent_instance
 
     if agent_instance is None:
@@ -297,32 +421,47 @@ async def upload_image(file: UploadFile = File(...)):
         )
 
     try:
+        store = get_blob_store()
+        # reject oversized uploads before reading the body when the client declares the size
+        declared = int(request.headers.get("content-length") or 0)
+        if declared > store.max_bytes + UPLOAD_OVERHEAD_BYTES:
+            raise BlobTooLarge(
+                f"Upload exceeds the {store.max_bytes // (1024 * 1024)} MB limit")
+
+        # the file goes from the request stream to the blob store as it arrives,
+        # never spooled whole, and the store's limit stops it mid-upload
+        file = MultipartFile(request.stream(), request.headers.get("content-type", ""))
+        await file.open()
+
         # Validate file type
-        if not file.content_type or not file.content_type.startswith('image/'):
+        if not file.content_type.startswith('image/'):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File must be an image"
             )
 
-        # Read the uploaded file
-        file_content = await file.read()
-
-        # Convert to base64
-        base64_string = base64.b64encode(file_content).decode('utf-8')
+        blob = await store.save(file.chunks(), file.content_type, file.filename)
 
-        # Create ImageData object
-        image_data = ImageData(
-            data=base64_string,
-            type="base64",
-            filename=file.filename,
-            mime_type=file.content_type
+        logger.info(f"Image uploaded successfully: {file.filename} ({blob.size} bytes)")
+        return ImageData(
+            data=blob.handle,
+            type="handle",
+            filename=blob.filename,
+            mime_type=blob.mime_type
         )
 
-        logger.info(f"Image uploaded successfully: {file.filename}")
-        return image_data
-
     except HTTPException:
         raise
+    except BlobTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except UploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error uploading image: {e}")
         raise HTTPException(
@@ -331,15 +470,6 @@ async def upload_image(file: UploadFile = File(...)):
         )
 
 if __name__ == "__main__":
-    from granian import Granian
-    from granian.constants import Interfaces
-
-    server = Granian(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        interface=Interfaces.ASGI,
-        reload=True,
-        log_level="info"
-    )
-    server.serve()
+    from .server import serve
+
+    serve()
@@ -0,0 +1,301 @@
+"""
+Prometheus metrics of the agent: graph nodes, model calls and tools.
+
+A small dependency-free registry rendering the Prometheus text format.
+Recording is a lock and a few additions, so it can stay on in the hot path;
+cache hit counts are read from the caches' own counters at scrape time, not
+recorded per lookup. With several server workers each process keeps and
+reports its own values.
+"""
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# (labels, value) pairs of one metric
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """The child for these label values; hot paths can keep it"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(dict(zip(self.label_names, values)), child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, *values: str, amount: float = 1):
+        self.labels(*values).inc(amount)
+
+    def _render_child(self, labels, child):
+        return [f"{self.name}_total{_format_labels(labels)} {_format_value(child.value)}"]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _child(self):
+        return _Value()
+
+    def _render_child(self, labels, child):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.value)}"]
+
+
+class _Timer:
+    __slots__ = ("histogram", "in_flight", "start")
+
+    def __init__(self, histogram, in_flight):
+        self.histogram = histogram
+        self.in_flight = in_flight
+
+    def __enter__(self):
+        if self.in_flight is not None:
+            self.in_flight.inc()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        if self.in_flight is not None:
+            self.in_flight.dec()
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # per bucket, the last one is +Inf; made cumulative when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self, in_flight: _Value = None) -> _Timer:
+        """Context manager observing its duration, optionally counted in an in-flight gauge"""
+        return _Timer(self, in_flight)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def _render_child(self, labels, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics plus collectors that report values owned elsewhere at scrape time"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, Samples]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Samples]]]):
+        """Add a function yielding (name, type, help, samples) on every scrape"""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                sample = f"{name}_total" if kind == "counter" else name
+                lines.extend(f"{sample}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+ENABLED = os.getenv("METRICS", "on") != "off"
+
+NODE_SECONDS = REGISTRY.register(Histogram(
+    "agent_node_duration_seconds", "Time spent in each graph node", ["node"]))
+NODES_IN_FLIGHT = REGISTRY.register(Gauge(
+    "agent_nodes_in_flight", "Graph nodes currently running", ["node"]))
+MODEL_SECONDS = REGISTRY.register(Histogram(
+    "agent_model_call_duration_seconds", "Latency of model calls; kind is tools, chat or vision", ["kind"]))
+MODELS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "agent_model_calls_in_flight", "Model calls currently waiting for a response", ["kind"]))
+MODEL_ERRORS = REGISTRY.register(Counter(
+    "agent_model_errors", "Model calls that raised", ["kind"]))
+MODEL_FALLBACKS = REGISTRY.register(Counter(
+    "agent_model_fallbacks", "Turns answered by a fallback attempt of call_model", ["stage"]))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    "agent_model_prompt_tokens", "Prompt tokens per model call", ["kind"], TOKEN_BUCKETS))
+COMPLETION_TOKENS = REGISTRY.register(Histogram(
+    "agent_model_completion_tokens", "Completion tokens per model call", ["kind"], TOKEN_BUCKETS))
+REQUEST_BYTES = REGISTRY.register(Histogram(
+    "agent_model_request_bytes", "Body size of requests to the model API", buckets=BYTE_BUCKETS))
+RESPONSE_BYTES = REGISTRY.register(Histogram(
+    "agent_model_response_bytes", "Declared body size of model API responses", buckets=BYTE_BUCKETS))
+TOOL_SECONDS = REGISTRY.register(Histogram(
+    "agent_tool_duration_seconds", "Time spent running each tool", ["tool"]))
+TOOLS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "agent_tools_in_flight", "Tool calls currently running", ["tool"]))
+TOOL_ERRORS = REGISTRY.register(Counter(
+    "agent_tool_errors", "Tool calls that failed; reason is error or timeout", ["tool", "reason"]))
+RUNS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "agent_runs_in_flight", "Admitted agent runs currently going"))
+ADMISSION_WAITING = REGISTRY.register(Gauge(
+    "agent_admission_queue_depth", "Requests waiting for a free run slot"))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "agent_admission_wait_seconds", "Time admitted requests waited for a run slot"))
+ADMISSION_REJECTIONS = REGISTRY.register(Counter(
+    "agent_admission_rejections", "Requests turned away; reason is queue_full, queue_timeout or session_limit",
+    ["reason"]))
+
+
+def instrument_node(name: str, func: Callable, afunc: Callable) -> Tuple[Callable, Callable]:
+    """Sync and async node functions timed as `name`; the signatures stay visible to LangGraph"""
+    if not ENABLED:
+        return func, afunc
+    histogram, in_flight = NODE_SECONDS.labels(name), NODES_IN_FLIGHT.labels(name)
+
+    @wraps(func)
+    def timed(*args, **kwargs):
+        with histogram.time(in_flight):
+            return func(*args, **kwargs)
+
+    @wraps(afunc)
+    async def atimed(*args, **kwargs):
+        with histogram.time(in_flight):
+            return await afunc(*args, **kwargs)
+
+    return timed, atimed
+
+
+def model_timer(kind: str):
+    """Times one model call of `kind` (tools, chat or vision)"""
+    return MODEL_SECONDS.labels(kind).time(MODELS_IN_FLIGHT.labels(kind)) if ENABLED else nullcontext()
+
+
+def tool_timer(tool: str):
+    return TOOL_SECONDS.labels(tool).time(TOOLS_IN_FLIGHT.labels(tool)) if ENABLED else nullcontext()
+
+
+def record_response(kind: str, response):
+    """Token counts of a model response, when the API reported them"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and ENABLED:
+        PROMPT_TOKENS.labels(kind).observe(usage.get("input_tokens", 0))
+        COMPLETION_TOKENS.labels(kind).observe(usage.get("output_tokens", 0))
+
+
+def record_http_request(request):
+    REQUEST_BYTES.labels().observe(len(request.content))
+
+
+def record_http_response(response):
+    length = response.headers.get("content-length")
+    if length is not None:
+        RESPONSE_BYTES.labels().observe(int(length))
+
+
+async def arecord_http_request(request):
+    record_http_request(request)
+
+
+async def arecord_http_response(response):
+    record_http_response(response)
+
+
+def render() -> str:
+    return REGISTRY.render()
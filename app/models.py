@@ -6,9 +6,10 @@ from datetime import datetime
 class ImageData(BaseModel):
     """Model for image data"""
     data: str = Field(...,
-                      description="Base64 encoded image data or image URL")
+                      description="Base64 encoded image data, image URL or handle returned by /upload-image")
     type: Literal["base64",
-                  "url"] = Field(..., description="Type of image data")
+                  "url",
+                  "handle"] = Field(..., description="Type of image data")
     filename: Optional[str] = Field(
         None, description="Original filename if uploaded")
     mime_type: Optional[str] = Field(
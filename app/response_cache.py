@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+
+from .cache import TTLCache
+from .shared_state import shared_path
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _message_key(message: BaseMessage) -> Dict[str, Any]:
+    """What the model sees of a message; ids are random per turn and left out"""
+    content = message.content
+    if message.type == "human" and isinstance(content, str):
+        content = _normalize_text(content)
+    key = {"type": message.type, "content": content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        key["tool_calls"] = [{"name": c["name"], "args": c["args"]} for c in tool_calls]
+    if getattr(message, "name", None):
+        key["name"] = message.name
+    return key
+
+
+class ResponseCache:
+    """
+    Exact-match cache of model responses.
+
+    Entries are keyed on the model, its settings and bound tool schemas, and
+    the whole normalized prompt, tool outputs included, so a response is only
+    replayed when the model would see exactly the same input. Only models set
+    explicitly to temperature 0 are cached. `backend` is "memory" (LRU) or
+    "sqlite", which also keeps entries across restarts. Settings default to
+    the RESPONSE_CACHE_* environment variables.
+    """
+
+    def __init__(self, backend: Optional[str] = None, max_entries: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, path: Optional[str] = None):
+        self.backend = backend or os.getenv("RESPONSE_CACHE", "memory")
+        if self.backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown response cache backend: {self.backend}")
+        self.path = (path or os.getenv("RESPONSE_CACHE_PATH") or shared_path("response_cache")
+                     or "response_cache.sqlite")
+        self.cache = TTLCache(
+            max_entries=max_entries or int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+            ttl_seconds=ttl_seconds or float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+            path=self.path if self.backend == "sqlite" else None,
+            name="responses",
+        )
+        self.bypassed = 0
+        # model object id -> (model, fingerprint); models live as long as the agent
+        self._fingerprints: Dict[int, tuple] = {}
+
+    def fingerprint(self, model) -> Optional[str]:
+        """Hash of the model name, settings and bound tools, or None if it isn't deterministic"""
+        entry = self._fingerprints.get(id(model))
+        if entry is not None and entry[0] is model:
+            return entry[1]
+
+        # tool models are RunnableBindings around the chat model
+        bound = getattr(model, "bound", model)
+        temperature = getattr(bound, "temperature", None)
+        fingerprint = None
+        # unset means the API default of 1.0, i.e. sampled
+        if temperature == 0:
+            identity = {
+                "model": getattr(bound, "model_name", None) or getattr(bound, "model", None)
+                or type(bound).__name__,
+                "type": type(bound).__name__,
+                "kwargs": getattr(model, "kwargs", {}),
+            }
+            fingerprint = hashlib.sha256(
+                json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+        self._fingerprints[id(model)] = (model, fingerprint)
+        return fingerprint
+
+    def key(self, model, messages: List[BaseMessage]) -> Optional[str]:
+        fingerprint = self.fingerprint(model)
+        if fingerprint is None:
+            return None
+        prompt = json.dumps([_message_key(m) for m in messages], sort_keys=True, default=str)
+        return hashlib.sha256(f"{fingerprint}|{prompt}".encode()).hexdigest()
+
+    @staticmethod
+    def _load(value) -> AIMessage:
+        message = messages_from_dict([value])[0]
+        # a replayed response is a new message, with new tool call ids
+        message.id = None
+        for call in message.tool_calls:
+            call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+        return message
+
+    @staticmethod
+    def _dump(message: AIMessage):
+        return message_to_dict(message)
+
+    def invoke(self, model, messages: List[BaseMessage]) -> AIMessage:
+        """model.invoke(messages), served from the cache when possible"""
+        key = self.key(model, messages)
+        if key is None:
+            self.bypassed += 1
+            return model.invoke(messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self._load(cached)
+        response = model.invoke(messages)
+        self.cache.set(key, self._dump(response))
+        return response
+
+    async def ainvoke(self, model, messages: List[BaseMessage]) -> AIMessage:
+        key = self.key(model, messages)
+        if key is None:
+            self.bypassed += 1
+            return await model.ainvoke(messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self._load(cached)
+        response = await model.ainvoke(messages)
+        self.cache.set(key, self._dump(response))
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "bypassed": self.bypassed}
+
+    def close(self):
+        self.cache.close()
+
+
+def default_response_cache() -> Optional[ResponseCache]:
+    """The cache configured by RESPONSE_CACHE, or None when it is off (the default)"""
+    if os.getenv("RESPONSE_CACHE", "off") == "off":
+        return None
+    return ResponseCache()
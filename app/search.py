@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .cache import TTLCache
+from .shared_state import shared_path
+
+# a backend takes (query, max_results) and returns DDGS-style result dicts
+# with "title", "href" and "body"
+SearchBackend = Callable[[str, int], List[Dict[str, str]]]
+
+
+class DuckDuckGoBackend:
+    """DuckDuckGo text search, keeping one DDGS session per thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, query: str, max_results: int) -> List[Dict[str, str]]:
+        from duckduckgo_search import DDGS
+
+        ddgs = getattr(self._local, "ddgs", None)
+        if ddgs is None:
+            ddgs = self._local.ddgs = DDGS()
+        return list(ddgs.text(query, max_results=max_results))
+
+
+def normalize_query(query: str) -> str:
+    """Queries differing only in case or whitespace share a cache entry"""
+    return " ".join(query.lower().split())
+
+
+class SearchService:
+    """
+    Web search behind a TTL+LRU cache with single-flight loading.
+
+    Results are cached per normalized (query, max_results), and N concurrent
+    identical searches make one upstream request. Settings default to the
+    SEARCH_CACHE_* environment variables; SEARCH_CACHE_PATH (or
+    SHARED_STATE_DIR) enables on-disk persistence shared by all workers.
+    """
+
+    def __init__(self, backend: SearchBackend = None, cache: TTLCache = None):
+        self.backend = backend if backend is not None else DuckDuckGoBackend()
+        self.cache = cache if cache is not None else TTLCache(
+            max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+            path=os.getenv("SEARCH_CACHE_PATH") or shared_path("search_cache"),
+            name="search",
+        )
+
+    def search(self, query: str, max_results: int = 3) -> List[Dict[str, str]]:
+        key = (normalize_query(query), max_results)
+        return self.cache.get_or_load(key, lambda: self.backend(query, max_results))
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+    def close(self):
+        self.cache.close()
+
+
+_service: Optional[SearchService] = None
+_service_lock = threading.Lock()
+
+
+def get_search_service() -> SearchService:
+    """The process-wide search service, created on first use"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = SearchService()
+    return _service
+
+
+def set_search_service(service: Optional[SearchService]):
+    """Replace the process-wide search service, e.g. with a stub backend"""
+    global _service
+    with _service_lock:
+        _service = service
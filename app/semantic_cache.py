@@ -0,0 +1,203 @@
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+# numbers, arithmetic operators and words: questions differing in these never share an answer
+_TERM = re.compile(r"\d+(?:\.\d+)?|[-+*/^%]|[^\W\d_]+")
+# words that don't change what a question asks for
+FILLER_WORDS = frozenset("""
+    a an the of in on at to for from with about by is are was were be do does did can could would will
+    please me my i you your what s whats which who how tell give show find let know want need like
+    hi hello hey thanks thank just quick quickly
+""".split())
+
+
+class Embedder(Protocol):
+    """Turns texts into a (len(texts), dim) array of unit vectors"""
+    dim: int
+
+    def embed(self, texts: List[str]) -> np.ndarray: ...
+
+
+class HashingEmbedder:
+    """
+    Local, dependency-free embedder: words and character trigrams are hashed
+    into `dim` buckets (signed, to keep collisions from adding up), then the
+    vector is normalized. Similarity reflects shared words and spelling, not
+    meaning: questions about different things score high when they differ in
+    one word, which is why SemanticCache also compares key terms.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or int(os.getenv("SEMANTIC_CACHE_DIM", "256"))
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        joined = f" {' '.join(words)} "
+        return words + [joined[i:i + 3] for i in range(len(joined) - 2)]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.array([zlib.crc32(f.encode()) for f in self._features(text)], dtype=np.int64)
+            if not len(hashes):
+                continue
+            signs = np.where(hashes & (1 << 31), -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class LangChainEmbedder:
+    """Adapts a LangChain `Embeddings` (e.g. a local sentence-transformers model) to `Embedder`"""
+
+    def __init__(self, embeddings, dim: int):
+        self.embeddings = embeddings
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def key_terms(text: str) -> Tuple[str, ...]:
+    """
+    The numbers, operators and content words of `text`, in order. Near
+    duplicates by embedding alone include "capital of France" vs "capital of
+    Spain" and "10 USD to EUR" vs "10 EUR to USD"; requiring these terms to
+    be equal keeps them apart.
+    """
+    return tuple(t for t in _TERM.findall(text.lower()) if t not in FILLER_WORDS)
+
+
+class SemanticCache:
+    """
+    Cache of final answers, looked up by the meaning of the question.
+
+    Questions are embedded by `embedder` (HashingEmbedder by default) into a
+    NumPy matrix; a lookup is one matrix-vector product, and the most similar
+    entry is returned if its cosine similarity reaches `threshold` and it has
+    the same `key` as the question: by default its numbers, operators and
+    content words (`key_terms`), so with the built-in embedder a hit is a
+    rewording in case, punctuation and filler words only. A model-based
+    embedder can be given a looser `key` to match synonyms. The index holds at most
+    `max_bytes` of vectors and text: expired entries go first, then the least
+    recently used. Settings default to the SEMANTIC_CACHE_* environment
+    variables.
+    """
+
+    def __init__(self, embedder: Embedder = None, threshold: Optional[float] = None,
+                 max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 key: Callable[[str], Tuple] = key_terms):
+        self.embedder = embedder if embedder is not None else HashingEmbedder()
+        self.key = key
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+        self.max_bytes = max_bytes or int(os.getenv("SEMANTIC_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        self._lock = threading.Lock()
+
+        # row i of each array is entry i; rows [0, count) are in use
+        self.count = 0
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._expires = np.zeros(0, dtype=np.float64)
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._entries: List[Tuple[str, str]] = []
+        self._clock = 0
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _row_bytes(self) -> int:
+        """Bytes of one row across the arrays"""
+        return self._vectors.itemsize * self.embedder.dim + 24
+
+    def _entry_bytes(self, question: str, answer: str) -> int:
+        # plus the overhead of the two Python strings and their tuple
+        return self._row_bytes() + len(question) + len(answer) + 160
+
+    def _grow(self):
+        # the arrays double, but never past the rows max_bytes could hold
+        capacity = min(max(64, 2 * len(self._expires)), self.max_bytes // self._row_bytes() + 1)
+        for name in ("_vectors", "_keys", "_expires", "_last_used"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def _remove(self, row: int):
+        """Drop entry `row` by moving the last entry into its place"""
+        last = self.count - 1
+        self.size -= self._entry_bytes(*self._entries[row])
+        for array in (self._vectors, self._keys, self._expires, self._last_used):
+            array[row] = array[last]
+        self._entries[row] = self._entries[last]
+        self._entries.pop()
+        self.count -= 1
+
+    def _evict(self, needed: int, now: float):
+        while self.count and self.size + needed > self.max_bytes:
+            live = self._expires[:self.count] > now
+            # expired entries sort before every live one
+            self._remove(int(np.argmin(np.where(live, self._last_used[:self.count], -1))))
+            self.evictions += 1
+
+    def lookup(self, question: str) -> Optional[str]:
+        """The cached answer to a question close enough to `question`, or None"""
+        vector = self.embedder.embed([question])[0]
+        key = hash(self.key(question))
+        with self._lock:
+            if self.count:
+                scores = self._vectors[:self.count] @ vector
+                usable = (self._keys[:self.count] == key) & (self._expires[:self.count] > time.time())
+                scores = np.where(usable, scores, -np.inf)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    self._clock += 1
+                    self._last_used[best] = self._clock
+                    return self._entries[best][1]
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str):
+        """Remember `answer` for `question` and its near-duplicates"""
+        vector = self.embedder.embed([question])[0]
+        needed = self._entry_bytes(question, answer)
+        if needed > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._evict(needed, now)
+            if self.count == len(self._expires):
+                self._grow()
+            row = self.count
+            self._clock += 1
+            self._vectors[row] = vector
+            self._keys[row] = hash(self.key(question))
+            self._expires[row] = now + self.ttl_seconds
+            self._last_used[row] = self._clock
+            self._entries.append((question, answer))
+            self.count += 1
+            self.size += needed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self.count,
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
@@ -0,0 +1,81 @@
+"""
+Granian settings for development and production.
+
+SERVER_PROFILE=development (the default) runs one worker with auto-reload.
+SERVER_PROFILE=production runs WORKERS processes (one per CPU by default)
+without reload, and keeps sessions and caches in SHARED_STATE_DIR so every
+worker sees them.
+"""
+import logging
+import os
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def server_options(profile: str = None) -> Dict[str, Any]:
+    """Granian settings of a profile, overridable by environment variables"""
+    profile = profile or os.getenv("SERVER_PROFILE", "development")
+    if profile not in ("development", "production"):
+        raise ValueError(f"Unknown server profile: {profile}")
+    production = profile == "production"
+    cpus = os.cpu_count() or 1
+    workers = int(os.getenv("WORKERS") or (cpus if production else 1))
+    return {
+        "profile": profile,
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "8000")),
+        "workers": workers,
+        # "st": a single-threaded runtime per thread; "mt": one multi-threaded runtime per worker
+        "runtime_mode": os.getenv("RUNTIME_MODE", "st"),
+        "runtime_threads": int(os.getenv("RUNTIME_THREADS", "1")),
+        "reload": os.getenv("RELOAD", "false" if production else "true").lower() == "true",
+        "backlog": int(os.getenv("BACKLOG", "2048" if production else "1024")),
+        "keep_alive": os.getenv("KEEP_ALIVE", "true").lower() == "true",
+        "shared_state_dir": os.getenv("SHARED_STATE_DIR") or ("state" if production else None),
+        # each worker has its own image pool, so together they use about one process per CPU
+        "image_workers": int(os.getenv("IMAGE_WORKERS") or max(1, cpus // workers)),
+    }
+
+
+def unshared_state(workers: int) -> List[str]:
+    """State that stays private to each worker process, given the current environment"""
+    if workers <= 1:
+        return []
+    problems = []
+    if os.getenv("SESSION_BACKEND", "sqlite") == "memory":
+        problems.append("SESSION_BACKEND=memory: each worker only sees its own sessions")
+    if os.getenv("RESPONSE_CACHE", "off") == "memory":
+        problems.append("RESPONSE_CACHE=memory: use sqlite to share cached responses")
+    if os.getenv("SEMANTIC_CACHE", "off") != "off":
+        problems.append("SEMANTIC_CACHE: each worker keeps its own index")
+    return problems
+
+
+def serve(options: Dict[str, Any] = None):
+    from granian import Granian
+    from granian.constants import Interfaces, RuntimeModes
+    from granian.http import HTTP1Settings
+
+    options = options or server_options()
+    if options["shared_state_dir"]:
+        # workers inherit the environment; app.shared_state reads it there
+        os.environ["SHARED_STATE_DIR"] = options["shared_state_dir"]
+    os.environ["IMAGE_WORKERS"] = str(options["image_workers"])
+    for problem in unshared_state(options["workers"]):
+        logger.warning(f"⚠️  {problem}")
+
+    Granian(
+        "app.main:app",
+        address=options["host"],
+        port=options["port"],
+        interface=Interfaces.ASGI,
+        workers=options["workers"],
+        runtime_threads=options["runtime_threads"],
+        runtime_mode=RuntimeModes(options["runtime_mode"]),
+        backlog=options["backlog"],
+        http1_settings=HTTP1Settings(keep_alive=options["keep_alive"]),
+        respawn_failed_workers=options["profile"] == "production",
+        reload=options["reload"],
+        log_level="info",
+    ).serve()
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .shared_state import shared_path
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver that keeps only the latest checkpoint per session.
+
+    Superseded checkpoints and their pending writes are deleted as soon as a
+    newer checkpoint is saved, so storage per session stays proportional to
+    the conversation instead of growing with every graph step. The async API
+    runs the sync methods in a worker thread so one saver serves both
+    `graph.invoke` and `graph.ainvoke`.
+    """
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL,
+                bytes INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+            """
+        )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(saved["configurable"]["thread_id"])
+        checkpoint_ns = saved["configurable"]["checkpoint_ns"]
+        with self.cursor() as cur:
+            cur.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"]),
+            )
+            cur.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"]),
+            )
+        return saved
+
+    def thread_size(self, thread_id: str) -> int:
+        """Stored bytes of a session's checkpoint and pending writes"""
+        with self.cursor(transaction=False) as cur:
+            cur.execute(
+                "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints WHERE thread_id = ?",
+                (thread_id,),
+            )
+            size = cur.fetchone()[0]
+            cur.execute(
+                "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes WHERE thread_id = ?",
+                (thread_id,),
+            )
+            return size + cur.fetchone()[0]
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class SessionStore:
+    """
+    Session-keyed conversation memory with LRU eviction, TTL expiry and a
+    per-session byte cap.
+
+    `backend` is "sqlite" (file-backed, WAL) or "memory". Settings default to
+    the SESSION_* environment variables.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        path: Optional[str] = None,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_session_bytes: Optional[int] = None,
+    ):
+        self.backend = backend or os.getenv("SESSION_BACKEND", "sqlite")
+        self.path = path or os.getenv("SESSION_DB_PATH") or shared_path("sessions") or "sessions.sqlite"
+        self.max_sessions = max_sessions or int(
+            os.getenv("SESSION_MAX", "10000"))
+        self.ttl_seconds = ttl_seconds or float(
+            os.getenv("SESSION_TTL", "3600"))
+        self.max_session_bytes = max_session_bytes or int(
+            os.getenv("SESSION_MAX_BYTES", str(512 * 1024)))
+
+        if self.backend == "memory":
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+        elif self.backend == "sqlite":
+            # workers of a multi-process server share the file and wait on each other's writes
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        else:
+            raise ValueError(f"Unknown session backend: {self.backend}")
+
+        self.checkpointer = BoundedSqliteSaver(conn)
+        self.checkpointer.setup()
+
+    def config(self, session_id: str) -> RunnableConfig:
+        """Graph config that routes checkpoints to this session"""
+        return {"configurable": {"thread_id": session_id}}
+
+    def record(self, session_id: str) -> int:
+        """Mark a session as used, evict stale sessions and return its size in bytes"""
+        now = time.time()
+        size = self.checkpointer.thread_size(session_id)
+        with self.checkpointer.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, last_seen, bytes) VALUES (?, ?, ?)",
+                (session_id, now, size),
+            )
+        self.evict(now)
+        return size
+
+    def exists(self, session_id: str) -> bool:
+        """Whether a turn of this session has been stored"""
+        with self.checkpointer.cursor(transaction=False) as cur:
+            cur.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,))
+            return cur.fetchone() is not None
+
+    def evict(self, now: Optional[float] = None) -> List[str]:
+        """Drop sessions idle past the TTL, then the least recently used over the cap"""
+        now = now or time.time()
+        with self.checkpointer.cursor(transaction=False) as cur:
+            cur.execute(
+                "SELECT session_id FROM sessions WHERE last_seen < ?",
+                (now - self.ttl_seconds,),
+            )
+            evicted = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT COUNT(*) FROM sessions")
+            overflow = cur.fetchone()[0] - len(evicted) - self.max_sessions
+            if overflow > 0:
+                cur.execute(
+                    "SELECT session_id FROM sessions WHERE last_seen >= ? ORDER BY last_seen LIMIT ?",
+                    (now - self.ttl_seconds, overflow),
+                )
+                evicted += [row[0] for row in cur.fetchall()]
+
+        for session_id in evicted:
+            self.delete(session_id)
+        return evicted
+
+    def delete(self, session_id: str):
+        """Forget a session entirely"""
+        self.checkpointer.delete_thread(session_id)
+        with self.checkpointer.cursor() as cur:
+            cur.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self.checkpointer.cursor(transaction=False) as cur:
+            cur.execute("SELECT COUNT(*) FROM sessions")
+            return cur.fetchone()[0]
+
+    def trim(self, messages: List[BaseMessage], stored_bytes: int) -> List[BaseMessage]:
+        """Drop the oldest whole turns until the session fits the byte cap"""
+        serde = self.checkpointer.serde
+        sizes = [len(serde.dumps_typed(m)[1]) for m in messages]
+        # a turn starts at each user message, so tool calls stay paired with their results
+        starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+
+        start = 0
+        total = sum(sizes)
+        # stored bytes include checkpoint bookkeeping that grows with the history
+        budget = self.max_session_bytes * total / max(stored_bytes, 1)
+        for turn_start in starts[1:]:
+            if total <= budget:
+                break
+            total -= sum(sizes[start:turn_start])
+            start = turn_start
+
+        return messages[start:]
+
+    def close(self):
+        self.checkpointer.conn.close()
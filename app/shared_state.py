@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Protocol, Tuple
+
+
+class SharedStore(Protocol):
+    """
+    String entries with an expiry time, visible to every worker process.
+
+    Caches keep a local copy of what they use and read through to the store
+    on a local miss, so a value loaded by one worker is a hit in the others.
+    """
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """(value, expires) of an unexpired entry, or None"""
+
+    def put(self, key: str, value: str, expires: float): ...
+
+    def delete(self, keys: Iterable[str]): ...
+
+    def freshest(self, limit: int) -> List[Tuple[str, str, float]]:
+        """Up to `limit` unexpired (key, value, expires) entries, freshest first"""
+
+    def clear(self): ...
+
+    def close(self): ...
+
+
+class LocalStore:
+    """In-process stand-in for a shared store, for a single worker and tests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[str, float]] = {}
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        entry = self._entries.get(key)
+        return entry if entry is not None and entry[1] > time.time() else None
+
+    def put(self, key: str, value: str, expires: float):
+        with self._lock:
+            self._entries[key] = (value, expires)
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def freshest(self, limit: int) -> List[Tuple[str, str, float]]:
+        now = time.time()
+        with self._lock:
+            rows = [(k, v, e) for k, (v, e) in self._entries.items() if e > now]
+        return sorted(rows, key=lambda row: -row[2])[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    """
+    Shared store in a SQLite file. WAL mode lets every worker read while one
+    writes; each thread gets its own connection, since a connection shared by
+    threads serializes them.
+    """
+
+    def __init__(self, path: str, table: str = "cache"):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # other workers may hold the write lock for a moment
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        return self._conn().execute(
+            f"SELECT value, expires FROM {self.table} WHERE key = ? AND expires > ?",
+            (key, time.time())).fetchone()
+
+    def put(self, key: str, value: str, expires: float):
+        conn = self._conn()
+        conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                     (key, value, expires))
+        conn.commit()
+
+    def delete(self, keys: Iterable[str]):
+        keys = [(key,) for key in keys]
+        if keys:
+            conn = self._conn()
+            conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", keys)
+            conn.commit()
+
+    def freshest(self, limit: int) -> List[Tuple[str, str, float]]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(f"DELETE FROM {self.table} WHERE expires <= ?", (now,))
+        conn.commit()
+        return conn.execute(
+            f"SELECT key, value, expires FROM {self.table} ORDER BY expires DESC LIMIT ?",
+            (limit,)).fetchall()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute(f"DELETE FROM {self.table}")
+        conn.commit()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def shared_dir(name: str) -> Optional[str]:
+    """A directory in SHARED_STATE_DIR, or None when it isn't set"""
+    directory = os.getenv("SHARED_STATE_DIR")
+    if not directory:
+        return None
+    path = os.path.join(directory, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def shared_path(name: str) -> Optional[str]:
+    """Path of a SQLite file in SHARED_STATE_DIR, or None when it isn't set"""
+    directory = os.getenv("SHARED_STATE_DIR")
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{name}.sqlite")
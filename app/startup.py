@@ -0,0 +1,139 @@
+"""
+Startup profiling and warm-up.
+
+`python -m app.startup` reports which packages make importing the app slow
+and how long each warm-up step takes. With STARTUP_PROFILE=true the server
+logs the same step timings when it starts.
+"""
+import asyncio
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+logger = logging.getLogger(__name__)
+
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class StartupProfile:
+    """Wall time of each named startup step, in order"""
+
+    def __init__(self, enabled: bool = None):
+        self.enabled = enabled if enabled is not None else (
+            os.getenv("STARTUP_PROFILE", "false").lower() == "true")
+        self.steps: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def log(self):
+        if self.enabled:
+            for name, seconds in self.steps:
+                logger.info(f"⏱️  {name}: {seconds * 1000:.1f} ms")
+
+
+def import_times(module: str = "app.main") -> Dict[str, float]:
+    """Seconds spent importing each top-level package when `module` is imported in a fresh interpreter"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    totals: Dict[str, float] = defaultdict(float)
+    for match in _IMPORT_TIME.finditer(result.stderr):
+        self_us, _, _, name = match.groups()
+        # app modules are listed one by one, other packages as a whole
+        package = name if name.startswith("app.") else name.split(".")[0]
+        totals[package] += int(self_us) / 1e6
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def _warm_tokenizer(agent):
+    # the tokenizer encoding is loaded (and on first use downloaded) lazily
+    agent.context_policy.apply([HumanMessage(content="warm up")])
+
+
+def _warm_tools():
+    from .agent import calculator
+    from .database import get_user_database
+
+    calculator.invoke({"expression": "1 + 1"})
+    get_user_database().get_user("user1")
+    # DDGS is imported on the first search; the import alone is most of its cold cost
+    import duckduckgo_search  # noqa: F401
+
+
+async def _warm_connection(agent):
+    """Open a keep-alive connection to the model API, so the first turn skips the TCP and TLS handshakes"""
+    model = agent.models.chat_model
+    base_url = (getattr(model, "openai_api_base", None) or os.getenv("OPENAI_BASE_URL")
+                or "https://api.openai.com/v1").rstrip("/")
+    api_key = getattr(model, "openai_api_key", None)
+    headers = {"Authorization": f"Bearer {api_key.get_secret_value()}"} if api_key else {}
+    # the probe gets its own short timeout, so an unreachable API doesn't hold /health at 503
+    timeout = float(os.getenv("WARMUP_TIMEOUT", "5"))
+    try:
+        # any answer will do, the point is the pooled connection
+        await agent.models.http_async_client.get(f"{base_url}/models", headers=headers, timeout=timeout)
+    except httpx.TimeoutException:
+        logger.warning(f"Model API did not answer the warm-up request within {timeout:g}s")
+
+
+async def warm_up(agent, profile: StartupProfile = None):
+    """
+    Pay the first-request costs now: tokenizer, tool dependencies, image
+    workers and the model API connection. The steps are independent and run
+    concurrently. A failing step is logged and skipped; it only means that
+    cost stays on the first request.
+    """
+    from .images import get_image_processor
+
+    profile = profile if profile is not None else StartupProfile()
+
+    async def run(name, step):
+        with profile.step(name):
+            try:
+                await step
+            except Exception as e:
+                logger.warning(f"{name} failed: {e}")
+
+    with profile.step("warm-up"):
+        await asyncio.gather(
+            run("warm-up: tokenizer", asyncio.to_thread(_warm_tokenizer, agent)),
+            run("warm-up: tools", asyncio.to_thread(_warm_tools)),
+            run("warm-up: image workers", asyncio.to_thread(get_image_processor().start)),
+            run("warm-up: model API connection", _warm_connection(agent)),
+        )
+    profile.log()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+    totals = import_times()
+    print(f"Importing app.main in a fresh interpreter: {sum(totals.values()) * 1000:.0f} ms")
+    for package, seconds in list(totals.items())[:15]:
+        print(f"  {package:<28} {seconds * 1000:7.1f} ms")
+
+    profile = StartupProfile(enabled=True)
+    with profile.step("import app.agent"):
+        from .agent import LangGraphAgent
+    with profile.step("build agent and compile graph"):
+        agent = LangGraphAgent()
+    asyncio.run(warm_up(agent, profile))
+    print(f"\nProfile finished in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
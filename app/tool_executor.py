@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool
+
+from .metrics import TOOL_ERRORS, tool_timer
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one model response concurrently.
+
+    Sync tools run in a bounded thread pool shared by all requests, so
+    `max_concurrency` caps the tools running at once across the process;
+    native async tools are gathered under a semaphore of the same size, one
+    per event loop. Each call gets `timeout` seconds, including any wait for
+    a free worker, and results come back in the order of the tool calls.
+    Settings default to the TOOL_* environment variables.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.tool_map = {t.name: t for t in tools}
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("TOOL_MAX_CONCURRENCY", "8"))
+        self.timeout = timeout or float(os.getenv("TOOL_TIMEOUT", "30"))
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="tool")
+        # a semaphore binds to the loop it is first used on, so each loop gets its own
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """The async tools' semaphore of the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    @staticmethod
+    def message(tool_call: dict, result=None, error: Exception = None) -> ToolMessage:
+        """Wrap a tool result (or the error it raised) in a ToolMessage"""
+        if error is not None:
+            content = f"Error executing {tool_call['name']}: {str(error)}"
+        elif isinstance(result, ToolMessage):
+            # tools invoked with the whole call build their own message, artifact included
+            return result
+        else:
+            content = str(result)
+        return ToolMessage(content=content, tool_call_id=tool_call["id"])
+
+    @staticmethod
+    def _call(tool_call: dict) -> dict:
+        return {**tool_call, "type": "tool_call"}
+
+    def _timeout_message(self, tool_call: dict) -> ToolMessage:
+        return self.message(tool_call, error=TimeoutError(
+            f"timed out after {self.timeout:g}s"))
+
+    def _known(self, tool_calls: List[dict]) -> List[dict]:
+        # calls to unknown tools are skipped
+        return [c for c in tool_calls if c["name"] in self.tool_map]
+
+    def _invoke(self, tool: BaseTool, tool_call: dict):
+        """Run a tool from a worker thread; async-only tools get their own loop"""
+        with tool_timer(tool.name):
+            if getattr(tool, "func", None) is None and getattr(tool, "coroutine", None) is not None:
+                return asyncio.run(tool.ainvoke(self._call(tool_call)))
+            return tool.invoke(self._call(tool_call))
+
+    def run(self, tool_calls: List[dict]) -> List[ToolMessage]:
+        """Execute tool calls concurrently and return their messages in order"""
+        tool_calls = self._known(tool_calls)
+        deadline = time.monotonic() + self.timeout
+        futures = [
+            # copy the context so callbacks and tracing follow the call into the pool
+            self.pool.submit(contextvars.copy_context().run,
+                             self._invoke, self.tool_map[c["name"]], c)
+            for c in tool_calls
+        ]
+
+        messages = []
+        for tool_call, future in zip(tool_calls, futures):
+            try:
+                messages.append(self.message(
+                    tool_call, future.result(timeout=max(0, deadline - time.monotonic()))))
+            except FutureTimeoutError:
+                future.cancel()
+                TOOL_ERRORS.inc(tool_call["name"], "timeout")
+                messages.append(self._timeout_message(tool_call))
+            except Exception as e:
+                TOOL_ERRORS.inc(tool_call["name"], "error")
+                messages.append(self.message(tool_call, error=e))
+        return messages
+
+    async def arun(self, tool_calls: List[dict]) -> List[ToolMessage]:
+        """Async version of run; awaits async tools directly and sync ones in the pool"""
+        tool_calls = self._known(tool_calls)
+        return list(await asyncio.gather(*(self._arun_one(c) for c in tool_calls)))
+
+    async def _arun_one(self, tool_call: dict) -> ToolMessage:
+        tool = self.tool_map[tool_call["name"]]
+        try:
+            if getattr(tool, "coroutine", None) is not None:
+                async with self._semaphore():
+                    with tool_timer(tool.name):
+                        result = await asyncio.wait_for(
+                            tool.ainvoke(self._call(tool_call)), self.timeout)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await asyncio.wait_for(loop.run_in_executor(
+                    self.pool, contextvars.copy_context().run,
+                    self._invoke, tool, tool_call), self.timeout)
+            return self.message(tool_call, result)
+        except asyncio.TimeoutError:
+            TOOL_ERRORS.inc(tool_call["name"], "timeout")
+            return self._timeout_message(tool_call)
+        except Exception as e:
+            TOOL_ERRORS.inc(tool_call["name"], "error")
+            return self.message(tool_call, error=e)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
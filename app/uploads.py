@@ -0,0 +1,108 @@
+"""
+Streaming reader of multipart/form-data uploads.
+
+Starlette parses a form by spooling the whole body to a temporary file
+before the endpoint runs. MultipartFile instead reads the file part straight
+off the request stream, so its bytes can go to the blob store, and be
+rejected by its size limit, as they arrive.
+"""
+from typing import AsyncIterator, Dict, List, Optional
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+class UploadError(ValueError):
+    """The body is not multipart/form-data with a file part"""
+
+
+class MultipartFile:
+    """
+    The first file part of a multipart/form-data body read from `stream`.
+
+    `await open()` reads up to the end of the part's headers and sets
+    `filename` and `content_type`; `chunks()` then yields the file's bytes
+    as they arrive. Form fields before the file are skipped.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], content_type: str):
+        kind, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if kind != b"multipart/form-data" or not boundary:
+            raise UploadError("Expected a multipart/form-data body")
+        self.stream = stream
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = self._value = b""
+        # in the file part's data / past its headers / past its end
+        self._in_file = self._found = self._finished = False
+        self._data: List[bytes] = []
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if self._found or b"filename" not in options:
+            return
+        self._found = self._in_file = True
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        self.content_type = self._headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._data.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._finished = True
+
+    async def _read(self) -> bool:
+        """Feed the next piece of the body to the parser; False once the body has ended"""
+        body = await anext(self.stream, None)
+        if body is None:
+            return False
+        try:
+            self._parser.write(body)
+        except MultipartParseError as e:
+            raise UploadError(f"Malformed form: {e}")
+        return True
+
+    async def open(self):
+        """Read up to the file's content; raises UploadError when the body has no file"""
+        while not self._found:
+            if not await self._read():
+                raise UploadError("The form has no file")
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """The file's bytes, read from the stream as they are consumed"""
+        while True:
+            if self._data:
+                data, self._data = self._data, []
+                yield b"".join(data)
+            if self._finished:
+                return
+            if not await self._read():
+                raise UploadError("The body ended inside the file")
@@ -0,0 +1,165 @@
+import asyncio
+import os
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from .attachments import ImageAttachment
+from .blobs import BLOB_URL_PREFIX, get_blob_store
+from .images import get_image_cache, to_data_url
+
+# what the vision model is asked, and how its answer is introduced, per kind of image
+VISION_PROMPTS = {
+    "url": "Please analyze this image and describe what you see in detail.",
+    "local": "Please analyze this local image ({name}) and describe what you see in detail. Include information about objects, people, colors, composition, and any text visible in the image.",
+    "upload": "Please analyze this uploaded image ({name}) and describe what you see in detail. Include information about objects, people, colors, composition, and any text visible in the image.",
+}
+VISION_LABELS = {
+    "url": "Image from URL: {name}",
+    "local": "Local image: {name}",
+    "upload": "Uploaded image: {name}",
+}
+BATCH_PROMPT = "Please analyze these {count} images and describe what you see in each of them in detail, in order. Include information about objects, people, colors, composition, and any text visible in the images."
+
+
+def vision_request(images: List[ImageAttachment]) -> Tuple[List[dict], str]:
+    """Return (vision content, context label) for one request with all of `images`"""
+    if len(images) == 1:
+        image = images[0]
+        content = [
+            {"type": "text", "text": VISION_PROMPTS[image["kind"]].format(name=image["name"])},
+            {"type": "image_url", "image_url": {"url": image["url"]}},
+        ]
+        return content, VISION_LABELS[image["kind"]].format(name=image["name"])
+
+    content = [{"type": "text", "text": BATCH_PROMPT.format(count=len(images))}]
+    for i, image in enumerate(images, 1):
+        content.append({"type": "text", "text": f"Image {i}: {image['name']}"})
+        content.append({"type": "image_url", "image_url": {"url": image["url"]}})
+    return content, f"{len(images)} images: {', '.join(image['name'] for image in images)}"
+
+
+def _image_parts(vision_content: List[dict]):
+    """Yield the image parts of a vision request"""
+    for part in vision_content:
+        if part.get("type") == "image_url":
+            yield part
+
+
+def _blob(url: str):
+    handle = url[len(BLOB_URL_PREFIX):]
+    blob = get_blob_store().get(handle)
+    if blob is None:
+        raise ValueError(f"Uploaded image {handle} has expired or does not exist")
+    return blob
+
+
+def _with_detail(image_url: dict) -> dict:
+    detail = get_image_cache().processor.detail
+    return image_url if detail == "auto" else {**image_url, "detail": detail}
+
+
+def resolve_images(vision_content: List[dict]) -> List[dict]:
+    """
+    Replace blob references and remote URLs with downscaled data URLs.
+
+    A URL that can't be fetched is passed on as is, for the model provider
+    to try.
+    """
+    cache = get_image_cache()
+    for part in _image_parts(vision_content):
+        url = part["image_url"]["url"]
+        if url.startswith(BLOB_URL_PREFIX):
+            blob = _blob(url)
+            save_format = cache.processor.save_format(mime_type=blob.mime_type)
+            encoded = cache.encode_path(blob.path, save_format, key=blob.handle)
+            url = to_data_url(encoded, save_format)
+        elif url.startswith(("http://", "https://")):
+            try:
+                url = to_data_url(*cache.encode_url(url))
+            except Exception as e:
+                print(f"Could not fetch image {url}: {e}")
+        part["image_url"] = _with_detail({**part["image_url"], "url": url})
+    return vision_content
+
+
+async def aresolve_images(vision_content: List[dict]) -> List[dict]:
+    cache = get_image_cache()
+
+    async def resolve(part):
+        url = part["image_url"]["url"]
+        if url.startswith(BLOB_URL_PREFIX):
+            blob = _blob(url)
+            save_format = cache.processor.save_format(mime_type=blob.mime_type)
+            encoded = await cache.aencode_path(blob.path, save_format, key=blob.handle)
+            url = to_data_url(encoded, save_format)
+        elif url.startswith(("http://", "https://")):
+            try:
+                url = to_data_url(*await cache.aencode_url(url))
+            except Exception as e:
+                print(f"Could not fetch image {url}: {e}")
+        part["image_url"] = _with_detail({**part["image_url"], "url": url})
+
+    await asyncio.gather(*(resolve(part) for part in _image_parts(vision_content)))
+    return vision_content
+
+
+class VisionAnalyzer:
+    """
+    Sends the pending images of a turn to the vision model.
+
+    Images are packed into as few requests as possible, at most `max_images`
+    per request, and the requests run concurrently, at most
+    `max_concurrency` at a time. The answers come back as one message, in
+    image order. Settings default to the VISION_* environment variables.
+    """
+
+    def __init__(self, max_images: Optional[int] = None, max_concurrency: Optional[int] = None):
+        self.max_images = max_images or int(os.getenv("VISION_MAX_IMAGES", "8"))
+        self.max_concurrency = max_concurrency or int(os.getenv("VISION_MAX_CONCURRENCY", "4"))
+
+    def requests(self, images: List[ImageAttachment]) -> List[Tuple[List[dict], str]]:
+        """(vision content, label) of each request needed for `images`"""
+        return [vision_request(images[i:i + self.max_images])
+                for i in range(0, len(images), self.max_images)]
+
+    @staticmethod
+    def _runnable(model) -> RunnableLambda:
+        def call(content):
+            return model.invoke([HumanMessage(content=resolve_images(content))])
+
+        async def acall(content):
+            return await model.ainvoke([HumanMessage(content=await aresolve_images(content))])
+
+        # the requests run concurrently, so their token deltas would interleave on
+        # /chat/stream; only the merged message built by _message is streamed
+        return RunnableLambda(call, afunc=acall, name="vision").with_config(tags=["nostream"])
+
+    @staticmethod
+    def _message(requests, responses) -> AIMessage:
+        if len(requests) == 1 and isinstance(responses[0], Exception):
+            return AIMessage(content=f"Error analyzing image: {str(responses[0])}")
+
+        sections = []
+        for (_, label), response in zip(requests, responses):
+            if isinstance(response, Exception):
+                sections.append(f"Error analyzing {label}: {str(response)}")
+            else:
+                sections.append(f"Image analysis for {label}:\n\n{response.content}")
+        return AIMessage(content="\n\n".join(sections))
+
+    def analyze(self, model, images: List[ImageAttachment]) -> AIMessage:
+        """Analyze `images` with `model` and return the combined answer"""
+        requests = self.requests(images)
+        responses = self._runnable(model).batch(
+            [content for content, _ in requests],
+            config={"max_concurrency": self.max_concurrency}, return_exceptions=True)
+        return self._message(requests, responses)
+
+    async def aanalyze(self, model, images: List[ImageAttachment]) -> AIMessage:
+        requests = self.requests(images)
+        responses = await self._runnable(model).abatch(
+            [content for content, _ in requests],
+            config={"max_concurrency": self.max_concurrency}, return_exceptions=True)
+        return self._message(requests, responses)
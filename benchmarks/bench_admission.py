@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Latency of admitted requests under overload, without and with admission control
+
+Runs benchmarks.loadgen in-process (open loop, /chat/stream, fake model and
+search) at arrival rates from comfortable to well past capacity, once with
+admission control effectively off and once with the limits below. Without
+it every request is let in and p99 grows with the backlog; with it the
+excess is turned away with 503 + Retry-After and the p99 of the admitted
+requests stays near its unloaded value.
+Usage: python -m benchmarks.bench_admission [rate ...]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+DURATION = 6
+# completions the fake model serves at once, like a provider's concurrency limit
+MODEL_CAPACITY = 32
+LIMITS = {"ADMISSION_MAX_IN_FLIGHT": "32", "ADMISSION_MAX_QUEUE": "16", "ADMISSION_QUEUE_TIMEOUT": "1"}
+UNLIMITED = {"ADMISSION_MAX_IN_FLIGHT": "100000", "ADMISSION_MAX_QUEUE": "100000",
+             "ADMISSION_QUEUE_TIMEOUT": "600"}
+
+
+def sweep(rates, limits: dict) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "load.json")
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.loadgen", "--rate", ",".join(rates),
+             "--duration", str(DURATION), "--model-capacity", str(MODEL_CAPACITY), "-o", output],
+            env={**os.environ, "SESSION_BACKEND": "memory", **limits},
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(output) as f:
+            return json.load(f)["steps"]
+
+
+def ms(value) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def main(rates):
+    print(f"open loop, {DURATION} s per rate; limits: "
+          + ", ".join(f"{k}={v}" for k, v in LIMITS.items()) + "\n")
+    results = [("unlimited", sweep(rates, UNLIMITED)), ("admission", sweep(rates, LIMITS))]
+    print(f"{'':<10} {'req/s in':>8} {'served/s':>9} {'rejected':>9} {'p50 ms':>7} {'p99 ms':>7} {'ttft99':>7}")
+    for name, steps in results:
+        for step in steps:
+            print(f"{name:<10} {step['load']:>8g} {step['throughput']:>9.1f} {step['rejection_rate']:>9.0%} "
+                  f"{ms(step['latency_p50_s']):>7} {ms(step['latency_p99_s']):>7} "
+                  f"{ms(step['first_token_p99_s']):>7}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or ["20", "60", "120"])
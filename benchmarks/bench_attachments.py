@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark vision routing and checkpoint size over 50-turn histories with images
+
+Builds the same conversation twice: the old way, with each image as a
+LOCAL_IMAGE_READY data-URL marker message in the history, and as image
+attachments in the state. For a follow-up turn without an image it reports
+the cost of deciding whether the next model call goes to the vision model
+(the old code scanned the history backwards and re-split the newest
+marker), whether that decision re-triggers vision for an old image, and the
+serialized size of the state the checkpointer writes.
+Usage: python -m benchmarks.bench_attachments [turns]
+"""
+import sys
+import timeit
+import uuid
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.attachments import consume, image_attachment, pending_images
+from app.images import ImageCache, ImageProcessor, to_data_url
+from app.vision import vision_request
+
+IMAGE_EVERY = [10, 5, 2]
+
+
+def legacy_find_vision_request(messages):
+    """What call_model ran on every step before attachments"""
+    for msg in reversed(messages):
+        if hasattr(msg, 'content') and isinstance(msg.content, str):
+            if msg.content.startswith("IMAGE_URL_READY:"):
+                image_url = msg.content.replace("IMAGE_URL_READY:", "")
+                return [{"type": "image_url", "image_url": {"url": image_url}}], image_url
+            elif msg.content.startswith("LOCAL_IMAGE_READY:"):
+                parts = msg.content.replace("LOCAL_IMAGE_READY:", "").split("|")
+                filename = parts[1] if len(parts) > 1 else "unknown"
+                return [{"type": "image_url", "image_url": {"url": parts[0]}}], filename
+    return None, ""
+
+
+def conversations(turns: int, every: int, data_url: str):
+    """Return (legacy state, attachment state), each ending with a question without an image"""
+    legacy, current, images = [], [], []
+    for turn in range(turns):
+        question = HumanMessage(content=f"Question {turn}?", id=str(uuid.uuid4()))
+        legacy.append(question)
+        current.append(question)
+        if turn % every == 0:
+            legacy.append(HumanMessage(content=f"LOCAL_IMAGE_READY:{data_url}|photo{turn}.jpg",
+                                       id=str(uuid.uuid4())))
+            images += consume([image_attachment("local", f"photo{turn}.jpg", data_url)])
+            answer = f"Image analysis for Local image: photo{turn}.jpg:\n\nA dog on the grass."
+        else:
+            answer = f"Answer {turn}."
+        reply = AIMessage(content=answer, id=str(uuid.uuid4()))
+        legacy.append(reply)
+        current.append(reply)
+
+    follow_up = HumanMessage(content="Thanks, one more question?", id=str(uuid.uuid4()))
+    return ({"messages": legacy + [follow_up], "summary": ""},
+            {"messages": current + [follow_up], "summary": "", "images": images})
+
+
+def route_new(state):
+    pending = pending_images(state.get("images"))
+    return vision_request(pending) if pending else (None, "")
+
+
+def main(turns: int):
+    cache = ImageCache(processor=ImageProcessor(workers=0))
+    data_url = to_data_url(*cache.encode_file(Path("test_images/dog.jpg")))
+    serde = JsonPlusSerializer()
+    print(f"{turns} turns, image data URL {len(data_url) / 1024:.0f} KB\n")
+
+    print(f"{'images':<14} {'routing':<12} {'us/step':>9} {'re-triggers':>12} {'state KB':>9}")
+    for every in IMAGE_EVERY:
+        legacy, current = conversations(turns, every, data_url)
+        rows = [
+            ("markers", lambda: legacy_find_vision_request(legacy["messages"]), legacy),
+            ("attachments", lambda: route_new(current), current),
+        ]
+        for name, route, state in rows:
+            number, seconds = timeit.Timer(route).autorange()
+            retriggers = route()[0] is not None
+            size = len(serde.dumps_typed(state)[1])
+            print(f"every {every:<2} turns {name:<12} {seconds / number * 1e6:>9.2f} "
+                  f"{'yes' if retriggers else 'no':>12} {size / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Calculator throughput: eval() per call vs the compiled expression engine
+
+The old tool ran eval(expression, safe_dict) on every call, reparsing each
+time. The engine parses and validates an expression once and reuses the
+compiled code; expressions over many values run in one NumPy pass.
+Usage: python -m benchmarks.bench_calculator [evaluations]
+"""
+import math
+import random
+import sys
+import time
+
+from app.calculator import compile_expression, evaluate, evaluate_array
+
+SAFE_DICT = {
+    "__builtins__": {},
+    "abs": abs, "round": round, "min": min, "max": max,
+    "sum": sum, "pow": pow,
+    "sqrt": math.sqrt, "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "log": math.log, "log10": math.log10, "exp": math.exp,
+    "pi": math.pi, "e": math.e,
+}
+EXPRESSIONS = ["2 + 2 * 3", "sqrt(144) + 5**2", "25 * 4 + 10", "sin(pi/2) + cos(0)",
+               "(17 + 3) * 4 / 2", "log10(1000) * exp(1)", "max(3, 9, 4) - abs(-2)", "2**64 % 97"]
+
+
+def throughput(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def main(evaluations: int):
+    rng = random.Random(5)
+    # a realistic mix: popular expressions repeat, others are one-offs
+    repeated = rng.choices(EXPRESSIONS, k=evaluations)
+    unique = [f"{rng.randint(1, 999)} * {rng.randint(1, 999)} + sqrt({rng.randint(1, 999)})"
+              for _ in range(evaluations)]
+
+    print(f"{evaluations} evaluations per case (evaluations/sec)\n")
+    for name, items in [("repeated expressions", repeated), ("unique expressions", unique)]:
+        compile_expression.cache_clear()
+        old = throughput(lambda expression: eval(expression, SAFE_DICT), items)
+        new = throughput(evaluate, items)
+        print(f"{name:<22} eval {old:>10,.0f}   engine {new:>10,.0f}   {new / old:5.1f}x")
+
+    xs = [rng.uniform(0, 100) for _ in range(evaluations)]
+    expression = "sqrt(x) * 3 + x**2 / 7"
+    start = time.perf_counter()
+    for x in xs:
+        eval(expression, {**SAFE_DICT, "x": x})
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    evaluate_array(expression, {"x": xs})
+    vectorized = time.perf_counter() - start
+    print(f"{'one expression, x[i]':<22} eval {evaluations / loop:>10,.0f}   "
+          f"NumPy  {evaluations / vectorized:>10,.0f}   {loop / vectorized:5.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Load test /chat with concurrent requests against a slow fake model
+
+Each request costs one model round-trip of MODEL_LATENCY seconds. If the route
+blocks the event loop, N concurrent requests take N * MODEL_LATENCY and /health
+waits behind them; with the async path they overlap.
+Usage: python -m benchmarks.bench_concurrency [N ...]
+"""
+import asyncio
+import sys
+import time
+from unittest import mock
+
+import app.agent
+import app.llm
+import app.main
+from app.models import ChatRequest
+from benchmarks.fakes import fake_model_factory
+
+MODEL_LATENCY = 0.5
+
+
+async def run(concurrency: int):
+    """Return (wall time, requests/sec, /health latency) for one burst"""
+    start = time.perf_counter()
+
+    async def probe_health():
+        await app.main.health_check()
+        return time.perf_counter() - start
+
+    tasks = [
+        asyncio.ensure_future(
+            app.main.chat_with_agent(ChatRequest(message=f"Hello #{i}")))
+        for i in range(concurrency)
+    ]
+    # /health is scheduled behind the burst, like a probe arriving mid-load
+    health = asyncio.ensure_future(probe_health())
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - start
+    return wall, concurrency / wall, await health
+
+
+async def main(levels):
+    factory = fake_model_factory(first_token_latency=MODEL_LATENCY)
+    with mock.patch.object(app.llm, "ChatOpenAI", factory):
+        app.main.agent_instance = app.agent.LangGraphAgent()
+        print(f"{'N':>4} {'wall (s)':>9} {'req/s':>7} {'/health (s)':>12}")
+        for n in levels:
+            wall, rps, health = await run(n)
+            print(f"{n:>4} {wall:>9.3f} {rps:>7.2f} {health:>12.3f}")
+
+
+if __name__ == "__main__":
+    levels = [int(n) for n in sys.argv[1:]] or [1, 8, 32]
+    asyncio.run(main(levels))
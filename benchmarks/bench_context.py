@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Report prompt tokens per turn with and without the context policy
+
+Replays the recorded conversation in fixtures/conversation.json (image turns
+run analyze_local_image, whose image stays out of the messages) and counts the tokens
+of the first model call of every turn: the full history, the policy with
+CONTEXT_DROP_TOOL_OUTPUT=true (drop stale tool output + token budget), and
+that policy after the rolling summary node.
+Usage: python -m benchmarks.bench_context [max_tokens]
+"""
+import json
+import os
+import sys
+import uuid
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import app.agent
+from app.context import (
+    ChainPolicy,
+    DropStaleToolOutput,
+    RollingSummary,
+    TokenBudget,
+    TokenCounter,
+)
+from benchmarks.fakes import FakeChatModel
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "conversation.json")
+SUMMARY = ("The user asked about recent James Webb Space Telescope discoveries, ran "
+           "calculations (25 * 4 + 10 = 110) and shared images that were analyzed.")
+
+
+def tool_output(output: str) -> str:
+    """Expand {{tool:arg}} placeholders by running the tool"""
+    if output.startswith("{{") and output.endswith("}}"):
+        name, arg = output[2:-2].split(":", 1)
+        return app.agent.tool_map[name].invoke({"file_path": arg})
+    return output
+
+
+def load_turns():
+    """Return [(user message, messages the turn adds after it)]"""
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+
+    turns = []
+    for turn in fixture["turns"]:
+        replies = []
+        calls = [{"name": c["name"], "args": c["args"], "id": f"call_{uuid.uuid4().hex[:8]}"}
+                 for c in turn.get("tool_calls", [])]
+        if calls:
+            replies.append(AIMessage(content="", tool_calls=calls))
+            for call, recorded in zip(calls, turn["tool_calls"]):
+                replies.append(ToolMessage(content=tool_output(recorded["output"]),
+                                           name=call["name"], tool_call_id=call["id"]))
+        replies.append(AIMessage(content=turn["answer"]))
+        for message in replies:
+            message.id = str(uuid.uuid4())
+        turns.append((HumanMessage(content=turn["user"], id=str(uuid.uuid4())), replies))
+    return turns
+
+
+def main(max_tokens: int):
+    counter = TokenCounter()
+    policy = ChainPolicy(DropStaleToolOutput(),
+                         TokenBudget(max_tokens=max_tokens, counter=counter))
+    summarizer = RollingSummary(trigger_tokens=max_tokens // 4, keep_turns=2, counter=counter)
+    models = SimpleNamespace(chat_model=FakeChatModel(answer=SUMMARY))
+
+    full = {"messages": [], "summary": ""}
+    summarized = {"messages": [], "summary": ""}
+    totals = [0, 0, 0]
+
+    print(f"tokenizer: {'tiktoken' if counter.encoding else 'estimate (~4 chars/token)'}, "
+          f"budget {max_tokens} tokens")
+    print(f"{'turn':>4}  {'full history':>12}  {'policy':>8}  {'+ summary':>9}  user message")
+    for i, (user, replies) in enumerate(load_turns(), 1):
+        for state in (full, summarized):
+            state["messages"] = state["messages"] + [user]
+
+        update = app.agent.summarize(summarized, models=models, summarizer=summarizer)
+        if update:
+            removed = {m.id for m in update["messages"]}
+            summarized = {"summary": update["summary"],
+                          "messages": [m for m in summarized["messages"] if m.id not in removed]}
+
+        counts = [
+            counter.count(app.agent._prompt(full, None)),
+            counter.count(app.agent._prompt(full, policy)),
+            counter.count(app.agent._prompt(summarized, policy)),
+        ]
+        totals = [t + c for t, c in zip(totals, counts)]
+        print(f"{i:>4}  {counts[0]:>12}  {counts[1]:>8}  {counts[2]:>9}  {user.content[:40]}")
+
+        for state in (full, summarized):
+            state["messages"] = state["messages"] + replies
+
+    print(f"{'sum':>4}  {totals[0]:>12}  {totals[1]:>8}  {totals[2]:>9}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4000)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark user lookups/sec at 1, 8 and 64 concurrent callers
+
+Compares the old per-call setup (new in-memory database, create table,
+insert the fixture rows, query, close) with the pooled UserDatabase, for
+single lookups, batched lookups of 10 ids in one query, and the
+fetch_user_from_database tool itself.
+Usage: python -m benchmarks.bench_database [lookups_per_caller]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from app.database import SAMPLE_USERS, UserDatabase
+
+CALLERS = [1, 8, 64]
+BATCH = 10
+
+
+def legacy_lookup(user_id: str):
+    """What fetch_user_from_database did on every call"""
+    conn = sqlite3.connect(':memory:')
+    cursor = conn.cursor()
+    cursor.execute('CREATE TABLE users (id TEXT PRIMARY KEY, name TEXT, email TEXT, age INTEGER, city TEXT)')
+    cursor.executemany('INSERT INTO users VALUES (?, ?, ?, ?, ?)', SAMPLE_USERS)
+    conn.commit()
+    cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+    cursor.fetchone()
+    conn.close()
+
+
+def throughput(fn, callers: int, per_caller: int, ids_per_call: int = 1) -> float:
+    """Lookups per second with `callers` threads each making `per_caller` calls"""
+    barrier = threading.Barrier(callers + 1)
+
+    def worker():
+        ids = [f"user{random.randint(1, 4)}" for _ in range(per_caller)]
+        barrier.wait()
+        for user_id in ids:
+            fn(user_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(callers)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return callers * per_caller * ids_per_call / (time.perf_counter() - start)
+
+
+def main(per_caller: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["USER_DB_DSN"] = f"sqlite:///{os.path.join(tmp, 'users.sqlite')}"
+        # imported after the DSN is set so the tool uses the temporary database
+        from app.agent import fetch_user_from_database
+        from app.database import close_user_database
+
+        db = UserDatabase()
+        batch = [f"user{i % 4 + 1}" for i in range(BATCH)]
+        scenarios = [
+            ("per-call in-memory setup", legacy_lookup, 1),
+            (f"pooled get_user ({db.pool_size} conns)", db.get_user, 1),
+            (f"pooled get_users x{BATCH}", lambda _: db.get_users(batch), BATCH),
+            ("fetch_user_from_database tool",
+             lambda user_id: fetch_user_from_database.invoke({"user_id": user_id}), 1),
+        ]
+
+        print(f"{'lookups/sec':<34}" + "".join(f"{c:>10} callers" for c in CALLERS))
+        for name, fn, ids_per_call in scenarios:
+            rates = [throughput(fn, c, per_caller, ids_per_call) for c in CALLERS]
+            print(f"{name:<34}" + "".join(f"{r:>18,.0f}" for r in rates))
+
+        db.close()
+        close_user_database()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Share of a sample query log served by the fast-path router, and its latency
+
+The log mixes the capability examples, test_calc.py style arithmetic, user
+lookups, searches and free-form questions. Every query runs as a fresh turn
+with the router off and on; the fake model answers after a tool round, so a
+model-driven turn costs two calls of LATENCY seconds.
+Usage: python -m benchmarks.bench_fast_path [latency]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+import app.agent
+import app.llm
+from app.fast_path import FastPathRouter
+from app.sessions import SessionStore
+from benchmarks.fakes import fake_model_factory
+
+QUERIES = [
+    # arithmetic
+    "what is 2 + 2 * 3?", "Calculate 25 * 4 + 10", "Calculate 15 * 23 + 7", "calculate sqrt(144) + 5^2",
+    "what's 1024 / 16", "compute (17 + 3) * 4", "12.5 * 8", "what is sin(pi/2)", "evaluate 2^10 - 1",
+    "calculate the area of a circle with radius 5", "what is 15% of 80?", "how much is 3 dozen eggs?",
+    # user lookups
+    "fetch user1 from database", "get user info for user2", "Fetch user3", "look up user4 in the db",
+    "fetch user1, user2 and user3", "who is user2 and where do they live?", "get user9 from database",
+    # everything else
+    "search for latest Python news", "find information about FastAPI", "Hello, how are you?",
+    "analyze this image of a sunset over mountains", "Explain LangGraph in two sentences",
+    "What's the weather in Paris tomorrow?", "Write a haiku about caching",
+]
+
+
+def query_log(size: int, seed: int = 3):
+    return random.Random(seed).choices(QUERIES, k=size)
+
+
+async def replay(agent, log):
+    latencies = []
+    for query in log:
+        start = time.perf_counter()
+        await agent.achat(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(int(len(samples) * 0.99), len(samples) - 1)]
+
+
+def main(latency: float):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    factory = fake_model_factory(
+        tool_calls=[{"name": "calculator", "args": {"expression": "2 + 2"}}],
+        first_token_latency=latency,
+    )
+    log = query_log(300)
+    router = FastPathRouter()
+    fast = [router.route(q) is not None for q in log]
+
+    for name, fast_path in [("router off", None), ("router on", router)]:
+        with mock.patch.object(app.llm, "ChatOpenAI", factory):
+            agent = app.agent.LangGraphAgent(sessions=SessionStore(backend="memory"), fast_path=fast_path)
+        latencies = asyncio.run(replay(agent, log))
+        agent.tool_executor.close()
+
+        print(f"{name}: {sum(latencies) / 1000:.2f}s for {len(log)} queries")
+        for label, selected in [("fast-path queries", True), ("other queries", False)]:
+            samples = [ms for ms, is_fast in zip(latencies, fast) if is_fast == selected]
+            p50, p99 = percentiles(samples)
+            print(f"  {label:<18} {len(samples):>4}  p50 {p50:8.2f} ms  p99 {p99:8.2f} ms")
+
+    distinct = {q for q, is_fast in zip(log, fast) if is_fast}
+    print(f"\nfast-path share of the log: {sum(fast) / len(log):.0%} "
+          f"({len(distinct)} of {len(QUERIES)} distinct queries)")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.05)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent image processing: inline threads vs the process pool
+
+Processes a batch of phone-sized (4032x3024) JPEGs concurrently through
+ImageProcessor.aencode with 0 workers (inline, in the default thread pool,
+sharing the GIL) and with 1, 2, 4 ... cpu_count worker processes. Reports
+throughput, speedup over one worker and the worst event loop stall seen by a
+ticker task, i.e. how long other requests on the same worker would wait.
+Usage: python -m benchmarks.bench_image_pool [images]
+"""
+import asyncio
+import os
+import sys
+import time
+from io import BytesIO
+
+from app.images import ImageProcessor
+
+
+def phone_photo(seed: int) -> bytes:
+    """A 12 MP JPEG with enough detail to be costly to decode and resize"""
+    from PIL import Image, ImageDraw
+
+    img = Image.linear_gradient("L").resize((4032, 3024)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 4032, 48):
+        draw.line([(i, 0), (4032 - i, 3024)], fill=((i * seed) % 256, 80, 160), width=5)
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=92)
+    return out.getvalue()
+
+
+async def run(processor: ImageProcessor, photos):
+    """Return (seconds, worst event loop stall in ms) for processing all photos at once"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            stalls.append(time.perf_counter() - start - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(processor.aencode(photo, "JPEG") for photo in photos))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return elapsed, max(stalls) * 1000
+
+
+def main(count: int):
+    cpus = os.cpu_count() or 1
+    photos = [phone_photo(i) for i in range(count)]
+    print(f"{count} photos of {len(photos[0]) / 1e6:.1f} MB, {cpus} CPU(s)\n")
+
+    single = ImageProcessor(workers=0)
+    for draft in (False, True):
+        single.draft = draft
+        start = time.perf_counter()
+        single.encode(photos[0], "JPEG")
+        print(f"one photo inline, draft={draft}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"\n{'workers':<16} {'seconds':>8} {'images/s':>9} {'speedup':>8} {'max loop stall':>15}")
+    worker_counts = sorted({1, 2, 4, cpus})
+    baseline = None
+    for workers in [0] + worker_counts:
+        processor = ImageProcessor(workers=workers)
+        processor.start()
+        elapsed, stall = asyncio.run(run(processor, photos))
+        processor.close()
+        if workers == 1:
+            baseline = elapsed
+        speedup = f"{baseline / elapsed:.2f}x" if baseline else "-"
+        name = "inline threads" if workers == 0 else f"{workers} processes"
+        print(f"{name:<16} {elapsed:>8.3f} {count / elapsed:>9.2f} {speedup:>8} {stall:>12.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 16)
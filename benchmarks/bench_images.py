@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold vs warm latency and CPU time of preparing local images
+
+Runs analyze_local_image over the test_images/ fixtures: cold (no cache, i.e.
+decode + resize + optimized re-encode every call), warm from memory, and warm
+from the disk directory after a restart.
+Usage: python -m benchmarks.bench_images [repeats]
+"""
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.agent import analyze_local_image
+from app.images import ImageCache, set_image_cache
+
+IMAGES = sorted(str(p) for p in Path("test_images").iterdir()
+                if p.suffix.lower() in {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"})
+
+
+def measure(repeats: int, fresh_cache=None):
+    """Median wall and CPU milliseconds per call, over all fixtures"""
+    wall, cpu = [], []
+    for _ in range(repeats):
+        for path in IMAGES:
+            if fresh_cache is not None:
+                set_image_cache(fresh_cache())
+            start, start_cpu = time.perf_counter(), time.process_time()
+            result = analyze_local_image.invoke({
+                "type": "tool_call", "id": "bench", "name": "analyze_local_image",
+                "args": {"file_path": path}})
+            wall.append((time.perf_counter() - start) * 1000)
+            cpu.append((time.process_time() - start_cpu) * 1000)
+            assert result.artifact["url"].startswith("data:image/"), result.content
+    return statistics.median(wall), statistics.median(cpu)
+
+
+def main(repeats: int):
+    print(f"{len(IMAGES)} fixtures: {', '.join(IMAGES)}\n")
+    print(f"{'scenario':<28} {'wall ms':>8} {'cpu ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [
+            ("cold (empty cache)", measure(repeats, lambda: ImageCache())),
+        ]
+        set_image_cache(ImageCache(directory=tmp))
+        measure(1)
+        rows.append(("warm (memory)", measure(repeats)))
+        # a restart: new process-wide cache, same directory
+        rows.append(("warm (disk, after restart)",
+                     measure(repeats, lambda: ImageCache(directory=tmp))))
+        for name, (wall, cpu) in rows:
+            print(f"{name:<28} {wall:>8.3f} {cpu:>8.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Overhead of the metrics instrumentation on agent turns
+
+Runs tool-calling turns against a zero-latency fake model, so the graph,
+the tool executor and the instrumentation are all that is timed; with a
+real model the overhead is a far smaller share of each turn. Bare and
+instrumented agents alternate over several rounds and the best round of
+each counts.
+Usage: python -m benchmarks.bench_metrics [turns]
+"""
+import os
+import sys
+import time
+from unittest import mock
+
+import app.llm
+import app.metrics
+from app.agent import LangGraphAgent
+from app.sessions import SessionStore
+from benchmarks.fakes import fake_model_factory
+
+ROUNDS = 5
+
+
+def build(enabled: bool) -> LangGraphAgent:
+    # nodes are wrapped when the graph is built, model and tool timers check on each call
+    app.metrics.ENABLED = enabled
+    return LangGraphAgent(sessions=SessionStore(backend="memory"))
+
+
+def turns_per_second(agent: LangGraphAgent, enabled: bool, turns: int) -> float:
+    app.metrics.ENABLED = enabled
+    start = time.perf_counter()
+    for i in range(turns):
+        agent.chat(f"what is {i} + 1?")
+    return turns / (time.perf_counter() - start)
+
+
+def main(turns: int):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    factory = fake_model_factory(tool_calls=[{"name": "calculator", "args": {"expression": "2 + 2"}}])
+    with mock.patch.object(app.llm, "ChatOpenAI", factory):
+        bare, instrumented = build(False), build(True)
+        agents = [("bare", bare, False), ("instrumented", instrumented, True)]
+        for name, agent, enabled in agents:
+            turns_per_second(agent, enabled, 20)  # warm up
+
+        best = {name: 0.0 for name, _, _ in agents}
+        for _ in range(ROUNDS):
+            for name, agent, enabled in agents:
+                best[name] = max(best[name], turns_per_second(agent, enabled, turns))
+
+    print(f"{turns} turns per round, best of {ROUNDS} (each turn: 2 model calls, 1 tool call)\n")
+    for name, rate in best.items():
+        print(f"{name:<14} {rate:8.1f} turns/s   {1e6 / rate:8.0f} us/turn")
+    overhead = 1e6 / best["instrumented"] - 1e6 / best["bare"]
+    print(f"\noverhead: {overhead:.0f} us/turn ({overhead / (1e6 / best['bare']) * 100:.1f}%)")
+
+    histogram = app.metrics.Histogram("bench", "bench").labels()
+    start = time.perf_counter()
+    for _ in range(100000):
+        with histogram.time():
+            pass
+    print(f"one timed block: {(time.perf_counter() - start) * 10:.2f} us")
+    start = time.perf_counter()
+    app.metrics.render()
+    print(f"rendering /metrics: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark per-turn model overhead and connection reuse
+
+Compares the old pattern of building `ChatOpenAI(...).bind_tools(tools)` on every
+graph step with the shared ModelRegistry, against a local fake OpenAI server.
+Usage: python -m benchmarks.bench_model_pool [turns]
+"""
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def per_turn(fn, turns: int):
+    """Return the median latency of `fn` in milliseconds"""
+    samples = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(turns: int):
+    with FakeOpenAIServer() as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+
+        # imported after the base URL is set so every client targets the fake
+        import httpx
+        from langchain_core.messages import HumanMessage
+        from langchain_openai import ChatOpenAI
+        from app.agent import LangGraphAgent, tools
+        from app.llm import ModelRegistry
+
+        messages = [HumanMessage(content="Calculate 25 * 4 + 10")]
+
+        def rebuild_model():
+            ChatOpenAI(model="gpt-4o-mini", temperature=0).bind_tools(tools)
+
+        def rebuild_model_each_turn():
+            # what call_model used to do on every step
+            ChatOpenAI(model="gpt-4o-mini", temperature=0).bind_tools(tools).invoke(messages)
+
+        def rebuild_each_turn():
+            # private clients per model, i.e. no pooling at all
+            ChatOpenAI(model="gpt-4o-mini", temperature=0,
+                       http_client=httpx.Client()).bind_tools(tools).invoke(messages)
+
+        registry = ModelRegistry(tools)
+
+        def shared_registry():
+            registry.tool_model.invoke(messages)
+
+        agent = LangGraphAgent(models=registry)
+
+        print(f"{'scenario':<36} {'ms/turn':>8} {'conns':>6} {'reqs':>5}")
+        construct = per_turn(rebuild_model, turns)
+        print(f"{'build + bind_tools only (no I/O)':<36} {construct:>8.3f} {'-':>6} {'-':>5}")
+        for name, fn in [
+            ("rebuild model each turn", rebuild_model_each_turn),
+            ("rebuild model + client each turn", rebuild_each_turn),
+            ("shared ModelRegistry", shared_registry),
+            ("LangGraphAgent.chat (same pool)", lambda: agent.chat(messages[0].content)),
+        ]:
+            server.reset_counters()
+            latency = per_turn(fn, turns)
+            print(f"{name:<36} {latency:>8.3f} {server.connections:>6} {server.requests:>5}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark one model response that makes several slow tool calls
+
+The fake model asks for three searches (sync, 0.3/0.4/0.5s) plus an async
+lookup (0.2s) in one AIMessage. Sequential execution takes the sum of the
+delays; the ToolExecutor should take close to the slowest one. Also checks
+that a call past the timeout is reported without holding up the others.
+Usage: python -m benchmarks.bench_parallel_tools [repeats]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from unittest import mock
+
+from langchain_core.tools import tool
+
+import app.agent
+import app.llm
+from app.sessions import SessionStore
+from app.tool_executor import ToolExecutor
+from benchmarks.fakes import fake_model_factory
+
+
+@tool
+def slow_search(query: str, delay: float) -> str:
+    """Search that takes `delay` seconds, like a web search round-trip"""
+    time.sleep(delay)
+    return f"results for {query}"
+
+
+@tool
+async def slow_lookup(key: str, delay: float) -> str:
+    """Async lookup that takes `delay` seconds"""
+    await asyncio.sleep(delay)
+    return f"value of {key}"
+
+
+CALLS = [
+    {"name": "slow_search", "args": {"query": "a", "delay": 0.3}, "id": "call_1"},
+    {"name": "slow_search", "args": {"query": "b", "delay": 0.5}, "id": "call_2"},
+    {"name": "slow_search", "args": {"query": "c", "delay": 0.4}, "id": "call_3"},
+    {"name": "slow_lookup", "args": {"key": "d", "delay": 0.2}, "id": "call_4"},
+]
+TOOLS = [slow_search, slow_lookup]
+
+
+def timed(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main(repeats: int):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    delays = [c["args"]["delay"] for c in CALLS]
+    print(f"{len(CALLS)} tool calls, sum of delays {sum(delays):.2f}s, max {max(delays):.2f}s\n")
+
+    sequential = ToolExecutor(TOOLS, max_concurrency=1)
+    parallel = ToolExecutor(TOOLS)
+    factory = fake_model_factory(tool_calls=CALLS)
+    with mock.patch.object(app.llm, "ChatOpenAI", factory):
+        agent = app.agent.LangGraphAgent(
+            sessions=SessionStore(backend="memory"), tool_executor=parallel)
+
+    for name, fn in [
+        ("sequential (1 worker)", lambda: sequential.run(CALLS)),
+        ("ToolExecutor.run", lambda: parallel.run(CALLS)),
+        ("ToolExecutor.arun", lambda: asyncio.run(parallel.arun(CALLS))),
+        ("LangGraphAgent.chat", lambda: agent.chat("Search a, b, c and look up d")),
+        ("LangGraphAgent.achat", lambda: asyncio.run(agent.achat("Search a, b, c and look up d"))),
+    ]:
+        print(f"  {name:<24} {timed(fn, repeats):.3f}s")
+
+    messages = parallel.run(CALLS)
+    assert [m.tool_call_id for m in messages] == [c["id"] for c in CALLS]
+
+    strict = ToolExecutor(TOOLS, timeout=0.35)
+    start = time.perf_counter()
+    messages = strict.run(CALLS)
+    print(f"\nwith a 0.35s timeout ({time.perf_counter() - start:.3f}s):")
+    for message in messages:
+        print(f"  {message.tool_call_id}: {message.content}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
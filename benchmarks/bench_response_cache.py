@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Replay a production-like query log with and without the response cache
+
+Query popularity follows a Zipf distribution, as in real traffic: a few
+questions ("calculate sqrt(144)", "fetch user1") make up most of the log. Every
+turn makes a calculator call, so an uncached turn costs two model calls of
+LATENCY seconds each. Each query is a fresh stateless turn, the case an exact
+match cache can serve.
+Usage: python -m benchmarks.bench_response_cache [queries] [latency]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import app.agent
+import app.llm
+from app.response_cache import ResponseCache
+from app.sessions import SessionStore
+from benchmarks.fakes import fake_model_factory
+
+DISTINCT_QUERIES = 200
+
+
+def query_log(size: int, seed: int = 7):
+    """Queries drawn with Zipf(1.1) popularity, with the casing and spacing noise of real input"""
+    rng = random.Random(seed)
+    templates = ["calculate sqrt({n})", "fetch user{n}", "What is {n} * 12?", "search for python {n}"]
+    queries = [templates[i % len(templates)].format(n=i) for i in range(DISTINCT_QUERIES)]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(DISTINCT_QUERIES)]
+    log = rng.choices(queries, weights=weights, k=size)
+    return [q if rng.random() < 0.8 else f"  {q}  " for q in log]
+
+
+async def replay(agent, log):
+    start = time.perf_counter()
+    for query in log:
+        await agent.achat(query)
+    return time.perf_counter() - start
+
+
+def main(size: int, latency: float):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    factory = fake_model_factory(
+        tool_calls=[{"name": "calculator", "args": {"expression": "sqrt(144)"}}],
+        first_token_latency=latency,
+    )
+    log = query_log(size)
+    print(f"{size} queries, {len(set(q.strip() for q in log))} distinct, "
+          f"{latency * 1000:.0f} ms per model call\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caches = [
+            ("no cache", None),
+            ("memory", ResponseCache(backend="memory")),
+            ("sqlite", ResponseCache(backend="sqlite", path=os.path.join(tmp, "responses.sqlite"))),
+        ]
+        baseline = None
+        for name, cache in caches:
+            with mock.patch.object(app.llm, "ChatOpenAI", factory):
+                agent = app.agent.LangGraphAgent(sessions=SessionStore(backend="memory"),
+                                                 response_cache=cache)
+            total = asyncio.run(replay(agent, log))
+            baseline = baseline or total
+            print(f"{name:>9}: {total:6.2f}s  {total / size * 1000:7.1f} ms/query  "
+                  f"speedup {baseline / total:4.1f}x")
+            if cache is not None:
+                stats = cache.stats()
+                print(f"           hits {stats['hits']}, misses {stats['misses']}, "
+                      f"hit rate {stats['hit_rate']:.0%}")
+                cache.close()
+            agent.tool_executor.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.02)
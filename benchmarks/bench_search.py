@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the search cache against a stub backend with a fixed latency
+
+1. a burst of concurrent identical queries (single-flight coalescing)
+2. a skewed workload of repeated queries from several callers (hit rate)
+3. a restart with on-disk persistence
+Usage: python -m benchmarks.bench_search [latency_seconds]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.cache import TTLCache
+from app.search import SearchService
+from benchmarks.fakes import FakeSearchBackend
+
+
+def run(fn, calls, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fn, calls))
+    return time.perf_counter() - start
+
+
+def main(latency: float):
+    print(f"stub backend latency {latency * 1000:.0f} ms\n")
+
+    # 1. burst of identical queries
+    burst = ["Python FastAPI"] * 32
+    backend = FakeSearchBackend(latency)
+    uncached = run(lambda q: backend(q, 3), burst, len(burst))
+    uncached_requests = backend.requests
+    backend = FakeSearchBackend(latency)
+    service = SearchService(backend, TTLCache(name="search"))
+    cached = run(lambda q: service.search(q), burst, len(burst))
+    print(f"{len(burst)} concurrent identical queries:")
+    print(f"  no cache:        {uncached:.3f}s, {uncached_requests} upstream requests")
+    print(f"  SearchService:   {cached:.3f}s, {backend.requests} upstream request(s), "
+          f"{service.stats()['coalesced']} coalesced")
+
+    # 2. skewed repeated queries: a few popular queries make up most traffic
+    random.seed(0)
+    topics = [f"topic {i}" for i in range(50)]
+    weights = [1 / (i + 1) for i in range(len(topics))]
+    workload = [random.choices(topics, weights)[0] for _ in range(400)]
+    # the same query typed differently still hits the cache
+    workload = [q.upper() if random.random() < 0.2 else q for q in workload]
+    backend = FakeSearchBackend(latency)
+    uncached = run(lambda q: backend(q, 3), workload, 8)
+    backend = FakeSearchBackend(latency)
+    service = SearchService(backend, TTLCache(name="search"))
+    cached = run(lambda q: service.search(q), workload, 8)
+    stats = service.stats()
+    print(f"\n{len(workload)} queries over {len(topics)} topics, 8 callers:")
+    print(f"  no cache:        {uncached:.3f}s, {len(workload)} upstream requests, "
+          f"{uncached / len(workload) * 8 * 1000:.1f} ms/query")
+    print(f"  SearchService:   {cached:.3f}s, {backend.requests} upstream requests, "
+          f"{cached / len(workload) * 8 * 1000:.1f} ms/query")
+    print(f"  hit rate {stats['hit_rate']:.1%}, avg upstream load {stats['avg_load_ms']:.1f} ms")
+
+    # 3. persistence across restarts
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search_cache.sqlite")
+        service = SearchService(FakeSearchBackend(latency), TTLCache(path=path, name="search"))
+        for q in topics[:20]:
+            service.search(q)
+        service.close()
+
+        backend = FakeSearchBackend(latency)
+        service = SearchService(backend, TTLCache(path=path, name="search"))
+        start = time.perf_counter()
+        for q in topics[:20]:
+            service.search(q)
+        elapsed = time.perf_counter() - start
+        print(f"\nafter a restart with SEARCH_CACHE_PATH: 20 queries in {elapsed * 1000:.1f} ms, "
+              f"{backend.requests} upstream requests")
+        service.close()
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.3)
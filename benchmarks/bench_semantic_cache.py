@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Semantic cache lookup latency and index memory at growing entry counts
+
+Fills the index with distinct synthetic questions, then times lookups of
+paraphrases (hits) and unrelated questions (misses). Embedding and the
+vectorized scan are timed separately; a pure-Python scan of the same vectors
+is the baseline.
+Usage: python -m benchmarks.bench_semantic_cache [entries ...]
+"""
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from app.semantic_cache import SemanticCache
+
+TOPICS = ["capital of", "population of", "weather in", "history of", "best food in", "flights to"]
+PLACES = ["France", "Germany", "Japan", "Brazil", "Kenya", "Canada", "India", "Peru", "Norway", "Egypt"]
+
+
+def question(i: int) -> str:
+    return f"What is the {TOPICS[i % len(TOPICS)]} {PLACES[i // len(TOPICS) % len(PLACES)]} in report {i}?"
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def run(entries: int, lookups: int = 500):
+    cache = SemanticCache(max_bytes=1 << 30)
+    start = time.perf_counter()
+    questions = [question(i) for i in range(entries)]
+    for q in questions:
+        cache.store(q, f"Answer to: {q}")
+    fill = time.perf_counter() - start
+
+    rng = random.Random(1)
+    probes = [f"  what's the {question(rng.randrange(entries))[12:].lower()}" for _ in range(lookups // 2)]
+    probes += [f"Tell me a joke about report {rng.randrange(entries)}" for _ in range(lookups // 2)]
+
+    embed_ms, lookup_ms = [], []
+    for probe in probes:
+        t0 = time.perf_counter()
+        cache.embedder.embed([probe])
+        t1 = time.perf_counter()
+        cache.lookup(probe)
+        t2 = time.perf_counter()
+        embed_ms.append((t1 - t0) * 1000)
+        lookup_ms.append((t2 - t1) * 1000)
+
+    # the same scan without NumPy, over a sample of probes
+    vectors = cache._vectors[:cache.count].tolist()
+    query = cache.embedder.embed([probes[0]])[0].tolist()
+    t0 = time.perf_counter()
+    max(sum(a * b for a, b in zip(row, query)) for row in vectors)
+    python_ms = (time.perf_counter() - t0) * 1000
+
+    stats = cache.stats()
+    p50, p99 = percentiles(lookup_ms)
+    print(f"{entries:>7} entries: fill {fill:6.2f}s, index {stats['bytes'] / 1024 / 1024:6.1f} MiB, "
+          f"hit rate {stats['hit_rate']:.0%}")
+    print(f"          lookup p50 {p50:6.3f} ms  p99 {p99:6.3f} ms  "
+          f"(of which embedding p50 {statistics.median(embed_ms):.3f} ms)")
+    print(f"          pure-Python scan {python_ms:8.1f} ms")
+
+
+def main(sizes):
+    print(f"NumPy {np.__version__}, {SemanticCache().embedder.dim}-dim hashing embedder\n")
+    for entries in sizes:
+        run(entries)
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark session checkpoint write/read latency with many stored sessions
+
+Fills the session store with SESSIONS conversations (a realistic checkpoint
+produced by one agent turn against the fake model), then measures checkpoint
+writes, reads and the per-turn bookkeeping, plus end-to-end chat overhead of a
+session turn versus a stateless one. Runs for the SQLite file and in-memory
+backends. Usage: python -m benchmarks.bench_sessions [sessions]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from langgraph.checkpoint.base.id import uuid6
+
+import app.agent
+import app.llm
+from app.sessions import SessionStore
+from benchmarks.fakes import fake_model_factory
+
+SAMPLES = 1000
+
+
+def percentiles(samples):
+    samples = sorted(s * 1000 for s in samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def bench_backend(backend: str, path: str, sessions: int):
+    store = SessionStore(backend=backend, path=path,
+                         max_sessions=sessions * 2, ttl_seconds=86400)
+    factory = fake_model_factory(
+        tool_calls=[{"name": "calculator", "args": {"expression": "2 + 2"}}])
+    with mock.patch.object(app.llm, "ChatOpenAI", factory):
+        agent = app.agent.LangGraphAgent(sessions=store)
+
+    # one real turn gives a representative checkpoint to clone
+    agent.chat("Calculate 2 + 2", session_id="template")
+    saver = store.checkpointer
+    template = saver.get_tuple(store.config("template"))
+
+    def write(session_id):
+        checkpoint = {**template.checkpoint, "id": str(uuid6())}
+        saver.put({"configurable": {"thread_id": session_id, "checkpoint_ns": ""}},
+                  checkpoint, template.metadata, {})
+
+    for i in range(sessions):
+        write(f"session-{i}")
+        store.record(f"session-{i}")
+
+    ids = [f"session-{random.randrange(sessions)}" for _ in range(SAMPLES)]
+    writes = [timed(write, session_id) for session_id in ids]
+    reads = [timed(saver.get_tuple, store.config(session_id)) for session_id in ids]
+    records = [timed(store.record, session_id) for session_id in ids]
+
+    turns = ids[:200]
+    stateless = [timed(agent.chat, "Calculate 2 + 2") for _ in turns]
+    stateful = [timed(agent.chat, "Calculate 2 + 2", None, session_id) for session_id in turns]
+
+    print(f"\n{backend} backend, {len(store)} sessions, "
+          f"{len(template.checkpoint['channel_values']['messages'])} messages per checkpoint")
+    for name, samples in [
+        ("checkpoint write", writes),
+        ("checkpoint read", reads),
+        ("record + evict", records),
+        ("chat turn (stateless)", stateless),
+        ("chat turn (session)", stateful),
+    ]:
+        p50, p99 = percentiles(samples)
+        print(f"  {name:<24} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    store.close()
+
+
+def main(sessions: int):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_backend("sqlite", os.path.join(tmp, "sessions.sqlite"), sessions)
+    bench_backend("memory", None, sessions)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
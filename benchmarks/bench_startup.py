@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Time to first response from process start, with and without the warm-up
+
+Each run starts a fresh interpreter that imports app.main, runs the lifespan,
+waits for /health to report ready and sends two /chat requests through an
+in-process ASGI client. The model API is a local fake server whose new
+connections cost CONNECT_LATENCY, like a TCP+TLS handshake. Pass the path
+of another checkout (e.g. a git worktree of an older commit) to measure it
+the same way.
+Usage: python -m benchmarks.bench_startup [runs] [tree]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+CONNECT_LATENCY = 0.15
+
+CHILD = """
+import asyncio, json, time
+stamps = {"interpreter": time.time()}
+import httpx
+from app.main import app
+stamps["imported"] = time.time()
+
+async def run():
+    async with app.router.lifespan_context(app):
+        stamps["lifespan"] = time.time()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+            while (await client.get("/health")).status_code != 200:
+                await asyncio.sleep(0.005)
+            stamps["ready"] = time.time()
+            await client.post("/chat", json={"message": "Calculate 25 * 4 + 10"})
+            stamps["first response"] = time.time()
+            await client.post("/chat", json={"message": "Calculate 15 * 23 + 7"})
+            stamps["second response"] = time.time()
+
+asyncio.run(run())
+print(json.dumps(stamps))
+"""
+
+PHASES = [("interpreter", "interpreter start"), ("imported", "imports"), ("lifespan", "lifespan startup"),
+          ("ready", "until /health ready"), ("first response", "first /chat"),
+          ("second response", "second /chat")]
+
+
+def run_once(tree: str, env: dict) -> dict:
+    spawned = time.time()
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=tree, env=env,
+                            capture_output=True, text=True, check=True)
+    stamps = json.loads(result.stdout.strip().splitlines()[-1])
+    times, last = {}, spawned
+    for key, _ in PHASES:
+        times[key] = stamps[key] - last
+        last = stamps[key]
+    times["total"] = stamps["first response"] - spawned
+    return times
+
+
+def main(runs: int, tree: str):
+    with FakeOpenAIServer(latency=0.05, connect_latency=CONNECT_LATENCY) as server:
+        env = {**os.environ, "OPENAI_API_KEY": "sk-fake", "OPENAI_BASE_URL": server.base_url,
+               "SESSION_BACKEND": "memory", "PYTHONPATH": tree}
+        print(f"{tree}: median of {runs} runs, {CONNECT_LATENCY * 1000:.0f} ms per new API connection\n")
+        modes = [("warm-up off", "false"), ("warm-up on", "true")]
+        results = {name: [run_once(tree, {**env, "WARMUP": value}) for _ in range(runs)]
+                   for name, value in modes}
+
+    print(f"{'':<24}" + "".join(f"{name:>14}" for name, _ in modes))
+    for key, label in PHASES + [("total", "process start -> 1st response")]:
+        row = "".join(f"{statistics.median(r[key] for r in results[name]) * 1000:>11.0f} ms"
+                      for name, _ in modes)
+        print(f"{label:<24}{row}" if key != "total" else f"\n{label}\n{'':<24}{row}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+         os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else os.getcwd())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark time-to-first-token and total latency of /chat/stream
+
+Runs the streaming route in-process against a fake model that emits one word
+every TOKEN_INTERVAL seconds, so the numbers only reflect the agent and the
+SSE pipeline. Usage: python -m benchmarks.bench_streaming [words]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+from unittest import mock
+
+import app.agent
+import app.llm
+import app.main
+from app.models import StreamingChatRequest
+from benchmarks.fakes import fake_model_factory
+
+FIRST_TOKEN_LATENCY = 0.2
+TOKEN_INTERVAL = 0.005
+RUNS = 3
+
+
+async def measure_once(message: str):
+    """Return (time to first token, total time) for a single stream"""
+    start = time.perf_counter()
+    first_token = None
+    response = await app.main.stream_chat_with_agent(
+        StreamingChatRequest(message=message))
+    async for chunk in response.body_iterator:
+        event = json.loads(chunk[len("data: "):])
+        if event["event"] == "token" and first_token is None:
+            first_token = time.perf_counter() - start
+    return first_token, time.perf_counter() - start
+
+
+async def main(words: int):
+    answer = " ".join(f"word{i}" for i in range(words))
+    factory = fake_model_factory(
+        answer=answer,
+        tool_calls=[{"name": "calculator", "args": {"expression": "25 * 4 + 10"}}],
+        first_token_latency=FIRST_TOKEN_LATENCY,
+        token_interval=TOKEN_INTERVAL,
+    )
+    with mock.patch.object(app.llm, "ChatOpenAI", factory):
+        app.main.agent_instance = app.agent.LangGraphAgent()
+        samples = [await measure_once("Calculate 25 * 4 + 10") for _ in range(RUNS)]
+
+    ttft = statistics.median(s[0] for s in samples)
+    total = statistics.median(s[1] for s in samples)
+    generation = 2 * FIRST_TOKEN_LATENCY + TOKEN_INTERVAL * (words - 1)
+    print(f"answer words:          {words}")
+    print(f"model generation time: {generation:.3f}s")
+    print(f"time to first token:   {ttft:.3f}s")
+    print(f"total latency:         {total:.3f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Stress test long tool loops: per-step latency and peak memory
+
+The fake model requests a calculator call ROUNDS times before answering, so one
+run makes 2 * ROUNDS + 1 graph steps. If every node copies the full history,
+late steps get slower and peak memory grows quadratically.
+Usage: python -m benchmarks.bench_tool_loop [rounds]
+"""
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+import app.agent
+import app.llm
+from app.sessions import SessionStore
+from benchmarks.fakes import fake_model_factory
+
+
+def main(rounds: int):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    factory = fake_model_factory(
+        tool_calls=[{"name": "calculator", "args": {"expression": "sqrt(144) + 5**2"}}],
+        tool_rounds=rounds,
+    )
+    with mock.patch.object(app.llm, "ChatOpenAI", factory):
+        agent = app.agent.LangGraphAgent(sessions=SessionStore(backend="memory"))
+
+    for name, graph, config in [
+        ("stateless graph", agent.graph, {}),
+        # a session graph checkpoints (serializes) the state after every step
+        ("checkpointed graph", agent.session_graph,
+         agent.sessions.config("stress")),
+    ]:
+        run(name, graph, {**config, "recursion_limit": 2 * rounds + 10})
+
+
+def run(name: str, graph, config: dict):
+    state = {"messages": [app.agent.HumanMessage(content="Keep calculating")]}
+
+    tracemalloc.start()
+    step_times = []
+    start = last = time.perf_counter()
+    for _ in graph.stream(state, config, stream_mode="updates"):
+        now = time.perf_counter()
+        step_times.append((now - last) * 1000)
+        last = now
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\n{name}: {len(step_times)} steps")
+    print(f"  total time:             {total:.3f}s")
+    print(f"  step latency, first 20: {statistics.mean(step_times[:20]):.3f} ms")
+    print(f"  step latency, last 20:  {statistics.mean(step_times[-20:]):.3f} ms")
+    print(f"  peak traced memory:     {peak / 1024 / 1024:.2f} MiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
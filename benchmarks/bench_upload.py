@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Measure peak API-process memory for a 10 MB image upload and chat turn
+
+Runs the app in-process over httpx's ASGI transport and records the
+tracemalloc peak of each request:
+- the old upload (read the whole file, base64 it, return it as JSON), then
+  a /chat request carrying that base64 back as ImageData
+- the streaming /upload-image into the blob store, then a /chat request
+  carrying only the handle
+Request bodies are built before tracing starts, so the peaks are the
+server's own allocations. Images are downscaled in the worker processes,
+whose memory is not counted.
+Usage: python -m benchmarks.bench_upload [megabytes]
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import sys
+import tempfile
+import tracemalloc
+from io import BytesIO
+from unittest import mock
+
+import httpx
+from fastapi import File, UploadFile
+
+import app.agent
+import app.llm
+import app.main
+from app.blobs import BlobStore, set_blob_store
+from app.models import ImageData
+from app.sessions import SessionStore
+from benchmarks.fakes import fake_model_factory
+
+
+@app.main.app.post("/bench/legacy-upload", response_model=ImageData)
+async def legacy_upload(file: UploadFile = File(...)):
+    """What /upload-image used to do"""
+    file_content = await file.read()
+    base64_string = base64.b64encode(file_content).decode('utf-8')
+    return ImageData(data=base64_string, type="base64",
+                     filename=file.filename, mime_type=file.content_type)
+
+
+def noisy_jpeg(megabytes: float) -> bytes:
+    """A JPEG of roughly the requested size (noise barely compresses)"""
+    from PIL import Image
+
+    side = int((megabytes * 1024 * 1024 / 1.15) ** 0.5)
+    img = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=95)
+    return out.getvalue()
+
+
+async def traced(client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    """Return (response, peak MiB allocated while serving it)"""
+    tracemalloc.start()
+    response = await client.request(method, url, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    response.raise_for_status()
+    return response, peak / 1024 / 1024
+
+
+async def main(megabytes: float):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    logging.disable(logging.INFO)
+    image = noisy_jpeg(megabytes)
+    print(f"image: {len(image) / 1024 / 1024:.1f} MiB JPEG\n")
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(app.llm, "ChatOpenAI", fake_model_factory()):
+        set_blob_store(BlobStore(directory=tmp))
+        app.main.agent_instance = app.agent.LangGraphAgent(sessions=SessionStore(backend="memory"))
+        image_path = os.path.join(tmp, "photo.jpg")
+        with open(image_path, "wb") as f:
+            f.write(image)
+
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            # warm up imports and the image workers
+            await client.post("/chat", json={"message": "hi"})
+
+            rows = []
+            with open(image_path, "rb") as f:
+                response, peak = await traced(client, "POST", "/bench/legacy-upload",
+                                              files={"file": ("photo.jpg", f, "image/jpeg")})
+            rows.append(("old upload (base64 response)", peak, len(response.content)))
+            body = json.dumps({"message": "What is in this image?",
+                               "images": [response.json()]}).encode()
+            del response
+            response, peak = await traced(client, "POST", "/chat", content=body,
+                                          headers={"content-type": "application/json"})
+            rows.append(("/chat with base64 image", peak, len(body)))
+            del body
+
+            with open(image_path, "rb") as f:
+                response, peak = await traced(client, "POST", "/upload-image",
+                                              files={"file": ("photo.jpg", f, "image/jpeg")})
+            rows.append(("streaming /upload-image", peak, len(response.content)))
+            body = json.dumps({"message": "What is in this image?",
+                               "images": [response.json()]}).encode()
+            response, peak = await traced(client, "POST", "/chat", content=body,
+                                          headers={"content-type": "application/json"})
+            assert "Image analysis" in response.json()["response"], response.text
+            rows.append(("/chat with image handle", peak, len(body)))
+
+        print(f"{'request':<32} {'peak MiB':>9} {'payload':>12}")
+        for name, peak, size in rows:
+            print(f"{name:<32} {peak:>9.1f} {size:>12,}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 10))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark vision analysis of 1, 4 and 10 images in one turn
+
+Sends a turn with N base64 images through the agent to a local fake OpenAI
+vision endpoint that answers after a fixed latency plus a per-image
+latency. Compares one request per image, sent one after another (one
+vision round-trip each), against packing the images into requests of at
+most 4 that run concurrently, and into a single request.
+Usage: python -m benchmarks.bench_vision_batch [latency] [image_latency]
+"""
+import asyncio
+import base64
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from app.agent import LangGraphAgent, tools
+from app.images import ImageCache, ImageProcessor, set_image_cache
+from app.llm import ModelRegistry
+from app.models import ImageData
+from app.sessions import SessionStore
+from app.vision import VisionAnalyzer
+from benchmarks.fake_openai import FakeOpenAIServer
+
+IMAGE = Path("test_images/dog.jpg")
+COUNTS = [1, 4, 10]
+SCENARIOS = [
+    ("one request per image", VisionAnalyzer(max_images=1, max_concurrency=1)),
+    ("max 4 per request", VisionAnalyzer(max_images=4, max_concurrency=4)),
+    ("all in one request", VisionAnalyzer(max_images=10, max_concurrency=1)),
+]
+
+
+async def turn(agent: LangGraphAgent, images) -> float:
+    start = time.perf_counter()
+    response = await agent.achat("Describe these pictures", images)
+    elapsed = time.perf_counter() - start
+    assert "Image analysis for" in response, response
+    return elapsed
+
+
+async def run(server: FakeOpenAIServer, repeats: int = 3):
+    models = ModelRegistry(tools)
+    data = base64.b64encode(IMAGE.read_bytes()).decode()
+    print(f"{'images':>6}  {'scenario':<24} {'requests':>8} {'seconds':>8}")
+    for count in COUNTS:
+        images = [ImageData(data=data, type="base64", filename=f"photo{i}.jpg",
+                            mime_type="image/jpeg") for i in range(count)]
+        for name, vision in SCENARIOS:
+            agent = LangGraphAgent(models=models, sessions=SessionStore(backend="memory"),
+                                   vision=vision)
+            await turn(agent, images)  # warm the image cache
+            server.reset_counters()
+            seconds = statistics.median([await turn(agent, images) for _ in range(repeats)])
+            print(f"{count:>6}  {name:<24} {server.requests // repeats:>8} {seconds:>8.3f}")
+    await models.aclose()
+
+
+def main(latency: float, image_latency: float):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    logging.disable(logging.INFO)
+    set_image_cache(ImageCache(processor=ImageProcessor(workers=0)))
+    with FakeOpenAIServer(answer="A dog on the grass.", latency=latency,
+                          image_latency=image_latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        print(f"fake vision endpoint: {latency:g}s + {image_latency:g}s per image\n")
+        asyncio.run(run(server))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.5,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.1)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark the image payload sent to the vision model and /chat latency
+
+Sends each test_images/ fixture, plus a 12 MP phone photo, to /chat as an
+inline base64 image and as a URL served by a local image host. The vision
+model is a local fake OpenAI server, which records how many bytes each
+request carries. For each output setting it reports those bytes against
+the base64 size of the original image, which is what used to be forwarded
+(or, for URLs, downloaded by the provider), and the median end-to-end
+latency of a cold (empty cache) and a warm request.
+Usage: python -m benchmarks.bench_vision_payload [repeats]
+"""
+import asyncio
+import base64
+import functools
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+import app.agent
+import app.main
+from app.images import ImageCache, ImageFetcher, ImageProcessor, set_image_cache
+from app.sessions import SessionStore
+from benchmarks.bench_image_pool import phone_photo
+from benchmarks.fake_openai import FakeOpenAIServer
+
+SETTINGS = [
+    ("auto 1024px", {}),
+    ("webp 1024px", {"output_format": "WEBP"}),
+    ("auto, detail=low", {"detail": "low"}),
+]
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory: str) -> ThreadingHTTPServer:
+    """Serve `directory` on localhost in a background thread"""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0),
+                                functools.partial(_QuietHandler, directory=directory))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def image_payload(path: Path, kind: str, host: str) -> dict:
+    if kind == "url":
+        return {"type": "url", "data": f"{host}/{path.name}"}
+    mime_type = "image/png" if path.suffix == ".png" else "image/jpeg"
+    return {"type": "base64", "data": base64.b64encode(path.read_bytes()).decode(),
+            "filename": path.name, "mime_type": mime_type}
+
+
+async def chat(client: httpx.AsyncClient, server: FakeOpenAIServer, image: dict):
+    """Return (request bytes seen by the model, seconds) for one /chat turn with an image"""
+    server.reset_counters()
+    start = time.perf_counter()
+    response = await client.post("/chat", json={
+        "message": "What is in this image?", "images": [image], "session_id": str(uuid.uuid4())})
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    assert "Image analysis" in response.json()["response"], response.text
+    return server.bytes_received, elapsed
+
+
+async def run(repeats: int, images, host: str, server: FakeOpenAIServer):
+    print(f"{'image':<18} {'input':<7} {'setting':<17} {'original KB':>11} "
+          f"{'sent KB':>8} {'cold ms':>8} {'warm ms':>8}")
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name, options in SETTINGS:
+            processor = ImageProcessor(**options)
+            processor.start()
+            for path in images:
+                for kind in ("base64", "url"):
+                    payload = image_payload(path, kind, host)
+                    cold, warm = [], []
+                    for _ in range(repeats):
+                        set_image_cache(ImageCache(
+                            processor=processor, fetcher=ImageFetcher(allow_private=True)))
+                        sent, seconds = await chat(client, server, payload)
+                        cold.append(seconds)
+                        warm.append((await chat(client, server, payload))[1])
+                    print(f"{path.name:<18} {kind:<7} {name:<17} "
+                          f"{len(base64.b64encode(path.read_bytes())) / 1024:>11.1f} {sent / 1024:>8.1f} "
+                          f"{statistics.median(cold) * 1000:>8.1f} "
+                          f"{statistics.median(warm) * 1000:>8.1f}")
+            processor.close()
+
+
+def main(repeats: int):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(answer="A picture.") as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        for path in Path("test_images").iterdir():
+            shutil.copy(path, tmp)
+        Path(tmp, "phone_photo.jpg").write_bytes(phone_photo(1))
+        images = sorted(Path(tmp).iterdir())
+
+        httpd = serve_directory(tmp)
+        host = "http://{}:{}".format(*httpd.server_address)
+        app.main.agent_instance = app.agent.LangGraphAgent(sessions=SessionStore(backend="memory"))
+        try:
+            asyncio.run(run(repeats, images, host, server))
+        finally:
+            httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Requests/sec of the production server as the worker count grows
+
+Starts `run_server.py` with SERVER_PROFILE=production and WORKERS=n for
+each n, then keeps CONCURRENCY requests in flight against /chat for
+DURATION seconds. Half of the requests are calculator questions answered
+on the fast path (CPU-bound, so they scale with workers up to the CPU
+count), half are model turns against a local fake API. All workers share
+one SHARED_STATE_DIR. Needs Granian installed.
+Usage: python -m benchmarks.bench_workers [N ...]
+"""
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+CONCURRENCY = 64
+DURATION = 10.0
+MODEL_LATENCY = 0.05
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("server did not become ready")
+
+
+async def load(client: httpx.AsyncClient) -> list:
+    """Latencies of the requests completed within DURATION"""
+    latencies, stop = [], time.monotonic() + DURATION
+
+    async def user(i: int):
+        n = 0
+        while time.monotonic() < stop:
+            n += 1
+            message = f"Calculate {i} * {n} + 7" if n % 2 else f"Hello from user {i}, message {n}"
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"message": message})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(user(i) for i in range(CONCURRENCY)))
+    return latencies
+
+
+async def measure(workers: int, env: dict) -> list:
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "run_server.py"],
+                               env={**env, "WORKERS": str(workers), "PORT": str(port)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                     timeout=30.0) as client:
+            await wait_ready(client, process)
+            return await load(client)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(worker_counts):
+    try:
+        import granian  # noqa: F401
+    except ImportError:
+        sys.exit("Granian is not installed: pip install 'granian[reload]'")
+
+    with FakeOpenAIServer(latency=MODEL_LATENCY) as server, tempfile.TemporaryDirectory() as state:
+        env = {**os.environ, "OPENAI_API_KEY": "sk-fake", "OPENAI_BASE_URL": server.base_url,
+               "SERVER_PROFILE": "production", "SHARED_STATE_DIR": state, "FAST_PATH": "on"}
+        print(f"{os.cpu_count()} CPUs, {CONCURRENCY} concurrent clients, {DURATION:.0f}s per run\n")
+        print(f"{'workers':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            latencies = sorted(asyncio.run(measure(workers, env)))
+            rps = len(latencies) / DURATION
+            baseline = baseline or rps
+            print(f"{workers:>8} {rps:>9.1f} {statistics.median(latencies) * 1000:>8.1f} "
+                  f"{latencies[int(len(latencies) * 0.99)] * 1000:>8.1f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or sorted({1, 2, 4, os.cpu_count() or 1}))
@@ -0,0 +1,198 @@
+"""
+Minimal OpenAI-compatible HTTP server for offline benchmarks
+
+Serves POST /v1/chat/completions (plain and `stream: true`) with a canned answer,
+or with canned tool calls when the user's message contains one of the `tool_calls` keywords,
+and GET /v1/models, and counts the TCP connections, requests and request body bytes it receives,
+so client-side pooling and payload sizes can be observed; `capacity` caps the completions served at
+once, like a provider's concurrency limit. Usage:
+
+    with FakeOpenAIServer(answer="hi") as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+"""
+import json
+import threading
+from contextlib import nullcontext
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        # stands in for the TCP and TLS handshakes of a real API endpoint
+        time.sleep(self.server.connect_latency)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        payload = json.dumps({"object": "list", "data": [{"id": "fake", "object": "model"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes_received += length
+
+        # completions past `capacity` wait for a slot
+        with self.server.capacity or nullcontext():
+            self._complete(body)
+
+    def _complete(self, body: dict):
+        images = sum(1 for message in body.get("messages", [])
+                     if isinstance(message.get("content"), list)
+                     for part in message["content"] if part.get("type") == "image_url")
+        time.sleep(self.server.latency + self.server.image_latency * images)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "fake")
+        tool_calls = self._tool_calls(body.get("messages", []))
+
+        if tool_calls and body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for delta, finish_reason in [({"role": "assistant", "tool_calls": [
+                    {"index": i, **call} for i, call in enumerate(tool_calls)]}, None), ({}, "tool_calls")]:
+                self._write_chunk(self._sse({
+                    "id": completion_id, "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+            return
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            words = self.server.answer.split(" ")
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.server.token_interval)
+                delta = word + (" " if i < len(words) - 1 else "")
+                self._write_chunk(self._sse({
+                    "id": completion_id, "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": delta},
+                                 "finish_reason": None}],
+                }))
+            self._write_chunk(self._sse({
+                "id": completion_id, "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+            return
+
+        message = ({"role": "assistant", "content": None, "tool_calls": tool_calls} if tool_calls
+                   else {"role": "assistant", "content": self.server.answer})
+        payload = json.dumps({
+            "id": completion_id, "object": "chat.completion",
+            "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "finish_reason": "tool_calls" if tool_calls else "stop",
+                         "message": message}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _tool_calls(self, messages: list) -> list:
+        """OpenAI tool calls for a user message with a keyword; results of earlier calls get the answer"""
+        if not messages or messages[-1].get("role") != "user":
+            return []
+        content = messages[-1].get("content")
+        text = content if isinstance(content, str) else " ".join(
+            part.get("text", "") for part in content or [] if isinstance(part, dict))
+        for keyword, calls in self.server.tool_calls.items():
+            if keyword.lower() in text.lower():
+                return [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                         "function": {"name": call["name"], "arguments": json.dumps(call["args"])}}
+                        for call in calls]
+        return []
+
+    def _sse(self, data: dict) -> bytes:
+        return f"data: {json.dumps(data)}\n\n".encode()
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer:
+    """Threaded fake of the OpenAI chat completions API bound to localhost"""
+
+    def __init__(self, answer: str = "This is a fake completion.",
+                 latency: float = 0.0, token_interval: float = 0.0, port: int = 0,
+                 image_latency: float = 0.0, connect_latency: float = 0.0, tool_calls: dict = None,
+                 capacity: int = 0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.connections = 0
+        self.httpd.requests = 0
+        self.httpd.bytes_received = 0
+        self.httpd.answer = answer
+        self.httpd.latency = latency
+        # extra latency per image in the request, like a vision model
+        self.httpd.image_latency = image_latency
+        self.httpd.token_interval = token_interval
+        self.httpd.connect_latency = connect_latency
+        # keyword -> [{"name": ..., "args": {...}}] requested when a user message contains it
+        self.httpd.tool_calls = tool_calls or {}
+        # completions served at once, 0 for no limit
+        self.httpd.capacity = threading.Semaphore(capacity) if capacity else None
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def connections(self) -> int:
+        return self.httpd.connections
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    @property
+    def bytes_received(self) -> int:
+        return self.httpd.bytes_received
+
+    def reset_counters(self):
+        with self.httpd.lock:
+            self.httpd.connections = 0
+            self.httpd.requests = 0
+            self.httpd.bytes_received = 0
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,17 @@
+"""
+Fake-model helpers for the benchmarks
+
+The scripted chat model, search backend and fake_agent live in
+tests/fakes.py, so the tests and the benchmarks build and drive the agent
+the same way.
+"""
+from tests.fakes import FakeChatModel, FakeSearchBackend, fake_agent
+
+__all__ = ["FakeChatModel", "FakeSearchBackend", "fake_agent", "fake_model_factory"]
+
+
+def fake_model_factory(**overrides):
+    """Return a drop-in replacement for `ChatOpenAI(...)` building fake models"""
+    def factory(*args, **kwargs):
+        return FakeChatModel(**{**kwargs, **overrides})
+    return factory
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Load generator for /chat and /chat/stream with SSE-aware latency metrics
+
+Replays a mix of text, tool-heavy and image questions at a sweep of
+concurrency levels (closed loop: each virtual user sends its next request
+when the previous one finishes) or arrival rates (open loop: Poisson
+arrivals whatever the response times). For every request it records time
+to first byte, time to the first token event, the gaps between token
+events and the completion latency, and it reports where the API
+saturates: errors, p99 latency past twice that of the lightest load, or
+throughput that stops following the load.
+
+Without --url the app runs in-process against a local fake OpenAI server
+(answering after --model-latency, then one word per --token-interval, with
+tool calls for the tool-heavy questions, and at most --model-capacity
+completions at once) and a fake search backend, so it
+works fully offline. With --url it drives a running server, e.g.
+`SERVER_PROFILE=production python run_server.py`.
+Usage: python -m benchmarks.loadgen [--url URL] [--endpoint stream|chat]
+           [--concurrency 1,4,16,64 | --rate 2,5,10,20] [--duration 10]
+           [--mix text=6,tools=3,image=1] [-o results.json]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fakes import FakeSearchBackend
+
+IMAGE = Path("test_images/sample_test.png")
+ANSWER = " ".join(["Here is what I found about it."] * 6)
+# the fake model asks for these when a question contains the keyword
+TOOL_CALLS = {"calculate": [
+    {"name": "calculator", "args": {"expression": "25 * 4 + 10"}},
+    {"name": "fetch_user_from_database", "args": {"user_id": "user1"}},
+    {"name": "duckduckgo_search", "args": {"query": "LangGraph agents"}},
+]}
+
+
+@dataclass
+class Result:
+    kind: str
+    status: Optional[int] = None
+    error: Optional[str] = None
+    ttfb: Optional[float] = None
+    first_token: Optional[float] = None
+    latency: Optional[float] = None
+    gaps: List[float] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200 and self.error is None
+
+    @property
+    def rejected(self) -> bool:
+        """Turned away by admission control"""
+        return self.status in (429, 503)
+
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    """
+    httpx.ASGITransport collects the whole response body before returning
+    it, which hides SSE timing; this one hands the response over when it
+    starts and yields body chunks as the app sends them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = b"".join([part async for part in request.stream])
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": request.method, "scheme": request.url.scheme,
+            "path": request.url.path, "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query, "root_path": "",
+            "headers": [(k.lower(), v) for k, v in request.headers.raw],
+            "server": (request.url.host, request.url.port), "client": ("127.0.0.1", 0),
+        }
+        started = asyncio.get_running_loop().create_future()
+        chunks: asyncio.Queue = asyncio.Queue()
+        disconnected = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if request_sent:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                started.set_result(message)
+            elif message["type"] == "http.response.body":
+                chunks.put_nowait(message.get("body", b""))
+
+        async def run():
+            try:
+                await self.app(scope, receive, send)
+            except Exception as e:
+                if not started.done():
+                    started.set_exception(e)
+            finally:
+                chunks.put_nowait(None)
+
+        task = asyncio.create_task(run())
+        start = await started
+
+        class Body(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                while (chunk := await chunks.get()) is not None:
+                    yield chunk
+
+            async def aclose(self):
+                disconnected.set()
+                await task
+
+        return httpx.Response(start["status"], headers=start.get("headers", []), stream=Body())
+
+
+class QueryMix:
+    """Deterministic stream of request bodies drawn from weighted kinds"""
+
+    def __init__(self, weights: Dict[str, int], seed: int = 7):
+        self.weights = weights
+        self.rng = random.Random(seed)
+        self.count = 0
+        self.image = base64.b64encode(IMAGE.read_bytes()).decode() if weights.get("image") else None
+
+    def next(self) -> tuple:
+        self.count += 1
+        n = self.count
+        kind = self.rng.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        if kind == "text":
+            return kind, {"message": f"Tell me something interesting about request {n}"}
+        if kind == "tools":
+            return kind, {"message": f"Calculate 25 * 4 + {n}, then fetch user1 and search the news about it"}
+        return kind, {"message": f"What is in this picture? ({n})", "images": [
+            {"data": self.image, "type": "base64", "filename": "sample_test.png", "mime_type": "image/png"}]}
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, kind: str, payload: dict) -> Result:
+    result = Result(kind)
+    start = time.perf_counter()
+    try:
+        path = "/chat/stream" if endpoint == "stream" else "/chat"
+        async with client.stream("POST", path, json=payload) as response:
+            result.ttfb = time.perf_counter() - start
+            result.status = response.status_code
+            if endpoint == "stream" and response.status_code == 200:
+                last = None
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[len("data: "):])
+                    now = time.perf_counter()
+                    if event["event"] == "token":
+                        if last is None:
+                            result.first_token = now - start
+                        else:
+                            result.gaps.append(now - last)
+                        last = now
+                    elif event["event"] == "error":
+                        result.error = event["data"]
+            else:
+                await response.aread()
+        result.latency = time.perf_counter() - start
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def closed_loop(client, endpoint: str, mix: QueryMix, users: int, duration: float) -> List[Result]:
+    results, stop = [], time.monotonic() + duration
+
+    async def user():
+        while time.monotonic() < stop:
+            results.append(await send(client, endpoint, *mix.next()))
+
+    await asyncio.gather(*(user() for _ in range(users)))
+    return results
+
+
+async def open_loop(client, endpoint: str, mix: QueryMix, rate: float, duration: float,
+                    drain: float) -> List[Result]:
+    """Poisson arrivals at `rate`/s; requests still running `drain` seconds after the last arrival time out"""
+    rng, tasks = random.Random(11), []
+    start = time.monotonic()
+    next_arrival = start
+    while next_arrival < start + duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.monotonic()))
+        tasks.append(asyncio.create_task(send(client, endpoint, *mix.next())))
+        next_arrival += rng.expovariate(rate)
+    done, pending = await asyncio.wait(tasks, timeout=drain) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    return [task.result() for task in done] + [Result("unknown", error="timeout") for _ in pending]
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+def summarize(load: float, results: List[Result], duration: float) -> dict:
+    ok = [r for r in results if r.ok]
+    rejected = sum(r.rejected for r in results)
+    errors = len(results) - len(ok) - rejected
+    latencies = [r.latency for r in ok]
+    summary = {
+        "load": load,
+        "requests": len(results),
+        "errors": errors,
+        "rejected": rejected,
+        "throughput": len(ok) / duration,
+        "error_rate": errors / len(results) if results else 0.0,
+        "rejection_rate": rejected / len(results) if results else 0.0,
+        "mean_s": statistics.mean(latencies) if latencies else None,
+    }
+    for name, samples in [("latency", latencies), ("ttfb", [r.ttfb for r in ok]),
+                          ("first_token", [r.first_token for r in ok if r.first_token is not None]),
+                          ("token_gap", [g for r in ok for g in r.gaps])]:
+        for q in (50, 95, 99):
+            summary[f"{name}_p{q}_s"] = percentile(samples, q / 100)
+    summary["latency_p50_by_kind_s"] = {
+        kind: percentile([r.latency for r in ok if r.kind == kind], 0.5)
+        for kind in sorted({r.kind for r in ok})}
+    examples = [r.error or f"HTTP {r.status}" for r in results if not r.ok and not r.rejected]
+    summary["error_examples"] = sorted(set(examples))[:3]
+    return summary
+
+
+def saturation(steps: List[dict], open_loop_mode: bool) -> dict:
+    """The heaviest load the API keeps up with, and the first one it doesn't (with the reason)"""
+    baseline = steps[0]["latency_p99_s"]
+    capacity, saturated = None, None
+    for i, step in enumerate(steps):
+        reasons = []
+        if step["error_rate"] > 0.01:
+            reasons.append(f"{step['error_rate']:.0%} errors")
+        if step["rejection_rate"] > 0.01:
+            reasons.append(f"{step['rejection_rate']:.0%} rejected")
+        if baseline and step["latency_p99_s"] and step["latency_p99_s"] > 2 * baseline:
+            reasons.append(f"p99 {step['latency_p99_s'] / baseline:.1f}x the lightest load's")
+        if open_loop_mode and step["throughput"] < 0.9 * step["load"]:
+            reasons.append(f"served {step['throughput']:.1f} of {step['load']:g} req/s offered")
+        if not open_loop_mode and i and step["throughput"] < 1.1 * steps[i - 1]["throughput"]:
+            reasons.append("throughput stopped growing with concurrency")
+        if reasons:
+            saturated = {"load": step["load"], "reasons": reasons}
+            break
+        capacity = {"load": step["load"], "throughput": step["throughput"]}
+    return {"capacity": capacity, "saturated": saturated}
+
+
+def ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def report(steps: List[dict], open_loop_mode: bool, endpoint: str, verdict: dict):
+    unit = "req/s in" if open_loop_mode else "users"
+    header = f"{unit:>9} {'req/s':>7} {'err':>5} {'rej':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'ttfb50':>7}"
+    if endpoint == "stream":
+        header += f" {'ttft50':>7} {'ttft99':>7} {'gap50':>6} {'gap99':>6}"
+    print(header + "   (latencies in ms)")
+    for s in steps:
+        line = (f"{s['load']:>9g} {s['throughput']:>7.1f} {s['errors']:>5} {s['rejected']:>5} "
+                f"{ms(s['latency_p50_s']):>7} {ms(s['latency_p95_s']):>7} {ms(s['latency_p99_s']):>7} "
+                f"{ms(s['ttfb_p50_s']):>7}")
+        if endpoint == "stream":
+            line += (f" {ms(s['first_token_p50_s']):>7} {ms(s['first_token_p99_s']):>7}"
+                     f" {ms(s['token_gap_p50_s']):>6} {ms(s['token_gap_p99_s']):>6}")
+        print(line)
+        for example in s["error_examples"]:
+            print(f"{'':>9} error: {example[:100]}")
+
+    capacity, saturated = verdict["capacity"], verdict["saturated"]
+    print()
+    if capacity:
+        print(f"keeps up at {capacity['load']:g} {unit}: {capacity['throughput']:.1f} req/s")
+    if saturated:
+        print(f"saturated at {saturated['load']:g} {unit}: {'; '.join(saturated['reasons'])}")
+    else:
+        print("no saturation within the tested loads")
+
+
+async def run(args, base_url: str, transport: httpx.AsyncBaseTransport = None) -> dict:
+    mix = QueryMix(dict((kind, int(weight)) for kind, weight in
+                        (item.split("=") for item in args.mix.split(","))))
+    loads = [float(x) for x in (args.rate or args.concurrency).split(",")]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    steps = []
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits,
+                                 timeout=args.timeout) as client:
+        await send(client, args.endpoint, *mix.next())  # warm up
+        for load in loads:
+            if args.rate:
+                results = await open_loop(client, args.endpoint, mix, load, args.duration, args.timeout)
+            else:
+                results = await closed_loop(client, args.endpoint, mix, int(load), args.duration)
+            steps.append(summarize(load, results, args.duration))
+    verdict = saturation(steps, bool(args.rate))
+    report(steps, bool(args.rate), args.endpoint, verdict)
+    return {"endpoint": args.endpoint, "mode": "open" if args.rate else "closed", "mix": args.mix,
+            "duration_s": args.duration, "steps": steps, **verdict}
+
+
+async def run_in_process(args) -> dict:
+    import app.main
+    from app.cache import TTLCache
+    from app.search import SearchService, set_search_service
+
+    set_search_service(SearchService(FakeSearchBackend(args.search_latency), TTLCache(name="search")))
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return await run(args, "http://app", StreamingASGITransport(app.main.app))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for /chat and /chat/stream")
+    parser.add_argument("--url", help="a running server; without it the app runs in-process")
+    parser.add_argument("--endpoint", choices=["stream", "chat"], default="stream")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="closed loop: virtual users per step")
+    parser.add_argument("--rate", help="open loop: arrivals per second per step, e.g. 2,5,10,20")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per step")
+    parser.add_argument("--mix", default="text=6,tools=3,image=1", help="weights of text, tools and image")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a request counts as failed")
+    parser.add_argument("--model-latency", type=float, default=0.3, help="in-process fake model: first token")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="in-process fake model: per word")
+    parser.add_argument("--model-capacity", type=int, default=0,
+                        help="in-process fake model: completions served at once (0: no limit)")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="in-process fake search backend")
+    parser.add_argument("-o", "--output", help="write the steps and the verdict to this JSON file")
+    args = parser.parse_args()
+
+    if args.url:
+        print(f"target: {args.url} {args.endpoint}\n")
+        results = asyncio.run(run(args, args.url.rstrip("/")))
+    else:
+        logging.disable(logging.INFO)
+        with FakeOpenAIServer(answer=ANSWER, latency=args.model_latency, token_interval=args.token_interval,
+                              tool_calls=TOOL_CALLS, capacity=args.model_capacity) as server:
+            os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            os.environ.setdefault("WARMUP", "false")
+            print(f"target: in-process app, fake model {args.model_latency * 1000:.0f} ms + "
+                  f"{args.token_interval * 1000:.0f} ms/word, {args.endpoint}\n")
+            results = asyncio.run(run_in_process(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite: latency percentiles, throughput and peak RSS per
+scenario, as JSON that can be compared across commits
+
+Every scenario runs in a fresh interpreter (so its peak RSS is its own)
+against a scripted FakeChatModel answering after LATENCY seconds plus
+TOKEN_INTERVAL per word, with search served by FakeSearchBackend:
+
+  single_turn   POST /chat through the FastAPI app, one model call
+  multi_tool    calculator, user lookup and search called in one response, then the answer
+  long_history  a turn on a session already holding HISTORY_TURNS turns
+  image         a turn with a base64 photo analyzed by the vision model, new bytes each
+                time (a different JPEG comment), so it is decoded and resized every turn
+  image_cached  the same turn with the same photo every time, served from the image cache
+  streaming     /chat/stream after a tool round: time to first token and to the last event
+
+Usage: python -m benchmarks.suite [-n iterations] [-c concurrency] [-o results.json]
+                                  [--compare baseline.json] [scenario ...]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+from benchmarks.fakes import FakeChatModel, FakeSearchBackend, fake_agent, fake_model_factory
+
+LATENCY = 0.02
+TOKEN_INTERVAL = 0.001
+SEARCH_LATENCY = 0.01
+HISTORY_TURNS = 50
+IMAGE = Path("test_images/dog.jpg")
+ANSWER = " ".join(["The answer is ready."] * 10)
+TOOL_CALLS = [
+    {"name": "calculator", "args": {"expression": "25 * 4 + 10"}},
+    {"name": "fetch_user_from_database", "args": {"user_id": "user1"}},
+    {"name": "duckduckgo_search", "args": {"query": "LangGraph"}},
+]
+
+
+def fake_model(**script) -> FakeChatModel:
+    return FakeChatModel(first_token_latency=LATENCY, token_interval=TOKEN_INTERVAL, answer=ANSWER, **script)
+
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+async def single_turn(iterations: int):
+    import httpx
+
+    import app.llm
+    import app.main
+
+    with mock.patch.object(app.llm, "ChatOpenAI", fake_model_factory(
+            first_token_latency=LATENCY, token_interval=TOKEN_INTERVAL, answer=ANSWER)):
+        async with app.main.app.router.lifespan_context(app.main.app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.main.app),
+                                         base_url="http://app") as client:
+                async def run(i):
+                    response = await client.post("/chat", json={"message": f"Hello #{i}"})
+                    response.raise_for_status()
+                yield run
+
+
+async def multi_tool(iterations: int):
+    agent = fake_agent(fake_model(script=[TOOL_CALLS, ANSWER]))
+
+    async def run(i):
+        await agent.achat(f"Work out 25 * 4 + 10, fetch user1 and search for LangGraph #{i}")
+    yield run
+
+
+async def long_history(iterations: int):
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    agent = fake_agent(fake_model())
+    config = agent.sessions.config("history")
+    history = []
+    for turn in range(HISTORY_TURNS):
+        history += [HumanMessage(content=f"Question {turn}: " + "tell me more about LangGraph " * 10),
+                    AIMessage(content=f"Answer {turn}: " + ANSWER)]
+    agent.session_graph.update_state(config, {"messages": history}, as_node="agent")
+    agent.sessions.record("history")
+
+    async def run(i):
+        await agent.achat(f"And what about #{i}?", session_id="history")
+    yield run
+
+
+def photo_variants(count: int):
+    """
+    `count` base64 copies of IMAGE that differ only in a JPEG comment, so none
+    is a cache hit but each decodes to the same picture
+    """
+    photo = IMAGE.read_bytes()
+    variants = []
+    for n in range(count):
+        comment = f"variant {n}".encode()
+        # a COM segment right after the start-of-image marker; its length counts itself
+        segment = b"\xff\xfe" + (len(comment) + 2).to_bytes(2, "big") + comment
+        variants.append(base64.b64encode(photo[:2] + segment + photo[2:]).decode())
+    return variants
+
+
+def image_turns(photos):
+    from app.images import ImageCache, ImageProcessor, set_image_cache
+    from app.models import ImageData
+
+    set_image_cache(ImageCache(processor=ImageProcessor(workers=0)))
+    agent = fake_agent(fake_model())
+
+    async def run(i):
+        # the warm-up call is i = -1
+        images = [ImageData(data=photos(i + 1), type="base64", filename="dog.jpg", mime_type="image/jpeg")]
+        await agent.achat(f"What is in this picture? #{i}", images)
+    return run
+
+
+async def image(iterations: int):
+    # encoded up front, so the timed turns don't include making the variants
+    variants = photo_variants(iterations + 1)
+    yield image_turns(lambda n: variants[n])
+
+
+async def image_cached(iterations: int):
+    data = base64.b64encode(IMAGE.read_bytes()).decode()
+    yield image_turns(lambda n: data)
+
+
+async def streaming(iterations: int):
+    import app.llm
+    import app.main
+    from app.models import StreamingChatRequest
+
+    first_tokens = []
+    with mock.patch.object(app.llm, "ChatOpenAI", fake_model_factory(
+            first_token_latency=LATENCY, token_interval=TOKEN_INTERVAL, answer=ANSWER,
+            tool_calls=TOOL_CALLS[:1])):
+        async with app.main.app.router.lifespan_context(app.main.app):
+            async def run(i):
+                start = time.perf_counter()
+                first_token = None
+                response = await app.main.stream_chat_with_agent(
+                    StreamingChatRequest(message=f"Calculate 25 * 4 + 10 #{i}"))
+                async for chunk in response.body_iterator:
+                    if first_token is None and json.loads(chunk[len("data: "):])["event"] == "token":
+                        first_token = time.perf_counter() - start
+                first_tokens.append(first_token)
+            run.first_tokens = first_tokens
+            yield run
+
+
+SCENARIOS = {f.__name__: f for f in (single_turn, multi_tool, long_history, image, image_cached, streaming)}
+
+
+async def measure(name: str, iterations: int, concurrency: int) -> dict:
+    """Run one scenario in this process: a warm-up call, then `iterations` timed ones"""
+    async for run in SCENARIOS[name](iterations):
+        await run(-1)
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(i):
+            async with semaphore:
+                start = time.perf_counter()
+                await run(i)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(i) for i in range(iterations)))
+        wall = time.perf_counter() - start
+
+        result = {
+            "iterations": iterations,
+            "concurrency": concurrency,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "throughput_per_s": iterations / wall,
+        }
+        first_tokens = getattr(run, "first_tokens", None)
+        if first_tokens:
+            timed_first_tokens = first_tokens[1:]
+            result["ttft_p50_ms"] = percentile(timed_first_tokens, 0.50) * 1000
+            result["ttft_p99_ms"] = percentile(timed_first_tokens, 0.99) * 1000
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_scenario(name: str, iterations: int, concurrency: int) -> dict:
+    """Run a scenario in a fresh interpreter and return its results"""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--child", name, "-n", str(iterations),
+         "-c", str(concurrency)],
+        env={**os.environ, "OPENAI_API_KEY": "sk-fake", "SESSION_BACKEND": "memory", "WARMUP": "false"},
+        capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "model_latency_s": LATENCY,
+        "token_interval_s": TOKEN_INTERVAL,
+        "search_latency_s": SEARCH_LATENCY,
+    }
+
+
+def report(results: dict, baseline: dict = None):
+    columns = ["p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "peak_rss_mb"]
+    print(f"{'scenario':<14}" + "".join(f"{c:>18}" for c in columns))
+    for name, result in results["scenarios"].items():
+        old = (baseline or {}).get("scenarios", {}).get(name)
+        cells = []
+        for column in columns:
+            cell = f"{result[column]:.1f}"
+            if old and old.get(column):
+                cell += f" ({(result[column] / old[column] - 1) * 100:+.0f}%)"
+            cells.append(f"{cell:>18}")
+        print(f"{name:<14}" + "".join(cells))
+        if "ttft_p50_ms" in result:
+            print(f"{'':<14}time to first token p50 {result['ttft_p50_ms']:.1f} ms, "
+                  f"p99 {result['ttft_p99_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        logging.disable(logging.INFO)
+        from app.cache import TTLCache
+        from app.search import SearchService, set_search_service
+
+        set_search_service(SearchService(FakeSearchBackend(SEARCH_LATENCY), TTLCache(name="search")))
+        print(json.dumps(asyncio.run(measure(args.child, args.iterations, args.concurrency))))
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    results = {"meta": metadata(), "scenarios": {}}
+    for name in args.scenarios or SCENARIOS:
+        results["scenarios"][name] = run_scenario(name, args.iterations, args.concurrency)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"compared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})\n")
+    report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
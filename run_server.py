@@ -16,33 +16,24 @@ def main():
         os.system("pip install 'granian[reload]'")
         import granian
 
-    # Configuration
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", "8000"))
-    reload = os.getenv("RELOAD", "true").lower() == "true"
-
-    print(f"🚀 Starting LangGraph Agent API Server")
-    print(f"📍 Host: {host}")
-    print(f"🔌 Port: {port}")
-    print(f"🔄 Reload: {reload}")
+    from app.server import serve, server_options
+
+    options = server_options()
+
+    print(f"🚀 Starting LangGraph Agent API Server ({options['profile']})")
+    print(f"📍 Host: {options['host']}")
+    print(f"🔌 Port: {options['port']}")
+    print(f"👷 Workers: {options['workers']} ({options['runtime_mode']} runtime, {options['runtime_threads']} thread(s) each)")
+    print(f"🖼️  Image processes per worker: {options['image_workers']}")
+    print(f"🔄 Reload: {options['reload']}")
+    print(f"🗄️  Shared state: {options['shared_state_dir'] or 'per process'}")
     print(f"📂 Working Directory: {Path.cwd()}")
     print()
 
     # Start the server
     try:
-        from granian import Granian
-        from granian.constants import Interfaces
-
-        app = Granian(
-            "app.main:app",
-            address=host,
-            port=port,
-            interface=Interfaces.ASGI,
-            reload=reload,
-        )
-
         print("🎯 Server starting... Press Ctrl+C to stop")
-        app.serve()
+        serve(options)
 
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
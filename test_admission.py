@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Regression test: admission control caps agent runs, queues fairly and
+turns the excess away with a Retry-After hint
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from starlette.requests import ClientDisconnect
+
+import app.main
+from app.admission import AdmissionController, Overloaded, set_admission_controller
+from app.models import StreamingChatRequest
+from tests.fakes import FakeChatModel, fake_agent
+
+
+def test_full_queue_is_rejected_at_once():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5, max_per_session=10)
+        running = await controller.acquire("a")
+        waiting = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            await controller.acquire("c")
+        assert rejected.value.status_code == 503 and rejected.value.retry_after >= 1
+        assert controller.stats()["waiting"] == 1
+
+        running.release()
+        (await waiting).release()
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0 and stats["waiting"] == 0
+    assert stats["admitted"] == 2 and stats["rejected"]["queue_full"] == 1
+
+
+def test_wait_times_out_and_session_limit_is_429():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05, max_per_session=2)
+        running = await controller.acquire("a")
+        with pytest.raises(Overloaded) as timed_out:
+            await controller.acquire("a")
+        assert timed_out.value.reason == "queue_timeout"
+
+        queued = asyncio.create_task(controller.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as limited:
+            await controller.acquire("a")
+        assert limited.value.status_code == 429
+        queued.cancel()
+        running.release()
+        await asyncio.gather(queued, return_exceptions=True)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0 and stats["waiting"] == 0
+
+
+def test_freed_slots_go_to_sessions_round_robin():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=5, max_per_session=10)
+        order = []
+
+        async def run(session_id):
+            async with controller.admit(session_id):
+                order.append(session_id)
+                await asyncio.sleep(0.001)
+
+        first = await controller.acquire("busy")
+        # one client queues four requests before another queues two
+        tasks = [asyncio.create_task(run(session_id)) for session_id in ["busy"] * 4 + ["quiet"] * 2]
+        await asyncio.sleep(0)
+        first.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["busy", "quiet", "busy", "quiet", "busy", "busy"]
+
+
+def test_requests_without_a_session_are_admitted_under_their_new_session():
+    # behind a proxy every client has the same address, so that can't be the key
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app, client=("10.0.0.1", 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            anonymous = await asyncio.gather(*[client.post("/chat", json={"message": "hi"}) for _ in range(3)])
+            named = await asyncio.gather(*[client.post("/chat", json={"message": "hi", "session_id": "s1"})
+                                           for _ in range(2)])
+        return [r.status_code for r in anonymous], sorted(r.status_code for r in named)
+
+    app.main.agent_instance = fake_agent(FakeChatModel(first_token_latency=0.05))
+    set_admission_controller(
+        AdmissionController(max_in_flight=10, max_queue=10, queue_timeout=5, max_per_session=1))
+    try:
+        anonymous, named = asyncio.run(scenario())
+    finally:
+        app.main.agent_instance = None
+        set_admission_controller(None)
+    assert anonymous == [200, 200, 200]
+    assert named == [200, 429]
+
+
+def test_stream_frees_its_slot_when_the_first_send_fails():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5, max_per_session=1)
+
+    async def scenario():
+        response = await app.main.stream_chat_with_agent(StreamingChatRequest(message="hi"))
+        assert controller.stats()["in_flight"] == 1
+
+        async def receive():
+            await asyncio.sleep(10)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("connection reset")
+
+        # the client is gone before the response starts, so the stream is never iterated
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "path": "/chat/stream",
+                 "headers": []}
+        with pytest.raises((OSError, ClientDisconnect)):
+            await response(scope, receive, send)
+
+    app.main.agent_instance = fake_agent()
+    set_admission_controller(controller)
+    try:
+        asyncio.run(scenario())
+    finally:
+        app.main.agent_instance = None
+        set_admission_controller(None)
+    assert controller.stats()["in_flight"] == 0
+
+
+if __name__ == "__main__":
+    test_full_queue_is_rejected_at_once()
+    test_wait_times_out_and_session_limit_is_429()
+    test_freed_slots_go_to_sessions_round_robin()
+    test_requests_without_a_session_are_admitted_under_their_new_session()
+    test_stream_frees_its_slot_when_the_first_send_fails()
+    print("✅ Admission control tests passed!")
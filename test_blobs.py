@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Regression test: /upload-image streams into the blob store, and the store
+enforces its size limit and expiry
+
+The app is called in-process over ASGI. An oversized upload must be turned
+away before its body is read, or as soon as it crosses the limit when its
+size isn't declared, and leave nothing behind in the store.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+import app.main
+from app.blobs import BLOB_URL_PREFIX, BlobStore, BlobTooLarge, set_blob_store
+from app.vision import resolve_images
+from tests.fakes import fake_agent
+
+IMAGE = Path("test_images/sample_test.png").read_bytes()
+BOUNDARY = "test-boundary"
+
+
+def form(content: bytes, content_type="image/png", filename="photo.png") -> bytes:
+    return (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n"
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n").encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def upload(store: BlobStore, body, headers=None) -> httpx.Response:
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/upload-image", content=body, headers={
+                "content-type": f"multipart/form-data; boundary={BOUNDARY}", **(headers or {})})
+
+    set_blob_store(store)
+    app.main.agent_instance = fake_agent()
+    try:
+        return asyncio.run(scenario())
+    finally:
+        app.main.agent_instance = None
+        set_blob_store(None)
+
+
+async def pieces(data: bytes, size: int = 1000):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_store_accepts_up_to_the_limit():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(directory=tmp, max_bytes=4096)
+        blob = asyncio.run(store.save(pieces(b"x" * 4096), "image/png"))
+        assert blob.size == 4096 and blob.filename == "uploaded_image"
+
+        with pytest.raises(BlobTooLarge):
+            asyncio.run(store.save(pieces(b"x" * 4097), "image/png"))
+        # only the first blob and its metadata; the rejected part file is gone
+        assert sorted(os.listdir(tmp)) == sorted([os.path.basename(blob.path), f"{blob.handle}.json"])
+
+
+def test_only_stored_handles_resolve():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(directory=tmp)
+        blob = asyncio.run(store.save(pieces(IMAGE), "image/png", "photo.png"))
+        assert store.get(blob.handle) == blob
+        # malformed handles never become paths
+        for handle in ("", "../../etc/passwd", f"{blob.handle}/..", blob.handle[:-1], "A" * 22):
+            assert store.get(handle) is None
+
+        set_blob_store(store)
+        try:
+            part = {"type": "image_url", "image_url": {"url": f"{BLOB_URL_PREFIX}{blob.handle}"}}
+            assert resolve_images([part])[0]["image_url"]["url"].startswith("data:image/")
+
+            store.delete(blob.handle)
+            assert store.get(blob.handle) is None and os.listdir(tmp) == []
+            with pytest.raises(ValueError, match="expired or does not exist"):
+                resolve_images([{"type": "image_url", "image_url": {"url": f"{BLOB_URL_PREFIX}{blob.handle}"}}])
+        finally:
+            set_blob_store(None)
+
+
+def test_upload_is_stored_and_resolved_by_handle():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(directory=tmp)
+        response = upload(store, form(IMAGE))
+        assert response.status_code == 200, response.text
+        image = response.json()
+        assert image["type"] == "handle" and image["filename"] == "photo.png"
+
+        blob = store.get(image["data"])
+        assert blob.mime_type == "image/png" and blob.size == len(IMAGE)
+        assert Path(blob.path).read_bytes() == IMAGE
+
+        assert upload(store, form(b"plain text", "text/plain")).status_code == 400
+        assert upload(store, b"not a form").status_code == 400
+
+
+def test_declared_oversized_upload_is_rejected_before_reading_it():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(directory=tmp, max_bytes=1024)
+        received = []
+
+        async def receive():
+            received.append(True)
+            return {"type": "http.request", "body": b"x" * 65536, "more_body": True}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/upload-image", "query_string": b"",
+                 "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+                             (b"content-length", str(100 * 1024 * 1024).encode())]}
+        set_blob_store(store)
+        app.main.agent_instance = fake_agent()
+        try:
+            asyncio.run(app.main.app(scope, receive, send))
+        finally:
+            app.main.agent_instance = None
+            set_blob_store(None)
+
+        assert sent[0]["status"] == 413 and not received
+        assert os.listdir(tmp) == []
+
+
+def test_undeclared_oversized_upload_stops_at_the_limit():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(directory=tmp, max_bytes=64 * 1024)
+        sent = []
+
+        async def body():
+            # chunked: no Content-Length for the early check
+            for chunk in [form(b"")[:-len(f"\r\n--{BOUNDARY}--\r\n")]] + [b"x" * 16384] * 64:
+                sent.append(len(chunk))
+                yield chunk
+
+        response = upload(store, body())
+        assert response.status_code == 413, response.text
+        assert sum(sent) < 128 * 1024
+        assert os.listdir(tmp) == []
+
+
+def test_expired_blob_is_not_resolved():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(directory=tmp, ttl_seconds=60)
+        handle = upload(store, form(IMAGE)).json()["data"]
+        assert store.get(handle) is not None
+
+        old = time.time() - 120
+        for entry in os.scandir(tmp):
+            os.utime(entry.path, (old, old))
+        assert store.get(handle) is None
+
+
+if __name__ == "__main__":
+    test_store_accepts_up_to_the_limit()
+    test_only_stored_handles_resolve()
+    test_upload_is_stored_and_resolved_by_handle()
+    test_declared_oversized_upload_is_rejected_before_reading_it()
+    test_undeclared_oversized_upload_stops_at_the_limit()
+    test_expired_blob_is_not_resolved()
+    print("✅ Blob store tests passed!")
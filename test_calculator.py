@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Regression test: the calculator evaluates arithmetic, rejects everything else,
+and never hangs on pathological input
+"""
+
+import time
+
+import pytest
+
+from app.agent import calculator
+from app.calculator import ExpressionError, evaluate, evaluate_array, evaluate_many
+
+# each must be rejected (or evaluated) quickly instead of hanging the worker or escaping the sandbox
+PATHOLOGICAL = [
+    "9**9**9", "10**10**10", "2**2**2**2**2", "pow(10, 10**8)", "9^9^9",
+    "(10**3000) * (10**3000)", "(2**9999) * (2**9999) * (2**9999)", "10**3000 / 3",
+    "9.0 ** 9 ** 9", "exp(10**6)", "sqrt(10**3000)", "1 / 0", "10 % 0",
+    "-" * 990 + "1", "(" * 400 + "1" + ")" * 400, "1+" * 400 + "1", "9" * 1001,
+    "().__class__.__bases__[0].__subclasses__()", "__import__('os').system('true')",
+    "(lambda: 1)()", "[1] * 10**9", "'a' * 10**9", "x", "sum(range(10**12))",
+    "max(*[1, 2])", "pow(2, 3, 5)", "round(1.5, ndigits=10**9)",
+    "round(5, -10000000)", "round(5, -10**9)", "round(1.5, 10**9)",
+    "sum([" + "1, " * 300 + "1])", "sum([[1, 2]])", "[1, 2] + [3]", "abs([1, 2])", "sum([1], 2)",
+    "(-8) ** 0.5", "pow(-1, 0.5)", "(-8)^(1/3)", "min([])",
+]
+
+
+def test_arithmetic():
+    assert evaluate("2 + 2 * 3") == 8
+    assert evaluate("sqrt(144) + 5^2") == 37.0
+    assert evaluate("sin(pi/2)") == 1.0
+    assert evaluate("2 ** 64") == 2 ** 64
+    assert evaluate("max(1, 7, 3) - abs(-2)") == 5
+    assert calculator.invoke({"expression": "25 * 4 + 10"}) == "Result: 110"
+
+
+def test_sum_min_max_of_a_list():
+    assert evaluate("sum([1, 2, 3])") == evaluate("sum(1, 2, 3)") == 6
+    assert evaluate("sum((1.5, 2))") == 3.5 and evaluate("sum([])") == 0
+    assert evaluate("max([1, 7, 3]) - min((4, 2 ** 3))") == 3
+    assert evaluate_array("sum([x, 1, 2])", {"x": [1, 2]}).tolist() == [4.0, 5.0]
+    assert evaluate_array("max([x, 2])", {"x": [1, 3]}).tolist() == [2.0, 3.0]
+
+
+def test_complex_results_are_reported():
+    assert calculator.invoke({"expression": "(-8) ** 0.5"}) == \
+        "Error calculating '(-8) ** 0.5': Result is not a real number"
+    assert calculator.invoke({"expression": "sqrt(-1)"}) == "Error calculating 'sqrt(-1)': math domain error"
+    # NumPy has its own value for it
+    assert str(evaluate_array("sqrt(x)", {"x": [-1, 4]}).tolist()) == "[nan, 2.0]"
+
+
+def test_batches_and_arrays():
+    results = evaluate_many(["1 + 1", "1 / 0", "2 ^ 10"])
+    assert results[0] == 2 and isinstance(results[1], ExpressionError) and results[2] == 1024
+    assert evaluate_array("x ** 2 + 1", {"x": [1, 2, 3]}).tolist() == [2.0, 5.0, 10.0]
+    assert evaluate_array("10 ** x", {"x": [400]}).tolist() == [float("inf")]
+    assert calculator.invoke({"expression": "2 + 3; 4 * 5"}) == "Results:\n2 + 3 = 5\n4 * 5 = 20"
+
+
+@pytest.mark.parametrize("expression", PATHOLOGICAL)
+def test_pathological_input_is_rejected_quickly(expression):
+    start = time.perf_counter()
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+    assert time.perf_counter() - start < 0.5, expression
+    assert calculator.invoke({"expression": expression}).startswith("Error calculating")
+
+
+if __name__ == "__main__":
+    test_arithmetic()
+    test_sum_min_max_of_a_list()
+    test_complex_results_are_reported()
+    test_batches_and_arrays()
+    for expression in PATHOLOGICAL:
+        test_pathological_input_is_rejected_quickly(expression)
+    print("✅ Calculator tests passed!")
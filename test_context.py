@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Regression test: context policies shrink the history and the token budget
+counts what is actually sent
+
+The counter is shared across calls like the agent's, so it has already seen
+a tool output at full size by the time that output turns into a placeholder.
+"""
+
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.context import (
+    ChainPolicy,
+    DropStaleToolOutput,
+    TokenBudget,
+    TokenCounter,
+    default_context_policy,
+)
+
+
+def history(*follow_ups):
+    messages = [
+        HumanMessage("what's new in Python?", id="h1"),
+        AIMessage("", id="a1", tool_calls=[{"name": "duckduckgo_search", "args": {"query": "python"}, "id": "c1"}]),
+        ToolMessage("result " * 2000, tool_call_id="c1", name="duckduckgo_search", id="t1"),
+        AIMessage("Python 3.13 is out.", id="a2"),
+    ]
+    for i, text in enumerate(follow_ups):
+        messages.append(HumanMessage(text, id=f"h{i + 2}"))
+    return messages
+
+
+def test_counter_distinguishes_copies_with_new_content():
+    counter = TokenCounter()
+    tool_output = history()[2]
+    placeholder = tool_output.model_copy(update={"content": "[omitted]"})
+
+    assert counter.count_message(tool_output) > 1000
+    assert counter.count_message(placeholder) < 20
+    assert counter.count_message(tool_output) > 1000
+
+
+def test_placeholders_count_at_their_own_size_in_a_chain():
+    counter = TokenCounter()
+    policy = ChainPolicy(DropStaleToolOutput(keep_turns=1), TokenBudget(max_tokens=500, counter=counter))
+
+    # first turn: the search output is current, kept and counted in full
+    first = policy.apply(history())
+    assert first[2].content.startswith("result")
+
+    # next turn: it is a placeholder now, so the earlier turn fits the budget
+    second = policy.apply(history("and what about 3.14?"))
+    assert [m.id for m in second] == ["h1", "a1", "t1", "a2", "h2"]
+    assert "omitted" in second[2].content
+    assert counter.count(second) <= 500
+
+
+def test_default_policy_keeps_earlier_tool_output_unless_enabled():
+    os.environ.pop("CONTEXT_DROP_TOOL_OUTPUT", None)
+    messages = history("and what about 3.14?")
+    assert default_context_policy().apply(messages)[2].content.startswith("result")
+
+    os.environ["CONTEXT_DROP_TOOL_OUTPUT"] = "true"
+    try:
+        assert "omitted" in default_context_policy().apply(messages)[2].content
+    finally:
+        del os.environ["CONTEXT_DROP_TOOL_OUTPUT"]
+
+
+if __name__ == "__main__":
+    test_counter_distinguishes_copies_with_new_content()
+    test_placeholders_count_at_their_own_size_in_a_chain()
+    test_default_policy_keeps_earlier_tool_output_unless_enabled()
+    print("✅ Context policy tests passed!")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Regression test: plain calculator/database requests are answered without the model
+
+The router sits in front of a scripted model; any answer other than the
+model's canned one came from the fast path.
+"""
+
+import asyncio
+
+from app.fast_path import FastPathRouter
+from tests.fakes import FakeChatModel, fake_agent
+
+
+def make_agent():
+    return fake_agent(fast_path=FastPathRouter())
+
+
+def test_fast_path_answers_with_the_tool():
+    agent = make_agent()
+    assert agent.chat("what is 2 + 2 * 3?") == "2 + 2 * 3 = 8"
+    assert agent.chat("calculate sqrt(144) + 5^2") == "sqrt(144) + 5^2 = 37.0"
+    answer = asyncio.run(agent.achat("fetch user2 from database", session_id="s1"))
+    assert answer.startswith("Here is the information for user2") and "Bob Smith" in answer
+
+    # the turn is stored like a model-driven one, so follow-ups see the tool result
+    messages = agent.session_graph.get_state(agent.sessions.config("s1")).values["messages"]
+    assert [m.type for m in messages] == ["human", "ai", "tool", "ai"]
+    assert messages[1].tool_calls[0]["id"] == messages[2].tool_call_id
+
+
+def test_everything_else_goes_to_the_model():
+    agent = make_agent()
+    model_answer = FakeChatModel().answer
+    for question in ("Hello, how are you?", "calculate the area of a circle with radius 5",
+                     "fetch user1 and tell me a joke", "what is 3 -"):
+        assert agent.chat(question) == model_answer, question
+
+    events = list(agent.chat_stream("what is 6 * 7"))
+    assert {"event": "token", "data": "6 * 7 = 42"} in events
+
+
+def test_numbers_that_only_look_like_arithmetic_go_to_the_model():
+    router = FastPathRouter()
+    for question in ("what is 9/11", "What is 9/11?", "24/7", "what's 24/7", "555-1234",
+                     "what is 555-1234?", "2024-05-01", "what is 1/2", "50%"):
+        assert router.route(question) is None, question
+
+    # the same with a verb, spaced operators or a function call is arithmetic
+    for question, expression in (("calculate 9/11", "9/11"), ("compute 555-1234", "555-1234"),
+                                 ("what is 24 / 7?", "24 / 7"), ("what's 2 ** 10", "2 ** 10"),
+                                 ("what is sqrt(16)", "sqrt(16)")):
+        assert router.route(question) == ("calculator", {"expression": expression}), question
+
+
+if __name__ == "__main__":
+    test_fast_path_answers_with_the_tool()
+    test_everything_else_goes_to_the_model()
+    test_numbers_that_only_look_like_arithmetic_go_to_the_model()
+    print("✅ Fast path tests passed!")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Regression test: images are analyzed once and never ride along in the message history
+
+The vision model is a recorder, so tests can count the vision requests and
+look at the image parts each one carried.
+"""
+
+import asyncio
+import base64
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from app.attachments import image_attachment, merge_images, pending_images, consume
+from app.images import ImageCache, ImageProcessor, set_image_cache
+from app.models import ImageData
+from app.vision import VisionAnalyzer
+from tests.fakes import FakeChatModel, fake_agent
+
+IMAGE = Path("test_images/dog.jpg")
+
+
+class FakeVisionModel:
+    """Records every vision request"""
+
+    def __init__(self):
+        self.requests = []
+
+    def invoke(self, messages):
+        self.requests.append(messages)
+        return AIMessage(content="A dog on the grass.")
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+def make_agent(tool_calls=None, max_images=None):
+    set_image_cache(ImageCache(processor=ImageProcessor(workers=0)))
+    vision = FakeVisionModel()
+    agent = fake_agent(FakeChatModel(tool_calls=tool_calls or []), vision,
+                       vision=VisionAnalyzer(max_images=max_images))
+    return agent, vision
+
+
+def base64_image(filename: str) -> ImageData:
+    return ImageData(data=base64.b64encode(IMAGE.read_bytes()).decode(), type="base64",
+                     filename=filename, mime_type="image/jpeg")
+
+
+def stored_state(agent, session_id):
+    return agent.session_graph.get_state(agent.sessions.config(session_id)).values
+
+
+def assert_no_payload_in_messages(state):
+    for message in state["messages"]:
+        assert "base64," not in str(message.content)
+        assert getattr(message, "artifact", None) is None
+
+
+def test_request_image_is_analyzed_once():
+    """The follow-up turn must go to the chat model, not the vision model again"""
+    agent, vision = make_agent()
+
+    response = agent.chat("What is in this picture?", [base64_image(IMAGE.name)], session_id="s1")
+    assert response.startswith("Image analysis for Local image: dog.jpg"), response
+    assert len(vision.requests) == 1
+    image_part = vision.requests[0][0].content[1]
+    assert image_part["image_url"]["url"].startswith("data:image/jpeg;base64,")
+
+    for question in ("Thanks! What breed could it be?", "And what is 2 + 2?"):
+        response = agent.chat(question, session_id="s1")
+        assert response == FakeChatModel().answer, response
+    assert len(vision.requests) == 1
+
+    state = stored_state(agent, "s1")
+    assert [a["consumed"] for a in state["images"]] == [True]
+    # consumed attachments keep their metadata but not the image
+    assert state["images"][0]["url"] == ""
+    assert_no_payload_in_messages(state)
+
+
+def test_tool_image_becomes_attachment():
+    """analyze_local_image hands its image over as an attachment, not as message text"""
+    agent, vision = make_agent(
+        tool_calls=[{"name": "analyze_local_image", "args": {"file_path": str(IMAGE)}}])
+
+    response = asyncio.run(agent.achat("Describe test_images/dog.jpg", session_id="s2"))
+    assert response.startswith("Image analysis for Local image: dog.jpg"), response
+    assert len(vision.requests) == 1
+
+    state = stored_state(agent, "s2")
+    tool_messages = [m for m in state["messages"] if isinstance(m, ToolMessage)]
+    assert [m.content for m in tool_messages] == ["Local image dog.jpg is ready for analysis."]
+    assert [a["consumed"] for a in state["images"]] == [True]
+    assert_no_payload_in_messages(state)
+
+
+def test_all_images_of_a_turn_are_analyzed_in_batches():
+    """Five images with at most two per request: three vision requests, one answer"""
+    agent, vision = make_agent(max_images=2)
+    images = [base64_image(f"photo{i}.jpg") for i in range(5)]
+
+    response = asyncio.run(agent.achat("Compare these pictures", images, session_id="s3"))
+    assert len(vision.requests) == 3
+    image_counts = sorted(
+        sum(part["type"] == "image_url" for part in request[0].content) for request in vision.requests)
+    assert image_counts == [1, 2, 2]
+    for i in range(5):
+        assert f"photo{i}.jpg" in response, response
+    assert response.index("photo0.jpg") < response.index("photo4.jpg")
+
+    state = stored_state(agent, "s3")
+    assert [a["consumed"] for a in state["images"]] == [True] * 5
+    assert agent.chat("Thanks!", session_id="s3") == FakeChatModel().answer
+    assert len(vision.requests) == 3
+
+
+def test_streamed_analysis_of_several_requests_is_the_merged_message():
+    """Concurrent vision requests must not interleave their tokens on the stream"""
+    set_image_cache(ImageCache(processor=ImageProcessor(workers=0)))
+    vision = FakeChatModel(answer="A dog sitting on green grass in the sun.", token_interval=0.001)
+    agent = fake_agent(FakeChatModel(), vision, vision=VisionAnalyzer(max_images=1))
+    images = [base64_image(f"photo{i}.jpg") for i in range(3)]
+
+    async def stream():
+        return [event async for event in agent.astream("Compare these pictures", images, session_id="s4")]
+
+    events = asyncio.run(stream())
+    tokens = [event["data"] for event in events if event["event"] == "token"]
+    assert len(tokens) == 1, tokens
+    for i in range(3):
+        assert f"Image analysis for Local image: photo{i}.jpg:\n\nA dog sitting" in tokens[0], tokens[0]
+    assert events[-1] == {"event": "done", "data": ""}
+
+
+def test_pending_images_are_the_unconsumed_tail():
+    old = consume([image_attachment("local", f"old{i}.jpg", "data:") for i in range(50)])
+    new = [image_attachment("url", "https://example.com/a.png", "https://example.com/a.png"),
+           image_attachment("upload", "b.png", "blob:b")]
+
+    images = merge_images(old, new)
+    assert pending_images(images) == new
+    assert pending_images(merge_images(images, consume(new))) == []
+    assert pending_images(old) == []
+    assert pending_images([]) == []
+
+
+if __name__ == "__main__":
+    test_request_image_is_analyzed_once()
+    test_tool_image_becomes_attachment()
+    test_all_images_of_a_turn_are_analyzed_in_batches()
+    test_streamed_analysis_of_several_requests_is_the_merged_message()
+    test_pending_images_are_the_unconsumed_tail()
+    print("✅ Image attachment tests passed!")
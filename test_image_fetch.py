@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Regression test: the image fetcher never connects to private addresses,
+including IPv6 ones, redirect targets and hosts that resolve to a public
+address only for the check
+
+A local HTTP server stands in for an internal service; host names are
+resolved by a patched getaddrinfo, so no real DNS is involved.
+"""
+
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpcore
+import httpx
+import pytest
+
+from app.images import ImageFetcher
+
+IMAGE = Path("test_images/sample_test.png").read_bytes()
+# a global address standing in for a public web server
+PUBLIC = "93.184.215.14"
+
+
+class Handler(BaseHTTPRequestHandler):
+    hosts = []
+    # where /redirect sends the client
+    location = None
+
+    def do_GET(self):
+        self.hosts.append(self.headers["Host"])
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", self.location)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(IMAGE)))
+        self.end_headers()
+        self.wfile.write(IMAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.hosts, Handler.location = [], None
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    """
+    Names to answers; a list of answers is given out one lookup at a time,
+    a tuple is one answer with several addresses
+    """
+    records, lookups = {}, []
+    real = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host not in records:
+            return real(host, port, *args, **kwargs)
+        lookups.append(host)
+        answers = records[host]
+        answer = answers.pop(0) if isinstance(answers, list) and len(answers) > 1 else \
+            answers[0] if isinstance(answers, list) else answers
+        return [(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM, 6, "",
+                 (address, port)) for address in (answer if isinstance(answer, tuple) else (answer,))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    return records, lookups
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Addresses connected to; PUBLIC is refused without leaving the machine"""
+    connected = []
+    for backend in (httpcore.SyncBackend, httpcore.AnyIOBackend):
+        real = backend.connect_tcp
+
+        def connect_tcp(self, host, port, *args, real=real, **kwargs):
+            connected.append(host)
+            if host == PUBLIC:
+                raise httpcore.ConnectError(f"{host} is unreachable in tests")
+            return real(self, host, port, *args, **kwargs)
+
+        monkeypatch.setattr(backend, "connect_tcp", connect_tcp)
+    return connected
+
+
+def fetch_both(fetcher: ImageFetcher, url: str):
+    """Fetch with the sync and the async client; returns both results or raises"""
+    async def afetch():
+        try:
+            return await fetcher.afetch(url)
+        finally:
+            await fetcher.aclose()
+
+    return fetcher.fetch(url), asyncio.run(afetch())
+
+
+def test_private_addresses_are_refused(server, dns, connections):
+    records, _ = dns
+    records["intranet.test"] = "10.1.2.3"
+    records["metadata.test"] = "169.254.169.254"
+    records["cgnat.test"] = "100.64.0.1"
+    for url in (f"http://127.0.0.1:{server}/a.png", f"http://localhost:{server}/a.png",
+                f"http://[::ffff:127.0.0.1]:{server}/a.png",
+                "http://intranet.test/a.png", "http://metadata.test/latest/meta-data/",
+                "http://cgnat.test/a.png"):
+        with pytest.raises(ValueError, match="Refusing"):
+            ImageFetcher().fetch(url)
+        with pytest.raises(ValueError, match="Refusing"):
+            asyncio.run(ImageFetcher().afetch(url))
+    assert Handler.hosts == [] and connections == []
+
+
+def test_rebinding_host_cannot_reach_a_private_address(server, dns, connections):
+    records, lookups = dns
+    # public when checked, loopback for any later lookup
+    records["rebind.test"] = [PUBLIC, "127.0.0.1"]
+    with pytest.raises(httpx.ConnectError):
+        ImageFetcher().fetch(f"http://rebind.test:{server}/a.png")
+    assert lookups == ["rebind.test"] and connections == [PUBLIC]
+    assert Handler.hosts == []
+
+
+class LoopbackIsPublic(ImageFetcher):
+    """Treats images.test, served locally, as a public host"""
+
+    def _check_addresses(self, host, infos):
+        if host == "images.test":
+            return [info[4][0] for info in infos]
+        return super()._check_addresses(host, infos)
+
+
+def test_ipv6_and_mixed_answers_are_refused(dns, connections):
+    records, _ = dns
+    records["v6-intranet.test"] = "fd00::1"
+    records["v6-link.test"] = "fe80::1"
+    # one private address among public ones is enough
+    records["mixed.test"] = (PUBLIC, "10.0.0.1")
+    for url in ("http://[::1]/a.png", "http://[fc00::1]/a.png", "http://[::]/a.png",
+                "http://v6-intranet.test/a.png", "http://v6-link.test/a.png", "http://mixed.test/a.png"):
+        with pytest.raises(ValueError, match="Refusing"):
+            ImageFetcher().fetch(url)
+        with pytest.raises(ValueError, match="Refusing"):
+            asyncio.run(ImageFetcher().afetch(url))
+    assert connections == []
+
+
+def test_redirects_to_private_addresses_are_refused(server, dns, connections):
+    records, _ = dns
+    records["images.test"] = "127.0.0.1"
+    records["intranet.test"] = "10.1.2.3"
+    for location in (f"http://127.0.0.1:{server}/a.png", f"http://localhost:{server}/a.png",
+                     "http://intranet.test/a.png"):
+        Handler.hosts, Handler.location = [], location
+        with pytest.raises(ValueError, match="Refusing"):
+            LoopbackIsPublic().fetch(f"http://images.test:{server}/redirect")
+        with pytest.raises(ValueError, match="Refusing"):
+            asyncio.run(LoopbackIsPublic().afetch(f"http://images.test:{server}/redirect"))
+        # only the redirecting host was reached
+        assert Handler.hosts == [f"images.test:{server}"] * 2
+    assert set(connections) == {"127.0.0.1"}
+
+
+def test_other_schemes_are_refused():
+    for url in ("file:///etc/passwd", "ftp://example.org/a.png", "gopher://127.0.0.1:6379/_INFO"):
+        with pytest.raises(ValueError, match="Invalid image URL"):
+            ImageFetcher().fetch(url)
+
+
+def test_connection_goes_to_the_checked_address(server, dns):
+    records, lookups = dns
+    records["images.test"] = "127.0.0.1"
+    for data, mime_type in fetch_both(LoopbackIsPublic(), f"http://images.test:{server}/a.png"):
+        assert data == IMAGE and mime_type == "image/png"
+    assert Handler.hosts == [f"images.test:{server}"] * 2
+    assert lookups == ["images.test"] * 2
+
+
+if __name__ == "__main__":
+    # the tests use pytest fixtures for the server and the patched resolver
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Regression test: agent turns show up in the Prometheus metrics
+
+The registry is process-wide, so assertions compare samples before and
+after a turn rather than absolute values.
+"""
+
+import re
+
+from langchain_core.tools import tool
+
+from app import metrics
+from app.tool_executor import ToolExecutor
+from tests.fakes import FakeChatModel, fake_agent
+
+
+def sample(name: str, **labels) -> float:
+    """Current value of one sample in the rendered metrics, 0 if absent"""
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    match = re.search(rf"^{name}\{{{label_text}\}} (\S+)$", metrics.render(), re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_turn_records_nodes_models_and_tools():
+    agent = fake_agent(FakeChatModel(tool_calls=[{"name": "calculator", "args": {"expression": "6 * 7"}}]))
+    before = {name: sample(f"agent_{name}_count", **labels) for name, labels in [
+        ("node_duration_seconds", {"node": "agent"}), ("tool_duration_seconds", {"tool": "calculator"}),
+        ("model_call_duration_seconds", {"kind": "tools"})]}
+
+    agent.chat("what is 6 * 7?")
+
+    assert sample("agent_node_duration_seconds_count", node="agent") == before["node_duration_seconds"] + 2
+    assert sample("agent_tool_duration_seconds_count", tool="calculator") == before["tool_duration_seconds"] + 1
+    assert sample("agent_model_call_duration_seconds_count", kind="tools") == before["model_call_duration_seconds"] + 2
+    assert sample("agent_nodes_in_flight", node="agent") == 0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_latency_seconds", "test", ["route"], buckets=(0.1, 1))
+    child = histogram.labels("/chat")
+    for value in (0.05, 0.5, 5):
+        child.observe(value)
+    assert histogram.render()[2:] == [
+        'test_latency_seconds_bucket{route="/chat",le="0.1"} 1',
+        'test_latency_seconds_bucket{route="/chat",le="1"} 2',
+        'test_latency_seconds_bucket{route="/chat",le="+Inf"} 3',
+        'test_latency_seconds_sum{route="/chat"} 5.55',
+        'test_latency_seconds_count{route="/chat"} 3',
+    ]
+
+
+def test_tool_errors_are_counted():
+    @tool
+    def broken(query: str) -> str:
+        """Always fails"""
+        raise RuntimeError("down")
+
+    before = sample("agent_tool_errors_total", tool="broken", reason="error")
+    messages = ToolExecutor([broken]).run([{"name": "broken", "args": {"query": "x"}, "id": "call_1"}])
+    assert "down" in messages[0].content
+    assert sample("agent_tool_errors_total", tool="broken", reason="error") == before + 1
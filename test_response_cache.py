@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Regression test: the response cache replays only identical, deterministic turns
+
+Every turn is a calculator round plus an answer, i.e. two model calls, so
+the hit and miss counters move in pairs.
+"""
+
+import asyncio
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import app.main
+from app.models import ChatRequest
+from app.response_cache import ResponseCache
+from tests.fakes import FakeChatModel, fake_agent
+
+
+def make_agent(**model_settings):
+    chat_model = FakeChatModel(
+        tool_calls=[{"name": "calculator", "args": {"expression": "sqrt(144)"}}], **model_settings)
+    cache = ResponseCache(backend="memory")
+    return fake_agent(chat_model, response_cache=cache), cache
+
+
+def test_repeated_turn_is_served_from_cache():
+    agent, cache = make_agent()
+
+    first = agent.chat("calculate sqrt(144)")
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 0
+    # whitespace differences don't matter, the tool round and the answer are both replayed
+    assert agent.chat("  calculate   sqrt(144) ") == first
+    assert cache.stats()["hits"] == 2
+
+    # a bypassing request goes to the model and leaves the counters alone
+    assert agent.chat("calculate sqrt(144)", cache=False) == first
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_key_covers_tool_outputs_but_not_ids():
+    cache = ResponseCache(backend="memory")
+    model = FakeChatModel()
+
+    def turn(call_id, result):
+        return [HumanMessage(content="fetch user1", id="h"),
+                AIMessage(content="", id="a", tool_calls=[
+                    {"name": "database_query", "args": {"query": "user1"}, "id": call_id}]),
+                ToolMessage(content=result, tool_call_id=call_id)]
+
+    assert cache.key(model, turn("call_1", "Alice")) == cache.key(model, turn("call_2", "Alice"))
+    assert cache.key(model, turn("call_1", "Alice")) != cache.key(model, turn("call_1", "Bob"))
+
+
+def test_sampling_models_are_not_cached():
+    # an unset temperature is the API's default of 1.0
+    for temperature in (0.7, None):
+        agent, cache = make_agent(temperature=temperature)
+        agent.chat("calculate sqrt(144)")
+        agent.chat("calculate sqrt(144)")
+        assert cache.stats()["hits"] == 0 and cache.stats()["entries"] == 0
+        assert cache.stats()["bypassed"] == 4
+
+
+def test_cache_control_header_reaches_the_route():
+    agent, cache = make_agent()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for i, header in enumerate([None, "no-cache", "max-age=0, No-Store", None]):
+                headers = {"cache-control": header} if header else {}
+                response = await client.post("/chat", headers=headers, json={
+                    "message": "calculate sqrt(144)", "session_id": f"http-{i}"})
+                assert response.status_code == 200, response.text
+        # called directly, the header parameter defaults to None, i.e. cached
+        await app.main.chat_with_agent(ChatRequest(message="calculate sqrt(144)", session_id="direct"))
+
+    app.main.agent_instance = agent
+    try:
+        asyncio.run(scenario())
+    finally:
+        app.main.agent_instance = None
+    # a miss, two bypasses, then hits over HTTP and for the direct call
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 4
+
+
+if __name__ == "__main__":
+    test_repeated_turn_is_served_from_cache()
+    test_key_covers_tool_outputs_but_not_ids()
+    test_sampling_models_are_not_cached()
+    test_cache_control_header_reaches_the_route()
+    print("✅ Response cache tests passed!")
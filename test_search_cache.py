@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Regression test: identical searches share one upstream request, cached
+results expire, and failures are not cached
+
+The backend is the canned FakeSearchBackend, which counts its requests; no
+network is involved.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.cache import TTLCache
+from app.search import SearchService
+from tests.fakes import FakeSearchBackend
+
+
+def service(backend, **cache_options) -> SearchService:
+    return SearchService(backend=backend, cache=TTLCache(name="search", **cache_options))
+
+
+def concurrently(fn, n: int):
+    barrier = threading.Barrier(n)
+
+    def call(i):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(call, range(n)))
+
+
+def test_concurrent_identical_searches_make_one_request():
+    backend = FakeSearchBackend(latency=0.2)
+    search = service(backend)
+    # case and whitespace differences normalize to the same query
+    results = concurrently(lambda i: search.search("Python  FastAPI" if i % 2 else "python fastapi"), 10)
+
+    assert backend.requests == 1
+    assert all(r == results[0] for r in results)
+    stats = search.stats()
+    assert stats["loads"] == 1 and stats["coalesced"] + stats["hits"] == 9
+
+    # another result count is another entry
+    search.search("python fastapi", max_results=5)
+    assert backend.requests == 2
+
+
+def test_results_expire_after_the_ttl():
+    backend = FakeSearchBackend()
+    search = service(backend, ttl_seconds=0.1)
+    search.search("weather")
+    search.search("weather")
+    assert backend.requests == 1
+
+    time.sleep(0.15)
+    search.search("weather")
+    assert backend.requests == 2
+
+
+def test_least_recently_used_result_is_evicted():
+    backend = FakeSearchBackend()
+    search = service(backend, max_entries=2)
+    for query in ("a", "b", "a", "c", "a", "b"):
+        search.search(query)
+    # "b" was evicted by "c", "a" stayed in use
+    assert backend.requests == 4
+    assert len(search.cache) == 2
+
+
+def test_failures_reach_every_waiter_and_are_retried():
+    calls = []
+
+    def flaky(query, max_results):
+        calls.append(query)
+        time.sleep(0.2)
+        if len(calls) == 1:
+            raise ConnectionError("rate limited")
+        return [{"title": query, "href": "https://example.org", "body": "..."}]
+
+    search = service(flaky)
+
+    def attempt(i):
+        try:
+            return search.search("news")
+        except ConnectionError as e:
+            return e
+
+    results = concurrently(attempt, 5)
+    assert len(calls) == 1 and all(isinstance(r, ConnectionError) for r in results)
+    assert search.search("news")[0]["title"] == "news"
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    test_concurrent_identical_searches_make_one_request()
+    test_results_expire_after_the_ttl()
+    test_least_recently_used_result_is_evicted()
+    test_failures_reach_every_waiter_and_are_retried()
+    print("✅ Search cache tests passed!")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Regression test: the semantic cache answers near-duplicate questions, and only those
+
+Hits are read from the cache's counters; the scripted model answers the
+same way every time, so the answers alone can't tell a hit from a miss.
+"""
+
+from app.semantic_cache import SemanticCache
+from tests.fakes import FakeChatModel, fake_agent
+
+
+def make_agent(tool_name="calculator"):
+    chat_model = FakeChatModel(tool_calls=[{"name": tool_name, "args": {"expression": "sqrt(144)"}}])
+    cache = SemanticCache()
+    return fake_agent(chat_model, semantic_cache=cache), cache
+
+
+def test_near_duplicates_share_an_answer():
+    agent, cache = make_agent()
+    answer = agent.chat("Calculate sqrt(144)", session_id="s1")
+
+    # a paraphrase in a new session is answered from the cache and recorded in the session
+    assert agent.chat("please calculate sqrt(144)?", session_id="s2") == answer
+    assert cache.stats()["hits"] == 1
+    messages = agent.session_graph.get_state(agent.sessions.config("s2")).values["messages"]
+    assert [m.type for m in messages] == ["human", "ai"]
+
+    # different numbers, a follow-up in a conversation and a bypass all go to the model
+    agent.chat("Calculate sqrt(169)")
+    agent.chat("Calculate sqrt(144)", session_id="s1")
+    agent.chat("Calculate sqrt(144)", cache=False)
+    assert cache.stats()["hits"] == 1
+
+
+def test_answers_from_live_data_are_not_cached():
+    agent, cache = make_agent(tool_name="fetch_user_from_database")
+    agent.chat("fetch user1")
+    agent.chat("fetch user1")
+    assert cache.stats()["entries"] == 0 and cache.stats()["hits"] == 0
+
+
+# near duplicates by word overlap that ask for something else
+NEAR_MISSES = [
+    ("What is the population of France according to the latest census figures?",
+     "What is the population of Spain according to the latest census figures?"),
+    ("Explain the main causes of the French Revolution in simple terms",
+     "Explain the main causes of the Russian Revolution in simple terms"),
+    ("Convert 10 USD to EUR", "Convert 10 EUR to USD"),
+    ("Is Paris bigger than London?", "Is London bigger than Paris?"),
+    ("What is 15% of 80?", "What is 15% of 90?"),
+]
+
+
+def test_near_misses_do_not_share_an_answer():
+    cache = SemanticCache()
+    for stored, _ in NEAR_MISSES:
+        cache.store(stored, f"Answer to: {stored}")
+    for stored, asked in NEAR_MISSES:
+        assert cache.lookup(asked) is None, asked
+        assert cache.lookup(f"  {stored.lower()}") == f"Answer to: {stored}"
+    assert cache.stats()["hits"] == len(NEAR_MISSES)
+
+
+def test_index_stays_within_its_memory_limit():
+    cache = SemanticCache(max_bytes=64 * 1024)
+    for i in range(1000):
+        cache.store(f"question number {i}", "answer " * 20)
+    stats = cache.stats()
+    assert stats["bytes"] <= 64 * 1024 and stats["evictions"] > 0
+    assert cache.lookup("question number 999") == "answer " * 20
+    assert cache.lookup("question number 0") is None
+
+
+if __name__ == "__main__":
+    test_near_duplicates_share_an_answer()
+    test_answers_from_live_data_are_not_cached()
+    test_near_misses_do_not_share_an_answer()
+    test_index_stays_within_its_memory_limit()
+    print("✅ Semantic cache tests passed!")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Regression test: session memory is bounded by count, idle time and size
+
+Turns go through the agent with the fake chat model, so the store holds real
+checkpoints; eviction must remove those along with the bookkeeping row.
+"""
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.sessions import SessionStore
+from tests.fakes import FakeChatModel, fake_agent
+
+
+def checkpoints(store: SessionStore, session_id: str) -> int:
+    with store.checkpointer.cursor(transaction=False) as cur:
+        cur.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", (session_id,))
+        return cur.fetchone()[0]
+
+
+def history(agent, session_id: str):
+    return agent.session_graph.get_state(agent.sessions.config(session_id)).values.get("messages", [])
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(backend="memory", max_sessions=2)
+    agent = fake_agent(sessions=store)
+    for session_id in ("a", "b", "a", "c"):
+        agent.chat(f"hello from {session_id}", session_id=session_id)
+
+    # "b" was used least recently once "c" arrived
+    assert len(store) == 2
+    assert store.exists("a") and store.exists("c") and not store.exists("b")
+    assert checkpoints(store, "b") == 0 and history(agent, "b") == []
+    # only the latest checkpoint of a session is kept
+    assert checkpoints(store, "a") == 1
+    assert len(history(agent, "a")) == 4
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(backend="memory", ttl_seconds=60)
+    agent = fake_agent(sessions=store)
+    agent.chat("hello", session_id="old")
+    asyncio.run(agent.achat("hello", session_id="new"))
+
+    assert store.evict(time.time() + 30) == []
+    assert sorted(store.evict(time.time() + 120)) == ["new", "old"]
+    assert len(store) == 0 and checkpoints(store, "old") == 0
+
+
+def test_session_is_trimmed_to_whole_turns_under_the_byte_cap():
+    store = SessionStore(backend="memory", max_session_bytes=8 * 1024)
+    agent = fake_agent(FakeChatModel(answer="word " * 200), sessions=store)
+    for i in range(20):
+        agent.chat(f"turn {i}: " + "question " * 100, session_id="long")
+
+    messages = history(agent, "long")
+    assert store.checkpointer.thread_size("long") <= 8 * 1024
+    assert isinstance(messages[0], HumanMessage) and len(messages) < 40
+    # the latest turn is kept
+    assert messages[-2].content.startswith("turn 19:")
+
+
+def test_trim_keeps_tool_calls_with_their_results():
+    store = SessionStore(backend="memory", max_session_bytes=1)
+    call = {"name": "calculator", "args": {"expression": "1+1"}, "id": "c1"}
+    messages = [
+        HumanMessage("first", id="h1"), AIMessage("", tool_calls=[call], id="a1"),
+        ToolMessage("2", tool_call_id="c1", id="t1"), AIMessage("It is 2.", id="a2"),
+        HumanMessage("second", id="h2"), AIMessage("", tool_calls=[call], id="a3"),
+        ToolMessage("2", tool_call_id="c1", id="t2"), AIMessage("Still 2.", id="a4"),
+    ]
+    # over any budget, everything but the last turn goes
+    assert [m.id for m in store.trim(messages, 10 ** 6)] == ["h2", "a3", "t2", "a4"]
+    # within it, nothing does
+    store.max_session_bytes = 10 ** 6
+    assert store.trim(messages, 1000) == messages
+
+
+if __name__ == "__main__":
+    test_least_recently_used_session_is_evicted()
+    test_idle_sessions_expire()
+    test_session_is_trimmed_to_whole_turns_under_the_byte_cap()
+    test_trim_keeps_tool_calls_with_their_results()
+    print("✅ Session store tests passed!")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Regression test: cache entries loaded by one worker are hits in the others
+
+A second interpreter stands in for another server worker writing to the
+shared SQLite store after this process's cache has started.
+"""
+
+import subprocess
+import sys
+
+from app.cache import TTLCache
+from app.server import server_options, unshared_state
+from app.shared_state import LocalStore
+
+WORKER = """
+import sys
+from app.cache import TTLCache
+TTLCache(path=sys.argv[1], name="search").set(("weather", 3), [{"title": "Sunny"}])
+"""
+
+
+def test_entry_from_another_worker_is_a_shared_hit(tmp_path):
+    path = str(tmp_path / "search_cache.sqlite")
+    cache = TTLCache(path=path, name="search")
+    assert cache.get(("weather", 3)) is None
+
+    subprocess.run([sys.executable, "-c", WORKER, path], check=True)
+
+    assert cache.get(("weather", 3)) == [{"title": "Sunny"}]
+    assert cache.get(("weather", 3)) == [{"title": "Sunny"}]
+    stats = cache.stats()
+    assert (stats["misses"], stats["shared_hits"], stats["hits"]) == (1, 1, 1)
+    cache.close()
+
+
+def test_local_store_stands_in_for_a_shared_one():
+    store = LocalStore()
+    first, second = TTLCache(store=store), TTLCache(store=store)
+    first.set("key", {"value": 1})
+    assert second.get("key") == {"value": 1}
+    second.clear()
+    assert TTLCache(store=store).get("key") is None
+
+
+def test_production_profile(monkeypatch):
+    for name in ("WORKERS", "RELOAD", "SHARED_STATE_DIR", "SESSION_BACKEND", "IMAGE_WORKERS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    options = server_options("production")
+    assert not options["reload"] and options["shared_state_dir"] == "state"
+    # one image process per CPU across all workers, not per worker
+    assert (options["workers"], options["image_workers"]) == (8, 1)
+    monkeypatch.setenv("WORKERS", "2")
+    assert server_options("production")["image_workers"] == 4
+    monkeypatch.delenv("WORKERS")
+    assert server_options("development")["workers"] == 1
+
+    monkeypatch.setenv("SESSION_BACKEND", "memory")
+    assert unshared_state(1) == []
+    assert any("SESSION_BACKEND" in problem for problem in unshared_state(4))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Regression test: the tool calls of one response run concurrently, each
+within the timeout, and come back in the order they were made
+
+The tools sleep instead of doing I/O, so the elapsed times show whether the
+calls overlapped; the bounds leave room for a slow machine.
+"""
+
+import asyncio
+import threading
+import time
+
+from langchain_core.tools import tool
+
+from app.tool_executor import ToolExecutor
+
+
+@tool
+def slow_search(query: str, delay: float) -> str:
+    """Search that takes `delay` seconds"""
+    time.sleep(delay)
+    return f"results for {query}"
+
+
+@tool
+async def slow_lookup(key: str, delay: float) -> str:
+    """Async lookup that takes `delay` seconds"""
+    await asyncio.sleep(delay)
+    return f"value of {key}"
+
+
+@tool
+def broken(query: str) -> str:
+    """Always fails"""
+    raise RuntimeError("down")
+
+
+TOOLS = [slow_search, slow_lookup, broken]
+
+
+def search(query, delay, call_id):
+    return {"name": "slow_search", "args": {"query": query, "delay": delay}, "id": call_id}
+
+
+def lookup(key, delay, call_id):
+    return {"name": "slow_lookup", "args": {"key": key, "delay": delay}, "id": call_id}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def test_calls_overlap_and_keep_their_order():
+    executor = ToolExecutor(TOOLS)
+    calls = [search("a", 0.3, "c1"), search("b", 0.1, "c2"), lookup("c", 0.2, "c3")]
+    try:
+        for run in (lambda: executor.run(calls), lambda: asyncio.run(executor.arun(calls))):
+            messages, elapsed = timed(run)
+            assert [m.tool_call_id for m in messages] == ["c1", "c2", "c3"]
+            assert [m.content for m in messages] == ["results for a", "results for b", "value of c"]
+            # the slowest call, not the sum of all three
+            assert elapsed < 0.5
+    finally:
+        executor.close()
+
+
+def test_max_concurrency_bounds_the_pool():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    @tool
+    def counted(delay: float) -> str:
+        """Records how many calls run at once"""
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(delay)
+        with lock:
+            running[0] -= 1
+        return "done"
+
+    executor = ToolExecutor([counted], max_concurrency=2)
+    calls = [{"name": "counted", "args": {"delay": 0.1}, "id": f"c{i}"} for i in range(6)]
+    try:
+        messages, elapsed = timed(lambda: executor.run(calls))
+        assert [m.content for m in messages] == ["done"] * 6
+        assert peak[0] == 2 and elapsed >= 0.3
+    finally:
+        executor.close()
+
+
+def test_slow_call_times_out_without_holding_up_the_others():
+    executor = ToolExecutor(TOOLS, timeout=0.3)
+    calls = [search("slow", 2, "c1"), search("fast", 0.05, "c2"), lookup("slow", 2, "c3")]
+    try:
+        for run in (lambda: executor.run(calls), lambda: asyncio.run(executor.arun(calls))):
+            messages, elapsed = timed(run)
+            assert "timed out after 0.3s" in messages[0].content
+            assert messages[1].content == "results for fast"
+            assert "timed out after 0.3s" in messages[2].content
+            assert elapsed < 1
+    finally:
+        executor.close()
+
+
+def test_errors_are_reported_and_unknown_tools_skipped():
+    executor = ToolExecutor(TOOLS)
+    calls = [{"name": "broken", "args": {"query": "x"}, "id": "c1"},
+             {"name": "missing", "args": {}, "id": "c2"},
+             search("a", 0, "c3")]
+    try:
+        for messages in (executor.run(calls), asyncio.run(executor.arun(calls))):
+            assert [m.tool_call_id for m in messages] == ["c1", "c3"]
+            assert messages[0].content == "Error executing broken: down"
+    finally:
+        executor.close()
+
+
+def test_async_tools_run_on_more_than_one_loop():
+    # one executor is shared by the whole process, whichever loop calls it
+    executor = ToolExecutor(TOOLS, max_concurrency=1)
+    calls = [lookup("a", 0.01, "c1"), lookup("b", 0.01, "c2")]
+    try:
+        for _ in range(2):
+            messages = asyncio.run(executor.arun(calls))
+            assert [m.content for m in messages] == ["value of a", "value of b"]
+    finally:
+        executor.close()
+
+
+if __name__ == "__main__":
+    test_calls_overlap_and_keep_their_order()
+    test_max_concurrency_bounds_the_pool()
+    test_slow_call_times_out_without_holding_up_the_others()
+    test_errors_are_reported_and_unknown_tools_skipped()
+    test_async_tools_run_on_more_than_one_loop()
+    print("✅ Tool executor tests passed!")
@@ -0,0 +1,201 @@
+"""
+Deterministic stand-ins for the OpenAI chat model and the search backend,
+and an agent wired to them, for the in-process tests and the benchmarks
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Union
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Scripted chat model with configurable latency and token rate.
+
+    After a user message it emits `tool_calls` (if any), repeating them for
+    `tool_rounds` model calls, then answers with `answer`. A `script` replaces
+    that: its n-th entry is the n-th response after the user message, either
+    an answer or a list of tool calls (the last entry repeats). Streaming
+    yields one chunk per word.
+    """
+
+    model: str = "fake"
+    temperature: Optional[float] = 0
+    answer: str = "This is a scripted answer from the fake model."
+    tool_calls: List[Dict[str, Any]] = []
+    tool_rounds: int = 1
+    script: List[Union[str, List[Dict[str, Any]]]] = []
+    first_token_latency: float = 0.0
+    token_interval: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        """Pick the scripted response for this turn"""
+        if self.script:
+            step = self.script[min(self._calls_so_far(messages), len(self.script) - 1)]
+            return AIMessage(content=step) if isinstance(step, str) else self._tool_message(step)
+        if self.tool_calls and self._rounds_so_far(messages) < self.tool_rounds:
+            return self._tool_message(self.tool_calls)
+        return AIMessage(content=self.answer)
+
+    @staticmethod
+    def _tool_message(tool_calls: List[Dict[str, Any]]) -> AIMessage:
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {"name": call["name"], "args": call["args"],
+                 "id": call.get("id") or f"call_{uuid.uuid4().hex[:8]}"}
+                for call in tool_calls
+            ],
+        )
+
+    def _calls_so_far(self, messages: List[BaseMessage]) -> int:
+        """Count model responses since the last user message"""
+        calls = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                calls += 1
+        return calls
+
+    def _rounds_so_far(self, messages: List[BaseMessage]) -> int:
+        """Count tool-calling responses since the last user message"""
+        rounds = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage) and message.tool_calls:
+                rounds += 1
+        return rounds
+
+    def _chunks(self, message: AIMessage) -> List[AIMessageChunk]:
+        """Split a response into the chunks a streaming API would send"""
+        if message.tool_calls:
+            return [AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]),
+                     "id": call["id"], "index": i}
+                    for i, call in enumerate(message.tool_calls)
+                ],
+            )]
+        words = message.content.split(" ")
+        return [
+            AIMessageChunk(content=word + (" " if i < len(words) - 1 else ""))
+            for i, word in enumerate(words)
+        ]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._respond(messages)
+        chunks = self._chunks(message)
+        time.sleep(self.first_token_latency +
+                   self.token_interval * max(len(chunks) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._respond(messages)
+        chunks = self._chunks(message)
+        await asyncio.sleep(self.first_token_latency +
+                            self.token_interval * max(len(chunks) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for i, chunk in enumerate(self._chunks(self._respond(messages))):
+            if i:
+                time.sleep(self.token_interval)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for i, chunk in enumerate(self._chunks(self._respond(messages))):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+
+class FakeSearchBackend:
+    """Search backend returning canned results after `latency` seconds; counts its requests"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str, max_results: int):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        return [{"title": f"{query} {i}", "href": f"https://example.org/{i}", "body": "..."}
+                for i in range(max_results)]
+
+
+def fake_agent(chat_model: BaseChatModel = None, vision_model=None, **options):
+    """
+    A LangGraphAgent whose chat and tool calls go to `chat_model` (a default
+    FakeChatModel if omitted) and image analysis to `vision_model` (the chat
+    model if omitted), with in-memory sessions. `options` are passed on to
+    LangGraphAgent, e.g. a response cache.
+    """
+    # imported here so importing the fakes alone stays cheap
+    from app.agent import LangGraphAgent
+    from app.sessions import SessionStore
+
+    chat_model = chat_model if chat_model is not None else FakeChatModel()
+    models = SimpleNamespace(chat_model=chat_model, tool_model=chat_model,
+                             vision_model=vision_model if vision_model is not None else chat_model)
+    options.setdefault("sessions", SessionStore(backend="memory"))
+    return LangGraphAgent(models=models, **options)